@@ -0,0 +1,6 @@
+"""
+benchmarks/__init__.py
+
+Benchmarks, run from the repository root with
+``python -m benchmarks.<module>``.
+"""
@@ -0,0 +1,118 @@
+"""
+benchmarks/bench_result_store.py
+
+Measures the memory a batch run holds per file for its results, kept as
+lists of Result objects and in a `cc_plugin_glider.store.ResultStore`.
+
+The test fixtures are checked in turn, with authority tables loaded from the
+test data instead of fetched:
+
+    python -m benchmarks.bench_result_store --files 500
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+from cc_plugin_glider import api, tables
+from cc_plugin_glider.glider_dac import GliderCheck
+from cc_plugin_glider.store import ResultStore
+from cc_plugin_glider.tests.resources import STATIC_FILES, get_filename
+
+
+def make_checker():
+    return GliderCheck(
+        table_provider=tables.FileProvider(
+            {
+                "ncei_iso": get_filename(
+                    os.path.join("tests", "data", "ncei_metadata.xml"),
+                ),
+                "sea_name": get_filename(
+                    os.path.join("tests", "data", "seanames.xml"),
+                ),
+            },
+        ),
+    )
+
+
+def iter_batch(checker, datasets, n_files):
+    for i in range(n_files):
+        results, errors = api.run_checks(checker, datasets[i % len(datasets)])
+        yield f"file_{i:06d}.nc", results, errors
+
+
+def measure(keep, checker, datasets, n_files):
+    """
+    Returns the memory still allocated after keeping the results of a batch
+    with `keep`, and what `keep` returned
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    kept = keep(iter_batch(checker, datasets, n_files))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained, kept
+
+
+def keep_results(batch):
+    return list(batch)
+
+
+def keep_store(batch):
+    store = ResultStore()
+    for source, results, errors in batch:
+        store.add(source, results, errors)
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--files", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    checker = make_checker()
+    datasets = [api.open_dataset(path) for path in STATIC_FILES.values()]
+    # warm the checker's caches so they aren't counted against either
+    for dataset in datasets:
+        api.run_checks(checker, dataset)
+
+    retained_results, kept = measure(
+        keep_results,
+        checker,
+        datasets,
+        args.files,
+    )
+    n_results = sum(len(results) for _, results, _ in kept)
+    del kept
+    retained_store, store = measure(
+        keep_store,
+        checker,
+        datasets,
+        args.files,
+    )
+
+    out = sys.stdout
+    out.write(f"files:              {args.files}\n")
+    out.write(f"results per file:   {n_results / args.files:.1f}\n")
+    out.write(
+        f"Result lists:       {retained_results / args.files:,.0f} "
+        "bytes per file\n",
+    )
+    out.write(
+        f"ResultStore:        {retained_store / args.files:,.0f} "
+        f"bytes per file ({store.nbytes() / args.files:,.0f} by nbytes)\n",
+    )
+    out.write(
+        f"reduction:          {retained_results / retained_store:.1f}x\n"
+    )
+    for dataset in datasets:
+        dataset.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
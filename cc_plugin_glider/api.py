@@ -0,0 +1,255 @@
+"""
+cc_plugin_glider/api.py
+
+Programmatic and batch entry points for running the Glider DAC checks.
+
+Sources may be paths to netCDF or CDL files, in-memory netCDF buffers
+(bytes, bytearray or memoryview), already open netCDF4 datasets, or
+xarray datasets, whose data is checked through `cc_plugin_glider.lazy`.
+"""
+
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+
+from netCDF4 import Dataset
+
+from cc_plugin_glider import cdl, lazy, parallel, summary, util
+from cc_plugin_glider.glider_dac import GliderCheck
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def source_name(source):
+    """
+    Returns a printable name for a source
+    """
+    if isinstance(source, Dataset):
+        return source.filepath()
+    if isinstance(source, BUFFER_TYPES):
+        return f"<memory: {memoryview(source).nbytes} bytes>"
+    if lazy.is_xarray(source):
+        return source.encoding.get("source", "<xarray.Dataset>")
+    return os.fspath(source)
+
+
+def open_dataset(source, name=None):
+    """
+    Opens a source as a netCDF4.Dataset.
+
+    Buffers are opened with netCDF4's in-memory support, which reads
+    directly from the buffer without writing it to disk or copying it.  The
+    buffer must not be modified while the dataset is open.
+
+    xarray.Datasets are opened as an in-memory header for the metadata
+    checks, with their data read lazily by the data checks.
+
+    :param source: A path, CDL path, buffer, xarray.Dataset, or an open
+                   netCDF4.Dataset, which is returned unchanged
+    :param str name: Optional name for an in-memory dataset
+    :rtype: netCDF4.Dataset
+    """
+    if isinstance(source, Dataset):
+        return source
+    if lazy.is_xarray(source):
+        return lazy.open_xarray(source, name=name)
+    if isinstance(source, BUFFER_TYPES):
+        # netCDF needs a unique name for each open in-memory dataset
+        return Dataset(name or f"memory-{uuid.uuid4().hex}", memory=source)
+    path = os.fspath(source)
+    if cdl.is_cdl(path):
+        return cdl.read_cdl(path)
+    return Dataset(path)
+
+
+@contextmanager
+def dataset_context(source, name=None):
+    """
+    Context manager which opens a source with `open_dataset` and closes it
+    afterwards, unless it was passed in already open
+    """
+    dataset = open_dataset(source, name)
+    try:
+        yield dataset
+    finally:
+        if dataset is not source:
+            dataset.close()
+
+
+def iter_check_results(
+    checker,
+    dataset,
+    include_checks=None,
+    skip_checks=None,
+    workers=1,
+):
+    """
+    Runs the check methods of an existing checker against an open dataset,
+    yielding the outcome of each check as soon as it finishes.
+
+    Reusing one checker across datasets avoids reloading the authority
+    tables for every file, and lets the results of its metadata checks be
+    reused for files with the same header, see `cc_plugin_glider.cache`.
+    `include_checks` and `skip_checks` take the same values as the
+    compliance-checker ``-i`` and ``-s`` options.  With more than one worker
+    the metadata checks run concurrently with the data checks, see
+    `cc_plugin_glider.parallel`, and results are yielded in the same order.
+
+    :return: A generator of (check method name, list of Results, error)
+             tuples, where error is an (exception, traceback) tuple if the
+             check raised, otherwise None
+    """
+    if workers > 1:
+        yield from parallel.iter_check_results(
+            checker,
+            dataset,
+            include_checks,
+            skip_checks,
+            workers,
+        )
+        return
+    checker.setup(dataset)
+    try:
+        result_cache, cache_key = parallel.result_cache_key(checker, dataset)
+
+        for check_method, max_level in parallel.get_checks(
+            checker,
+            include_checks,
+            skip_checks,
+        ):
+            check_name = check_method.__func__.__name__
+            cacheable = cache_key is not None and not parallel.is_data_check(
+                checker,
+                check_name,
+            )
+            if cacheable:
+                results = result_cache.get(cache_key, check_name, max_level)
+                if results is not None:
+                    yield check_name, results, None
+                    continue
+            try:
+                results = parallel.run_check(check_method, dataset, max_level)
+            except Exception as e:
+                yield check_name, [], (e, sys.exc_info()[2])
+            else:
+                if cacheable:
+                    result_cache.put(cache_key, check_name, max_level, results)
+                yield check_name, results, None
+    finally:
+        parallel.teardown(checker)
+
+
+def summary_index(checker):
+    """
+    Returns the `summary.SummaryIndex` a checker writes file summaries to,
+    opened on first use from ``-O gliderdac:summary_index:<path>``, or None
+    """
+    index = getattr(checker, "summary_index", None)
+    if index is None:
+        path = util._get_option("summary_index", checker.options)
+        if path:
+            index = checker.summary_index = summary.SummaryIndex(path[0])
+    return index
+
+
+def run_checks(
+    checker,
+    dataset,
+    include_checks=None,
+    skip_checks=None,
+    workers=1,
+    source=None,
+):
+    """
+    Runs the check methods of an existing checker against an open dataset.
+    See `iter_check_results`.  If the checker has a summary index, see
+    `summary_index`, the summary of a dataset opened from a path is written
+    to it.
+
+    :param source: The source the dataset was opened from
+    :return: A tuple of the list of Results and a dictionary of check method
+             name to (exception, traceback) for any checks which raised
+    """
+    results = []
+    errors = {}
+    for check_name, check_results, error in iter_check_results(
+        checker,
+        dataset,
+        include_checks,
+        skip_checks,
+        workers,
+    ):
+        results.extend(check_results)
+        if error is not None:
+            errors[check_name] = error
+    if isinstance(source, (str, os.PathLike)):
+        index = summary_index(checker)
+        if index is not None:
+            index.add(
+                summary.file_summary(
+                    dataset, results, errors, source, checker
+                ),
+            )
+    return results, errors
+
+
+def validate(
+    source,
+    options=None,
+    checker=None,
+    include_checks=None,
+    skip_checks=None,
+    name=None,
+    workers=1,
+):
+    """
+    Runs the Glider DAC checks against a single source.
+
+    :param source: A path, CDL path, buffer, xarray.Dataset or open
+                   netCDF4.Dataset
+    :param options: Checker options, as passed with
+                    ``-O gliderdac:<option>``.  Ignored if `checker` is given
+    :param GliderCheck checker: An existing checker to reuse
+    :param int workers: Threads running the metadata checks concurrently
+                        with the data checks, 1 runs every check in turn
+    :return: A tuple of the list of Results and the errors dictionary from
+             `run_checks`
+    """
+    checker = checker or GliderCheck(options=options)
+    with dataset_context(source, name) as dataset:
+        return run_checks(
+            checker,
+            dataset,
+            include_checks,
+            skip_checks,
+            workers,
+            source,
+        )
+
+
+def validate_batch(
+    sources,
+    options=None,
+    checker=None,
+    include_checks=None,
+    skip_checks=None,
+    workers=1,
+):
+    """
+    Runs the Glider DAC checks against each source in turn, sharing a single
+    checker.  Sources are opened one at a time so only one dataset is held
+    open at once.
+
+    :return: A generator of (source, results, errors) tuples
+    """
+    checker = checker or GliderCheck(options=options)
+    for source in sources:
+        results, errors = validate(
+            source,
+            checker=checker,
+            include_checks=include_checks,
+            skip_checks=skip_checks,
+            workers=workers,
+        )
+        yield source, results, errors
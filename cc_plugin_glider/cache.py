@@ -0,0 +1,186 @@
+"""
+cc_plugin_glider/cache.py
+
+Memoized results of the metadata checks.
+
+Files of one deployment usually share their header: the same variables,
+dtypes and attributes, with only the data different.  Checks which only read
+metadata give the same results for each of them, so their results are
+cached under a fingerprint of the file's metadata, the checker options and
+the version of the authority tables.  After the first file of a deployment
+with a given header only the data checks are run.
+
+The fingerprint reduces the attributes a checker lists in
+`per_file_attributes`, such as ``date_created`` or ``history``, to their
+type and whether they are empty, which is all the checks look at.
+"""
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _normalize(value):
+    """
+    Returns a representation of an attribute value which distinguishes its
+    type as well as its value, e.g. 1 from 1.0 or byte from int
+    """
+    if isinstance(value, np.ndarray):
+        return ("array", value.dtype.str, value.tolist())
+    if isinstance(value, np.generic):
+        return ("scalar", value.dtype.str, value.item())
+    return (type(value).__name__, value)
+
+
+def _normalize_per_file(value):
+    if isinstance(value, str):
+        return ("str", bool(value.strip()))
+    return (type(value).__name__, None)
+
+
+def _attributes(source, per_file_attributes=()):
+    return [
+        (
+            attr,
+            _normalize_per_file(source.getncattr(attr))
+            if attr in per_file_attributes
+            else _normalize(source.getncattr(attr)),
+        )
+        for attr in source.ncattrs()
+    ]
+
+
+def fingerprint(dataset, per_file_attributes=()):
+    """
+    Returns a hash of the normalized metadata of a netCDF4.Dataset or a
+    `parallel.DatasetSnapshot` of one: its dimension names and sizes,
+    variable names, dtypes and dimensions, variable attributes and global
+    attributes.
+
+    :param per_file_attributes: Global attributes whose values are expected
+                                to differ between the files of a deployment
+    :rtype: str
+    """
+    metadata = (
+        [
+            (name, len(dimension), dimension.isunlimited())
+            for name, dimension in dataset.dimensions.items()
+        ],
+        [
+            (
+                name,
+                str(getattr(variable.dtype, "str", variable.dtype)),
+                variable.dimensions,
+                _attributes(variable),
+            )
+            for name, variable in dataset.variables.items()
+        ],
+        _attributes(dataset, frozenset(per_file_attributes)),
+    )
+    return hashlib.sha256(repr(metadata).encode()).hexdigest()
+
+
+def table_version(tables, *versions):
+    """
+    Returns a hash of the contents of a dict of authority tables, and any
+    other table versions, which changes whenever the tables are reloaded
+    with different contents
+    """
+    digest = hashlib.sha256(repr(versions).encode())
+    for name in sorted(tables):
+        table = tables[name]
+        digest.update(name.encode())
+        digest.update(
+            repr(None if table is None else sorted(map(str, table))).encode(),
+        )
+    return digest.hexdigest()
+
+
+def _copy_result(result):
+    """
+    Copies a Result, so that callers updating the results they are given,
+    e.g. renaming them, don't change the cached results
+    """
+    result = copy.copy(result)
+    result.msgs = list(result.msgs or [])
+    if result.children:
+        result.children = [_copy_result(child) for child in result.children]
+    return result
+
+
+class ResultCache:
+    """
+    A thread-safe, least recently used cache of check results by metadata
+    fingerprint.
+
+    :param int max_entries: Number of distinct headers to keep results for
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(checker, dataset):
+        """
+        Returns the key for the results of a checker's metadata checks on a
+        dataset or a `parallel.DatasetSnapshot` of it
+        """
+        options = checker.options
+        if isinstance(options, dict):
+            options = sorted((str(k), repr(v)) for k, v in options.items())
+        elif options is not None:
+            options = sorted(map(str, options))
+        return (
+            type(checker).__qualname__,
+            fingerprint(
+                dataset,
+                getattr(checker, "per_file_attributes", ()),
+            ),
+            repr(options),
+            getattr(checker, "table_version", None),
+        )
+
+    def get(self, key, check_name, max_level=None):
+        """
+        Returns copies of the cached results of a check, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            results = (
+                None if entry is None else entry.get((check_name, max_level))
+            )
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [_copy_result(result) for result in results]
+
+    def put(self, key, check_name, max_level, results):
+        """
+        Caches copies of the results of a check
+        """
+        results = [_copy_result(result) for result in results]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {}
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            entry[(check_name, max_level)] = results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
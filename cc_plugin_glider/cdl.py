@@ -0,0 +1,610 @@
+"""
+cc_plugin_glider/cdl.py
+
+CDL front end for the Glider DAC checks.
+
+Parses the text form of a netCDF header (as written by ``ncdump -h`` and
+accepted by ``ncgen``) straight into an in-memory, diskless
+``netCDF4.Dataset`` so the checks can run on CDL without a subprocess or
+any temporary files.
+"""
+
+import os
+import re
+import uuid
+
+import numpy as np
+from netCDF4 import Dataset
+
+# CDL type names and the numpy dtypes they are created with
+CDL_TYPES = {
+    "char": "S1",
+    "byte": "i1",
+    "ubyte": "u1",
+    "short": "i2",
+    "ushort": "u2",
+    "int": "i4",
+    "integer": "i4",
+    "long": "i4",
+    "uint": "u4",
+    "int64": "i8",
+    "uint64": "u8",
+    "float": "f4",
+    "real": "f4",
+    "double": "f8",
+    "string": str,
+}
+
+# types which can only be stored in a netCDF-4 file
+_NC4_TYPES = {"ubyte", "ushort", "uint", "int64", "uint64", "string"}
+
+# Attributes which ncgen turns into variable creation arguments rather than
+# storing as ordinary attributes
+_SPECIAL_ATTRS = {
+    "_ChunkSizes": "chunksizes",
+    "_DeflateLevel": "complevel",
+    "_Endianness": "endian",
+    "_Fletcher32": "fletcher32",
+    "_Shuffle": "shuffle",
+    "_Storage": "contiguous",
+}
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>//[^\n]*)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<punct>[{}();:,=])
+    |(?P<word>(?:[^\s{}();:,="\\]|\\.)+)
+    |(?P<space>\s+)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_INT_RE = re.compile(
+    r"^(?P<num>[+-]?(?:0[xX][0-9a-fA-F]+|\d+))"
+    r"(?P<suffix>[uU]?(?:[bB]|[sS]|ll|LL|[lL])?)$",
+)
+_FLOAT_RE = re.compile(
+    r"^(?P<num>[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)"
+    r"(?P<suffix>[fFdD]?)$",
+)
+_SPECIAL_FLOATS = {
+    "nan": ("f8", np.nan),
+    "nanf": ("f4", np.nan),
+    "infinity": ("f8", np.inf),
+    "infinityf": ("f4", np.inf),
+    "inf": ("f8", np.inf),
+    "inff": ("f4", np.inf),
+}
+_INT_SUFFIXES = {
+    "": "i4",
+    "b": "i1",
+    "s": "i2",
+    "l": "i4",
+    "ll": "i8",
+    "ub": "u1",
+    "us": "u2",
+    "u": "u4",
+    "ul": "u4",
+    "ull": "u8",
+}
+_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "v": "\v",
+    "0": "\0",
+}
+
+# Placeholder for the `_` fill value marker in the data section
+FILL = object()
+
+
+class CDLError(ValueError):
+    """
+    Raised when CDL text cannot be parsed
+    """
+
+
+def _unescape(text):
+    """
+    Resolve backslash escapes in a CDL string or name
+    """
+    if "\\" not in text:
+        return text
+    out = []
+    chars = iter(text)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            out.append(_ESCAPES.get(escaped, escaped))
+        else:
+            out.append(char)
+    return "".join(out)
+
+
+def _tokenize(text):
+    """
+    Splits CDL text into (kind, value, line) tuples, dropping comments
+    and whitespace
+    """
+    tokens = []
+    pos = 0
+    line = 1
+    length = len(text)
+    while pos < length:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise CDLError(
+                f"Unexpected character {text[pos]!r} on line {line}"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            tokens.append((kind, _unescape(value[1:-1]), line))
+        elif kind in {"punct", "word"}:
+            tokens.append((kind, value, line))
+        line += value.count("\n")
+        pos = match.end()
+    return tokens
+
+
+def _parse_constant(token):
+    """
+    Converts a single CDL constant into a (dtype, value) pair.  Strings
+    return a dtype of "S1" and the fill marker `_` returns (None, FILL).
+    """
+    kind, value, line = token
+    if kind == "string":
+        return "S1", value
+    if value == "_":
+        return None, FILL
+    lower = value.lower().lstrip("+")
+    sign = -1 if lower.startswith("-") else 1
+    special = _SPECIAL_FLOATS.get(lower.lstrip("-"))
+    if special is not None:
+        return special[0], sign * special[1]
+    match = _INT_RE.match(value)
+    if match is not None:
+        number = int(match.group("num"), 0)
+        dtype = _INT_SUFFIXES[match.group("suffix").lower()]
+        # ncgen promotes unsuffixed constants which overflow an int
+        if dtype == "i4" and not -(2**31) <= number < 2**31:
+            dtype = "i8"
+        return dtype, number
+    match = _FLOAT_RE.match(value)
+    if match is not None:
+        dtype = "f4" if match.group("suffix") in {"f", "F"} else "f8"
+        return dtype, float(match.group("num"))
+    raise CDLError(f"Could not parse constant {value!r} on line {line}")
+
+
+def _attribute_value(constants, dtype=None):
+    """
+    Builds the value stored for an attribute from its parsed constants.
+    Strings are concatenated, numbers become a numpy array of either the
+    declared type or the widest type among the constants.
+    """
+    dtypes = [dt for dt, _ in constants]
+    values = [value for _, value in constants]
+    if dtype == "string":
+        return values[0] if len(values) == 1 else values
+    if dtype in {None, "char"} and "S1" in dtypes:
+        return "".join(str(value) for value in values)
+    if dtype is not None:
+        np_dtype = np.dtype(CDL_TYPES[dtype])
+    elif any(dt.startswith("f") for dt in dtypes):
+        np_dtype = np.dtype("f4" if set(dtypes) == {"f4"} else "f8")
+    else:
+        np_dtype = np.result_type(*(np.dtype(dt) for dt in dtypes))
+    return np.array(values, dtype=np_dtype)
+
+
+class _Parser:
+    """
+    Recursive descent parser over the CDL token stream
+    """
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.name = None
+        self.dimensions = {}
+        self.variables = {}
+        self.global_attrs = []
+        self.data = {}
+
+    def peek(self, offset=0):
+        try:
+            return self.tokens[self.pos + offset]
+        except IndexError:
+            return ("eof", None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] == "eof":
+            raise CDLError("Unexpected end of CDL")
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        token = self.next()
+        if token[1] != value or token[0] == "string":
+            raise CDLError(
+                f"Expected {value!r} on line {token[2]}, found {token[1]!r}",
+            )
+        return token
+
+    def parse(self):
+        self.expect("netcdf")
+        self.name = _unescape(self.next()[1])
+        self.expect("{")
+        while self.peek()[1] != "}":
+            section = self.next()
+            self.expect(":")
+            if section[1] == "dimensions":
+                self.parse_dimensions()
+            elif section[1] == "variables":
+                self.parse_variables()
+            elif section[1] == "data":
+                self.parse_data()
+            else:
+                raise CDLError(
+                    f"Unsupported CDL section {section[1]!r} on line "
+                    f"{section[2]}",
+                )
+        self.expect("}")
+        return self
+
+    def at_section(self):
+        kind, value, _ = self.peek()
+        return (
+            kind == "eof"
+            or value == "}"
+            or (
+                kind == "word"
+                and value in {"dimensions", "variables", "data", "types"}
+                and self.peek(1)[1] == ":"
+            )
+        )
+
+    def parse_dimensions(self):
+        while not self.at_section():
+            name = _unescape(self.next()[1])
+            self.expect("=")
+            size = self.next()[1]
+            if size.upper() in {"UNLIMITED", "NC_UNLIMITED"}:
+                self.dimensions[name] = None
+            else:
+                self.dimensions[name] = int(size)
+            # dimensions may be declared one per line or comma separated
+            self.next()
+
+    def parse_variables(self):
+        while not self.at_section():
+            kind, value, line = self.peek()
+            if value == ":":
+                # untyped global attribute
+                self.parse_attribute(None, None)
+            elif value in CDL_TYPES and self.peek(1)[1] == ":":
+                # typed global attribute, type names are reserved words
+                self.next()
+                self.parse_attribute(value, None)
+            elif self.peek(1)[1] == ":":
+                # untyped variable attribute
+                self.parse_attribute(None, _unescape(self.next()[1]))
+            elif value in CDL_TYPES and self.peek(2)[1] == ":":
+                # typed variable attribute
+                self.next()
+                self.parse_attribute(value, _unescape(self.next()[1]))
+            elif value in CDL_TYPES:
+                self.parse_declaration()
+            else:
+                raise CDLError(f"Unexpected {value!r} on line {line}")
+
+    def parse_declaration(self):
+        var_type = self.next()[1]
+        while True:
+            name = _unescape(self.next()[1])
+            dims = ()
+            if self.peek()[1] == "(":
+                self.next()
+                dims = []
+                while True:
+                    dim = self.next()
+                    if dim[1] == ")":
+                        break
+                    if dim[1] == ",":
+                        continue
+                    dim_name = _unescape(dim[1])
+                    if dim_name not in self.dimensions:
+                        raise CDLError(
+                            f"Variable {name} uses undefined dimension "
+                            f"{dim_name} on line {dim[2]}",
+                        )
+                    dims.append(dim_name)
+                dims = tuple(dims)
+            self.variables[name] = {
+                "type": var_type,
+                "dimensions": dims,
+                "attributes": [],
+            }
+            if self.next()[1] == ";":
+                break
+
+    def parse_attribute(self, att_type, var_name):
+        _, _, line = self.expect(":")
+        att_name = _unescape(self.next()[1])
+        self.expect("=")
+        constants = self.parse_constants()
+        value = _attribute_value(constants, att_type)
+        if var_name is None:
+            self.global_attrs.append((att_name, value))
+        elif var_name not in self.variables:
+            raise CDLError(
+                f"Attribute {att_name} for undefined variable {var_name} "
+                f"on line {line}",
+            )
+        else:
+            self.variables[var_name]["attributes"].append((att_name, value))
+
+    def parse_constants(self):
+        constants = []
+        while True:
+            token = self.next()
+            if token[1] == ";" and token[0] == "punct":
+                return constants
+            if token[1] == "," and token[0] == "punct":
+                continue
+            constants.append(_parse_constant(token))
+
+    def parse_data(self):
+        while not self.at_section():
+            name_token = self.next()
+            name = _unescape(name_token[1])
+            if name not in self.variables:
+                raise CDLError(
+                    f"Data for undefined variable {name} on line "
+                    f"{name_token[2]}",
+                )
+            self.expect("=")
+            self.data[name] = self.parse_constants()
+
+
+def parse_cdl(text):
+    """
+    Parses CDL text and returns a dictionary describing the dataset with the
+    keys ``name``, ``dimensions``, ``variables``, ``attributes`` and
+    ``data``.  No netCDF file is created.
+    """
+    parser = _Parser(text).parse()
+    return {
+        "name": parser.name,
+        "dimensions": parser.dimensions,
+        "variables": parser.variables,
+        "attributes": parser.global_attrs,
+        "data": parser.data,
+    }
+
+
+def _infer_format(header):
+    """
+    Mirrors ncgen's default output kind: netCDF classic unless the header
+    needs netCDF-4 features
+    """
+    for var in header["variables"].values():
+        if var["type"] in _NC4_TYPES:
+            return "NETCDF4"
+        for att_name, value in var["attributes"]:
+            if att_name in _SPECIAL_ATTRS or _needs_nc4(value):
+                return "NETCDF4"
+    if any(_needs_nc4(value) for _, value in header["attributes"]):
+        return "NETCDF4"
+    return "NETCDF3_CLASSIC"
+
+
+def _needs_nc4(value):
+    return isinstance(value, list) or (
+        isinstance(value, np.ndarray)
+        and value.dtype.str[1:] in {"u1", "u2", "u4", "i8", "u8"}
+    )
+
+
+def _variable_data(dims, constants, dtype):
+    """
+    Converts the constants from the data section to an array of the
+    variable's shape, masking any fill values.  A leading dimension of -1
+    is sized from the number of values, and short data is padded with fill.
+    """
+    if dtype == "S1":
+        # each string fills one row of the trailing string length dimension
+        strlen = dims[-1] if dims else 1
+        values = []
+        for _, value in constants:
+            encoded = b"" if value is FILL else str(value).encode("utf-8")
+            encoded = encoded[:strlen].ljust(strlen, b"\0")
+            values.extend(encoded[i : i + 1] for i in range(strlen))
+        values = [FILL if value == b"\0" else value for value in values]
+    else:
+        values = [value for _, value in constants]
+
+    row_size = int(np.prod(dims[1:], dtype=int)) if dims else 1
+    if dims and dims[0] == -1:
+        size = -(-len(values) // row_size) * row_size
+    else:
+        size = int(np.prod(dims, dtype=int))
+    values = values[:size] + [FILL] * (size - len(values))
+    mask = [value is FILL for value in values]
+    if dtype is str:
+        data = np.ma.masked_array(
+            ["" if value is FILL else value for value in values],
+            mask=mask,
+            dtype=object,
+        )
+    else:
+        data = np.ma.masked_array(
+            [0 if value is FILL else value for value in values],
+            mask=mask,
+            dtype=dtype,
+        )
+    if dims:
+        return data.reshape(-1, *dims[1:])
+    return data.reshape(())
+
+
+def cdl_to_dataset(text, name=None, file_format=None):
+    """
+    Builds an in-memory netCDF4.Dataset from CDL text.
+
+    :param str text: The CDL to parse
+    :param str name: The name given to the in-memory dataset, defaults to the
+                     name in the CDL ``netcdf <name> {`` header
+    :param str file_format: netCDF format to use.  Defaults to the same
+                            format ncgen would pick for the header
+    :return: A diskless netCDF4.Dataset which is discarded when closed
+    """
+    header = parse_cdl(text)
+    name = name or f"{header['name']}-{uuid.uuid4().hex}"
+    dataset = Dataset(
+        name,
+        "w",
+        diskless=True,
+        persist=False,
+        format=file_format or _infer_format(header),
+    )
+    try:
+        _populate(dataset, header)
+    except Exception:
+        dataset.close()
+        raise
+    return dataset
+
+
+def cdl_to_bytes(text, file_format=None):
+    """
+    Builds a netCDF file from CDL text entirely in memory and returns its
+    contents, the equivalent of ``ncgen -o`` without the subprocess.
+
+    :param str text: The CDL to parse
+    :param str file_format: netCDF format to use.  Defaults to the same
+                            format ncgen would pick for the header
+    :return: bytes of the netCDF file
+    """
+    header = parse_cdl(text)
+    dataset = Dataset(
+        f"{header['name']}-{uuid.uuid4().hex}",
+        "w",
+        memory=len(text),
+        format=file_format or _infer_format(header),
+    )
+    try:
+        _populate(dataset, header)
+    except Exception:
+        dataset.close()
+        raise
+    return bytes(dataset.close())
+
+
+def _populate(dataset, header):
+    """
+    Creates the dimensions, variables, attributes and data described by a
+    parsed CDL header in an open, writable dataset
+    """
+    for dim_name, size in header["dimensions"].items():
+        # unlimited dimensions take their length from the data section
+        dataset.createDimension(dim_name, size)
+
+    for var_name, var in header["variables"].items():
+        dtype = CDL_TYPES[var["type"]]
+        kwargs = {}
+        attributes = []
+        for att_name, value in var["attributes"]:
+            if att_name == "_FillValue":
+                if dtype is str:
+                    kwargs["fill_value"] = value
+                else:
+                    kwargs["fill_value"] = np.array(value, dtype=dtype)
+            elif att_name == "_NoFill":
+                kwargs["fill_value"] = False
+            elif att_name in _SPECIAL_ATTRS:
+                kwargs.update(_special_kwarg(att_name, value))
+            else:
+                attributes.append((att_name, value))
+        ncvar = dataset.createVariable(
+            var_name,
+            dtype,
+            var["dimensions"],
+            **kwargs,
+        )
+        _set_attributes(ncvar, attributes)
+
+    _set_attributes(dataset, header["attributes"])
+
+    for var_name, constants in header["data"].items():
+        ncvar = dataset.variables[var_name]
+        values = _variable_data(
+            _data_shape(header, ncvar),
+            constants,
+            CDL_TYPES[header["variables"][var_name]["type"]],
+        )
+        # anything left unwritten is already the fill value
+        if np.ma.getmaskarray(values).all():
+            continue
+        if ncvar.dimensions:
+            ncvar[: values.shape[0]] = values
+        else:
+            ncvar.assignValue(values)
+
+
+def _set_attributes(obj, attributes):
+    for att_name, value in attributes:
+        if isinstance(value, list):
+            obj.setncattr_string(att_name, value)
+        else:
+            obj.setncattr(att_name, value)
+
+
+def _data_shape(header, ncvar):
+    """
+    The shape of a variable's data with the length of an unlimited leading
+    dimension left as -1
+    """
+    return [header["dimensions"][dim] or -1 for dim in ncvar.dimensions]
+
+
+def _special_kwarg(att_name, value):
+    """
+    Maps ncgen's special storage attributes onto createVariable keyword
+    arguments
+    """
+    kwarg = _SPECIAL_ATTRS[att_name]
+    if kwarg == "chunksizes":
+        return {kwarg: [int(size) for size in np.atleast_1d(value)]}
+    if kwarg == "complevel":
+        return {kwarg: int(value), "zlib": True}
+    if kwarg == "contiguous":
+        return {kwarg: str(value).lower() == "contiguous"}
+    if kwarg == "endian":
+        return {kwarg: str(value).lower()}
+    return {kwarg: str(value).lower() in {"true", "1"}}
+
+
+def read_cdl(path, file_format=None):
+    """
+    Reads a CDL file and returns an in-memory netCDF4.Dataset for it.  See
+    `cdl_to_dataset`.
+    """
+    with open(path, encoding="utf-8") as cdl_file:
+        text = cdl_file.read()
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cdl_to_dataset(text, f"{name}-{uuid.uuid4().hex}", file_format)
+
+
+def is_cdl(path):
+    """
+    Returns True if the path looks like a CDL file
+    """
+    return os.fspath(path).lower().endswith(".cdl")
@@ -0,0 +1,311 @@
+"""
+cc_plugin_glider/classic.py
+
+Memory-mapped reader for netCDF-3 classic, 64-bit offset and 64-bit data
+(CDF-1, CDF-2 and CDF-5) files.
+
+The classic formats store every variable at a fixed offset, so variable data
+can be exposed as numpy views over a memory map of the file instead of being
+copied out through the netCDF library.  Record variables are interleaved,
+and are exposed as strided views with one stride per record.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"CDF"
+# nc_type codes to big-endian numpy dtypes
+NC_TYPES = {
+    1: ">i1",
+    2: "S1",
+    3: ">i2",
+    4: ">i4",
+    5: ">f4",
+    6: ">f8",
+    7: ">u1",
+    8: ">u2",
+    9: ">u4",
+    10: ">i8",
+    11: ">u8",
+}
+# netCDF default fill values, used when a variable has no _FillValue, by
+# dtype kind and size without the byte order, which numpy reports as "|"
+# rather than ">" for single byte types
+DEFAULT_FILLS = {
+    "i1": -127,
+    "i2": -32767,
+    "i4": -2147483647,
+    "f4": 9.9692099683868690e36,
+    "f8": 9.9692099683868690e36,
+    "u1": 255,
+    "u2": 65535,
+    "u4": 4294967295,
+    "i8": -9223372036854775806,
+    "u8": 18446744073709551614,
+}
+NC_DIMENSION = 10
+NC_VARIABLE = 11
+NC_ATTRIBUTE = 12
+STREAMING = 0xFFFFFFFF
+# attributes which need a data transform the views can't express
+_UNPACK_ATTRS = {"scale_factor", "add_offset"}
+
+
+class ClassicFormatError(ValueError):
+    """
+    Raised when a buffer is not a netCDF classic format file
+    """
+
+
+def is_classic(path):
+    """
+    Returns True if the file at path starts with a netCDF classic magic
+    number
+    """
+    try:
+        with open(path, "rb") as nc_file:
+            magic = nc_file.read(4)
+    except OSError:
+        return False
+    return magic[:3] == MAGIC and magic[3:] in {b"\x01", b"\x02", b"\x05"}
+
+
+class _HeaderParser:
+    """
+    Parses the big-endian classic header directly out of a byte buffer
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 4
+        version = buf[3]
+        # CDF-5 uses 64-bit counts, CDF-2 and CDF-5 use 64-bit offsets
+        self.size_fmt = ">Q" if version == 5 else ">I"
+        self.offset_fmt = ">I" if version == 1 else ">Q"
+
+    def unpack(self, fmt):
+        (value,) = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def size(self):
+        return self.unpack(self.size_fmt)
+
+    def name(self):
+        length = self.size()
+        name = bytes(self.buf[self.pos : self.pos + length]).decode("utf-8")
+        self.pos += -(-length // 4) * 4
+        return name
+
+    def list_header(self, tag):
+        found = self.unpack(">I")
+        count = self.size()
+        if found not in {0, tag}:
+            raise ClassicFormatError(f"Unexpected header tag {found}")
+        return count
+
+    def attributes(self):
+        attributes = {}
+        for _ in range(self.list_header(NC_ATTRIBUTE)):
+            name = self.name()
+            dtype = np.dtype(NC_TYPES[self.unpack(">I")])
+            count = self.size()
+            raw = bytes(self.buf[self.pos : self.pos + count * dtype.itemsize])
+            self.pos += -(-len(raw) // 4) * 4
+            if dtype.kind == "S":
+                attributes[name] = raw.decode("utf-8", "replace").rstrip("\0")
+            else:
+                value = np.frombuffer(raw, dtype).astype(
+                    dtype.newbyteorder("=")
+                )
+                attributes[name] = value[0] if count == 1 else value
+        return attributes
+
+
+class ClassicVariable:
+    """
+    Location and layout of one variable in a classic format file
+    """
+
+    __slots__ = (
+        "name",
+        "dimensions",
+        "shape",
+        "dtype",
+        "attributes",
+        "vsize",
+        "begin",
+        "is_record",
+    )
+
+    def __init__(
+        self,
+        name,
+        dimensions,
+        shape,
+        dtype,
+        attributes,
+        vsize,
+        begin,
+    ):
+        self.name = name
+        self.dimensions = dimensions
+        self.shape = shape
+        self.dtype = dtype
+        self.attributes = attributes
+        self.vsize = vsize
+        self.begin = begin
+        self.is_record = bool(shape) and shape[0] is None
+
+
+class ClassicReader:
+    """
+    Zero-copy access to the variables of a netCDF classic format file.
+
+    :param source: A path to a classic format file, or a buffer holding one
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buffer = np.frombuffer(source, dtype=np.uint8)
+        else:
+            self._buffer = np.memmap(
+                os.fspath(source), dtype=np.uint8, mode="r"
+            )
+        if self._buffer.size < 8 or bytes(self._buffer[:3]) != MAGIC:
+            raise ClassicFormatError("Not a netCDF classic format file")
+        self._parse_header()
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """
+        Returns a reader for the file backing an open netCDF4.Dataset, or
+        None if the dataset isn't a classic format file on disk
+        """
+        if not getattr(dataset, "data_model", "").startswith("NETCDF3"):
+            return None
+        try:
+            path = dataset.filepath()
+        except (ValueError, AttributeError):
+            return None
+        if not os.path.isfile(path) or not is_classic(path):
+            return None
+        return cls(path)
+
+    def _parse_header(self):
+        parser = _HeaderParser(self._buffer)
+        numrecs = parser.size()
+        dimensions = []
+        for _ in range(parser.list_header(NC_DIMENSION)):
+            name = parser.name()
+            dimensions.append((name, parser.size() or None))
+        self.dimensions = dict(dimensions)
+        self.attributes = parser.attributes()
+
+        self.variables = {}
+        for _ in range(parser.list_header(NC_VARIABLE)):
+            name = parser.name()
+            dim_ids = [parser.size() for _ in range(parser.size())]
+            attributes = parser.attributes()
+            dtype = np.dtype(NC_TYPES[parser.unpack(">I")])
+            vsize = parser.size()
+            begin = parser.unpack(parser.offset_fmt)
+            var_dims = tuple(dimensions[dim_id][0] for dim_id in dim_ids)
+            shape = tuple(dimensions[dim_id][1] for dim_id in dim_ids)
+            self.variables[name] = ClassicVariable(
+                name,
+                var_dims,
+                shape,
+                dtype,
+                attributes,
+                vsize,
+                begin,
+            )
+
+        record_vars = [v for v in self.variables.values() if v.is_record]
+        self.record_size = sum(v.vsize for v in record_vars)
+        if len(record_vars) == 1:
+            # a lone record variable isn't padded between records
+            var = record_vars[0]
+            self.record_size = var.dtype.itemsize * int(
+                np.prod(var.shape[1:], dtype=int),
+            )
+        if numrecs == STREAMING and record_vars:
+            first = min(v.begin for v in record_vars)
+            numrecs = (self._buffer.size - first) // max(self.record_size, 1)
+        self.numrecs = numrecs
+
+    def view(self, var_name):
+        """
+        Returns the raw data of a variable as a read-only numpy view of the
+        file, without applying fill value masking
+        """
+        var = self.variables[var_name]
+        shape = var.shape[1:] if var.is_record else var.shape
+        # C ordered strides within a record, or for the whole variable
+        strides = []
+        step = var.dtype.itemsize
+        for size in reversed(shape):
+            strides.insert(0, step)
+            step *= size
+        if var.is_record:
+            shape = (self.numrecs, *shape)
+            strides.insert(0, self.record_size)
+        array = np.ndarray(
+            shape=shape,
+            dtype=var.dtype,
+            buffer=self._buffer,
+            offset=var.begin,
+            strides=tuple(strides),
+        )
+        array.flags.writeable = False
+        return array
+
+    def read(self, var_name):
+        """
+        Returns a variable's data as a masked array over a zero-copy view,
+        masked the same way netCDF4 masks values by default.  Returns None if
+        the variable is packed with scale_factor/add_offset and so can't be
+        read without a copy.
+        """
+        var = self.variables[var_name]
+        if _UNPACK_ATTRS.intersection(var.attributes):
+            return None
+        data = self.view(var_name)
+        if var.dtype.kind == "S":
+            return np.ma.masked_equal(data, b"", copy=False)
+        mask = np.zeros(data.shape, dtype=bool)
+        fill_value = var.attributes.get(
+            "_FillValue",
+            DEFAULT_FILLS.get(var.dtype.str[1:]),
+        )
+        for missing in (fill_value, var.attributes.get("missing_value")):
+            if missing is None:
+                continue
+            missing = np.atleast_1d(missing)
+            if var.dtype.kind == "f" and np.isnan(missing).any():
+                mask |= np.isnan(data)
+            mask |= np.isin(data, missing)
+        valid_range = var.attributes.get("valid_range")
+        valid_min = var.attributes.get("valid_min")
+        valid_max = var.attributes.get("valid_max")
+        if valid_range is not None and len(valid_range) == 2:
+            valid_min, valid_max = valid_range
+        if valid_min is not None:
+            mask |= data < valid_min
+        if valid_max is not None:
+            mask |= data > valid_max
+        return np.ma.masked_array(
+            data,
+            mask=mask if mask.any() else np.ma.nomask,
+            fill_value=fill_value,
+            copy=False,
+        )
+
+    def close(self):
+        """
+        Releases the memory map
+        """
+        self._buffer = None
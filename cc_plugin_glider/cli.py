@@ -0,0 +1,327 @@
+"""
+cc_plugin_glider/cli.py
+
+Command line tools for batch and long-running Glider DAC validation.
+"""
+
+import argparse
+import functools
+import sys
+
+from cc_plugin_glider import daemon, ndjson, report, watch
+from cc_plugin_glider.glider_dac import GliderCheck
+
+
+def parse_options(options):
+    """
+    Converts ``-O`` values into the option set GliderCheck expects.  The
+    ``gliderdac:`` prefix used by compliance-checker is optional.
+    """
+    return {option.removeprefix("gliderdac:") for option in options or []}
+
+
+def iter_paths(paths, stream=None):
+    """
+    Yields the paths given on the command line, or reads one path per line
+    from a stream (stdin by default) when none are given
+    """
+    if paths:
+        yield from paths
+        return
+    for line in stream or sys.stdin:
+        path = line.strip()
+        if path:
+            yield path
+
+
+def add_check_arguments(parser):
+    """
+    Adds the arguments shared by the commands which run checks
+    """
+    parser.add_argument(
+        "-O",
+        "--option",
+        action="append",
+        default=[],
+        help="Checker option, e.g. ignore_attributes:ancillary_variables",
+    )
+    parser.add_argument(
+        "-i",
+        "--include",
+        action="append",
+        default=[],
+        help="Only run the named check methods",
+    )
+    parser.add_argument(
+        "-s",
+        "--skip",
+        action="append",
+        default=[],
+        help="Skip a check, optionally with a level, e.g. check_dtype:L",
+    )
+
+
+def stream(args):
+    """
+    Validates files and streams the results to stdout as NDJSON
+    """
+    checker = GliderCheck(options=parse_options(args.option))
+    ndjson.write_ndjson(
+        iter_paths(args.paths),
+        sys.stdout,
+        checker,
+        per_check=args.per_check,
+        include_checks=args.include,
+        skip_checks=args.skip,
+    )
+    return 0
+
+
+def write_report(args):
+    """
+    Validates files and writes their results to a columnar report
+    """
+    checker = GliderCheck(options=parse_options(args.option))
+    files = report.write_report(
+        iter_paths(args.paths),
+        args.output,
+        checker,
+        report_type=args.format,
+        include_checks=args.include,
+        skip_checks=args.skip,
+        row_group_size=args.row_group_size,
+    )
+    sys.stderr.write(f"Wrote {files} files to {args.output}\n")
+    return 0
+
+
+def worker_count(args):
+    """
+    Returns the number of workers of the serve and watch commands, two
+    processes or a single thread unless given
+    """
+    if args.workers is not None:
+        return args.workers
+    return 1 if args.threads else 2
+
+
+def serve(args):
+    """
+    Runs the validation daemon
+    """
+    daemon.serve(
+        host=args.host,
+        port=args.port,
+        options=parse_options(args.option),
+        workers=worker_count(args),
+        max_pending=args.max_pending,
+        use_processes=not args.threads,
+        root=args.root,
+        check_threads=args.check_threads,
+        refresh_interval=args.refresh_interval,
+    )
+    return 0
+
+
+def watch_folder(args):
+    """
+    Watches a directory and validates new or changed files
+    """
+    service = daemon.ValidationService(
+        functools.partial(GliderCheck, options=parse_options(args.option)),
+        workers=worker_count(args),
+        use_processes=not args.threads,
+        refresh_interval=args.refresh_interval,
+    )
+    try:
+        watch.watch(
+            args.directory,
+            service,
+            results=args.results,
+            patterns=args.pattern or ["*.nc"],
+            interval=args.interval,
+            queue_size=args.queue_size,
+            use_inotify=not args.poll,
+        )
+    finally:
+        service.shutdown()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cc-plugin-glider",
+        description="Glider DAC compliance checking tools",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stream_parser = subparsers.add_parser(
+        "stream",
+        help=(
+            "Validate files and write one JSON line per file to stdout as "
+            "each file is checked"
+        ),
+    )
+    add_check_arguments(stream_parser)
+    stream_parser.add_argument(
+        "--per-check",
+        action="store_true",
+        help="Write one JSON line per check instead of per file",
+    )
+    stream_parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Files to validate, read from stdin if not given",
+    )
+    stream_parser.set_defaults(func=stream)
+
+    report_parser = subparsers.add_parser(
+        "report",
+        help=(
+            "Validate files and write one row per check result to a "
+            "Parquet, Arrow or CSV report"
+        ),
+    )
+    add_check_arguments(report_parser)
+    report_parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Report file, its extension chooses the format",
+    )
+    report_parser.add_argument(
+        "--format",
+        choices=report.FORMATS,
+        help="Report format, defaults to Parquet when pyarrow is installed "
+        "and CSV otherwise",
+    )
+    report_parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=65536,
+        help="Rows written at once",
+    )
+    report_parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Files to validate, read from stdin if not given",
+    )
+    report_parser.set_defaults(func=write_report)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run a localhost validation daemon with warm checkers",
+    )
+    serve_parser.add_argument(
+        "-O",
+        "--option",
+        action="append",
+        default=[],
+        help="Checker option, e.g. ignore_attributes:ancillary_variables",
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8642)
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes, each with its own warm checker, "
+        "defaults to 2, or 1 with --threads",
+    )
+    serve_parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="Requests allowed in flight before returning 503, "
+        "defaults to four per worker",
+    )
+    serve_parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="Run a single worker thread instead of worker processes, "
+        "netCDF access isn't thread-safe so --workers must then be 1",
+    )
+    serve_parser.add_argument(
+        "--root",
+        help="Only allow validating paths inside this directory",
+    )
+    serve_parser.add_argument(
+        "--check-threads",
+        type=int,
+        default=1,
+        help="Threads per worker running a file's metadata checks while "
+        "its data checks read the file",
+    )
+    serve_parser.add_argument(
+        "--refresh-interval",
+        type=float,
+        help="Seconds between reloads of the vocabularies in the background",
+    )
+    serve_parser.set_defaults(func=serve)
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Watch a directory and validate files as they arrive",
+    )
+    watch_parser.add_argument(
+        "-O",
+        "--option",
+        action="append",
+        default=[],
+        help="Checker option, e.g. ignore_attributes:ancillary_variables",
+    )
+    watch_parser.add_argument(
+        "--pattern",
+        action="append",
+        default=[],
+        help="File name pattern to watch, defaults to *.nc",
+    )
+    watch_parser.add_argument(
+        "--results",
+        help="Append results to this NDJSON file instead of writing a "
+        ".gliderdac.json file next to each file",
+    )
+    watch_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes, each with its own warm checker, "
+        "defaults to 2, or 1 with --threads",
+    )
+    watch_parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="Run a single worker thread instead of worker processes, "
+        "netCDF access isn't thread-safe so --workers must then be 1",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Seconds between scans, a file is validated once its size and "
+        "modification time are unchanged between two scans",
+    )
+    watch_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Files waiting for a worker before scanning pauses",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Always poll, even where inotify is available",
+    )
+    watch_parser.add_argument(
+        "--refresh-interval",
+        type=float,
+        help="Seconds between reloads of the vocabularies in the background",
+    )
+    watch_parser.add_argument("directory", help="Directory to watch")
+    watch_parser.set_defaults(func=watch_folder)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "threads", False) and worker_count(args) > 1:
+        parser.error("--threads runs a single worker, omit --workers")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
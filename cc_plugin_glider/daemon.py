@@ -0,0 +1,464 @@
+"""
+cc_plugin_glider/daemon.py
+
+Long-running validation service.
+
+Keeps a pool of workers alive, each holding a warm GliderCheck with its
+authority tables already loaded, and accepts validation requests for local
+paths or netCDF request bodies over a localhost HTTP server.  The netCDF
+library isn't thread-safe, so each worker is a separate process, or a
+single worker runs on a thread.
+
+With a refresh interval, each worker reloads its own checker's tables in the
+background with a `tables.TableRefresher`, keeping the checker, its cached
+results and its indexes, and reports the version and age of its tables back
+to the service over a queue.
+"""
+
+import functools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cc_plugin_glider import api, ndjson, tables
+from cc_plugin_glider.glider_dac import GliderCheck
+
+# per worker state, a process global in worker processes or per thread
+# when running with threads
+_worker = threading.local()
+
+
+class ServiceBusy(RuntimeError):
+    """
+    Raised when the service already has the maximum number of pending
+    requests
+    """
+
+
+def _init_worker(
+    checker_factory,
+    generation=0,
+    refresh_interval=None,
+    reports=None,
+    refreshers=None,
+):
+    """
+    Builds a worker's checker and, with a refresh interval, starts
+    refreshing its tables.  Each refresh is reported on the `reports` queue
+    as (generation, worker ID, table status).  Worker threads add their
+    refreshers to `refreshers`, so the service can stop them with the pool.
+    """
+    _worker.checker = checker_factory()
+    _worker.id = f"{os.getpid()}/{threading.current_thread().name}"
+    _worker.refresher = None
+    if refresh_interval:
+        worker_id = _worker.id
+        _worker.refresher = tables.TableRefresher(
+            _worker.checker,
+            refresh_interval,
+            on_refresh=lambda status: reports.put(
+                (generation, worker_id, status),
+            ),
+        ).start()
+        if refreshers is not None:
+            refreshers.append(_worker.refresher)
+
+
+def _table_status():
+    if _worker.refresher is not None:
+        return _worker.refresher.status()
+    return {**_worker.checker.table_status(), "last_error": None}
+
+
+def _warm_up():
+    return _worker.id, _table_status()
+
+
+def _validate(source, include_checks, skip_checks, check_threads=1):
+    name = api.source_name(source)
+    results, errors = api.validate(
+        source,
+        checker=_worker.checker,
+        include_checks=include_checks,
+        skip_checks=skip_checks,
+        workers=check_threads,
+    )
+    return ndjson.file_record(name, results, errors)
+
+
+class ValidationService:
+    """
+    A pool of warm checkers which validate paths or in-memory buffers.
+
+    :param checker_factory: Callable returning a new GliderCheck, called once
+                            per worker.  Must be picklable with processes
+    :param int workers: Number of workers
+    :param int max_pending: Maximum number of requests queued or running at
+                            once, further requests raise ServiceBusy
+    :param bool use_processes: Run workers as processes rather than a
+                               thread, which allows only one worker as
+                               netCDF access isn't thread-safe
+    :param str root: If given, only paths inside this directory may be
+                     validated
+    :param int check_threads: Threads each worker uses to run the metadata
+                              checks of a file while its data is read
+    :param float refresh_interval: If given, seconds between reloads of the
+                                   vocabularies by each worker, in the
+                                   background
+    """
+
+    def __init__(
+        self,
+        checker_factory=GliderCheck,
+        workers=2,
+        max_pending=None,
+        use_processes=True,
+        root=None,
+        check_threads=1,
+        refresh_interval=None,
+    ):
+        if not use_processes and workers > 1:
+            raise ValueError(
+                "netCDF access isn't thread-safe, use worker processes for "
+                "more than one worker",
+            )
+        self.checker_factory = checker_factory
+        self.workers = workers
+        self.check_threads = check_threads
+        self.max_pending = max_pending or workers * 4
+        self.use_processes = use_processes
+        self.root = os.path.realpath(root) if root else None
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.refresh_interval = refresh_interval
+        # worker processes report their tables through a queue they inherit
+        self._mp_context = multiprocessing.get_context()
+        self._reports = None
+        if refresh_interval:
+            self._reports = (
+                self._mp_context.Queue()
+                if use_processes
+                else queue.SimpleQueue()
+            )
+            threading.Thread(
+                target=self._collect_reports,
+                name="table-reports",
+                daemon=True,
+            ).start()
+        # reloads start a new generation of workers
+        self._generation = 1
+        (
+            self._executor,
+            self._worker_tables,
+            self._refreshers,
+        ) = self._start_executor(self._generation)
+        self.loaded_at = time.time()
+
+    def _start_executor(self, generation):
+        """
+        Starts a new pool and waits until every worker has built its checker
+
+        :return: The pool, its workers' table status by worker ID, and the
+                 refreshers of worker threads
+        """
+        refreshers = None if self.use_processes else []
+        if self.use_processes:
+            pool_class = functools.partial(
+                ProcessPoolExecutor,
+                mp_context=self._mp_context,
+            )
+        else:
+            pool_class = ThreadPoolExecutor
+        executor = pool_class(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                self.checker_factory,
+                generation,
+                self.refresh_interval,
+                self._reports,
+                refreshers,
+            ),
+        )
+        warm_up = [executor.submit(_warm_up) for _ in range(self.workers)]
+        try:
+            worker_tables = dict(future.result() for future in warm_up)
+        except BaseException:
+            executor.shutdown(wait=False)
+            _stop_refreshers(refreshers)
+            raise
+        return executor, worker_tables, refreshers
+
+    def _collect_reports(self):
+        """
+        Records the table status each worker reports after a refresh
+        """
+        while True:
+            report = self._reports.get()
+            if report is None:
+                return
+            generation, worker_id, table_status = report
+            with self._swap_lock:
+                # reports from the workers of a replaced pool are dropped
+                if generation == self._generation:
+                    self._worker_tables[worker_id] = table_status
+
+    def reload(self):
+        """
+        Builds a new pool with freshly loaded vocabularies and swaps it in.
+        Requests keep being served by the old pool until the new one is
+        warm, and requests already running on the old pool finish normally.
+        Workers refreshing their tables in the background don't need this,
+        it forces every worker to start again from new tables.
+        """
+        with self._reload_lock:
+            generation = self._generation + 1
+            executor, worker_tables, refreshers = self._start_executor(
+                generation,
+            )
+            with self._swap_lock:
+                self._generation = generation
+                old_executor, self._executor = self._executor, executor
+                old_refreshers, self._refreshers = self._refreshers, refreshers
+                self._worker_tables = worker_tables
+            self.loaded_at = time.time()
+            old_executor.shutdown(wait=False)
+            _stop_refreshers(old_refreshers)
+
+    def submit(self, source, include_checks=None, skip_checks=None):
+        """
+        Queues a path or buffer for validation.
+
+        :return: A concurrent.futures.Future of the file record, see
+                 `ndjson.file_record`
+        :raises ServiceBusy: if `max_pending` requests are already pending
+        """
+        if not isinstance(source, api.BUFFER_TYPES):
+            source = self.resolve_path(source)
+        elif self.use_processes and not isinstance(source, bytes):
+            # buffers are pickled to reach worker processes
+            source = bytes(source)
+        if not self._pending.acquire(blocking=False):
+            raise ServiceBusy(
+                f"{self.max_pending} validation requests already pending",
+            )
+        try:
+            with self._swap_lock:
+                future = self._executor.submit(
+                    _validate,
+                    source,
+                    include_checks,
+                    skip_checks,
+                    self.check_threads,
+                )
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def validate(self, source, include_checks=None, skip_checks=None):
+        """
+        Validates a path or buffer and waits for the file record
+        """
+        return self.submit(source, include_checks, skip_checks).result()
+
+    def resolve_path(self, path):
+        """
+        Returns the absolute path to validate, rejecting paths outside of
+        `root` when it is set
+        """
+        path = os.path.realpath(path)
+        if self.root is None:
+            return path
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise PermissionError(f"{path} is outside of {self.root}")
+        return path
+
+    def table_status(self):
+        """
+        Returns the table version of the workers, or None while they differ,
+        when the oldest of their tables were last loaded, and the last error
+        of a worker's background reload, if its last reload failed
+        """
+        with self._swap_lock:
+            worker_tables = list(self._worker_tables.values())
+        versions = {status["table_version"] for status in worker_tables}
+        errors = [
+            status["last_error"]
+            for status in worker_tables
+            if status["last_error"]
+        ]
+        return {
+            "table_version": versions.pop() if len(versions) == 1 else None,
+            "tables_loaded_at": min(
+                status["loaded_at"] for status in worker_tables
+            ),
+            "last_reload_error": errors[0] if errors else None,
+        }
+
+    @property
+    def table_version(self):
+        return self.table_status()["table_version"]
+
+    def status(self):
+        table_status = self.table_status()
+        return {
+            "workers": self.workers,
+            "check_threads": self.check_threads,
+            "use_processes": self.use_processes,
+            "max_pending": self.max_pending,
+            "loaded_at": self.loaded_at,
+            **table_status,
+            "vocabulary_age": time.time() - table_status["tables_loaded_at"],
+            "refresh_interval": self.refresh_interval,
+        }
+
+    def shutdown(self, wait=True):
+        with self._swap_lock:
+            self._executor.shutdown(wait=wait)
+        _stop_refreshers(self._refreshers)
+        if self._reports is not None:
+            self._reports.put(None)
+
+
+def _stop_refreshers(refreshers):
+    """
+    Stops the refreshers of worker threads, which outlive their pool
+    """
+    for refresher in refreshers or ():
+        refresher.stop()
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface to a ValidationService:
+
+    ``GET /status``
+        Pool and vocabulary status
+    ``POST /validate?path=<path>``
+        Validate a local file
+    ``POST /validate`` with a netCDF request body
+        Validate the body in memory
+    ``POST /reload``
+        Reload the authority tables without interrupting requests
+
+    ``include`` and ``skip`` query parameters select checks as with the
+    compliance-checker ``-i`` and ``-s`` options.
+    """
+
+    service = None
+
+    def send_json(self, status, body):
+        payload = ndjson.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            self.send_json(HTTPStatus.OK, self.service.status())
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/reload":
+            self.service.reload()
+            self.send_json(HTTPStatus.OK, self.service.status())
+            return
+        if url.path != "/validate":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if "path" in query:
+            source = query["path"][0]
+        elif length:
+            source = self.rfile.read(length)
+        else:
+            self.send_json(
+                HTTPStatus.BAD_REQUEST,
+                {"error": "Provide a path parameter or a netCDF body"},
+            )
+            return
+
+        try:
+            record = self.service.validate(
+                source,
+                _split(query.get("include")),
+                _split(query.get("skip")),
+            )
+        except ServiceBusy as e:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)})
+        except PermissionError as e:
+            self.send_json(HTTPStatus.FORBIDDEN, {"error": str(e)})
+        except Exception as e:
+            self.send_json(
+                HTTPStatus.BAD_REQUEST,
+                {"error": f"{type(e).__name__}: {e}"},
+            )
+        else:
+            self.send_json(HTTPStatus.OK, record)
+
+
+def _split(values):
+    if not values:
+        return None
+    return [item for value in values for item in value.split(",") if item]
+
+
+def make_server(service, host="127.0.0.1", port=8642):
+    """
+    Creates an HTTP server for a ValidationService.  Call
+    ``serve_forever()`` on the result to start handling requests.
+    """
+    handler = type(
+        "BoundValidationRequestHandler",
+        (ValidationRequestHandler,),
+        {"service": service},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(
+    host="127.0.0.1",
+    port=8642,
+    options=None,
+    workers=2,
+    max_pending=None,
+    use_processes=True,
+    root=None,
+    check_threads=1,
+    refresh_interval=None,
+):
+    """
+    Runs the validation service until interrupted
+    """
+    service = ValidationService(
+        functools.partial(GliderCheck, options=options),
+        workers=workers,
+        max_pending=max_pending,
+        use_processes=use_processes,
+        root=root,
+        check_threads=check_threads,
+        refresh_interval=refresh_interval,
+    )
+    server = make_server(service, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
@@ -5,19 +5,91 @@ Compliance Test Suite for the IOOS National Glider Data Assembly Center
 https://ioos.github.io/glider-dac/
 """
 
-import os
-import warnings
-from io import BytesIO
+import functools
+import itertools
+import re
+import time
 
 import numpy as np
-import requests
 from compliance_checker import __version__
 from compliance_checker.base import BaseCheck, BaseNCCheck, Result, TestCtx
 from compliance_checker.cf import CF1_6Check
-from lxml import etree
-from requests.exceptions import RequestException
 
-from cc_plugin_glider import util
+from cc_plugin_glider import (
+    cache,
+    lazy,
+    parallel,
+    rules,
+    suggest,
+    tables,
+    templates,
+    util,
+)
+from cc_plugin_glider.classic import ClassicReader
+
+# QARTOD flag variables for any parameter, e.g. qartod_salinity_spike_flag,
+# and for whole-file tests, e.g. qartod_location_flag
+QARTOD_VARIABLE = re.compile(r"qartod_\w+_flag")
+
+
+def _is_byte(value):
+    dtype = getattr(value, "dtype", None)
+    return dtype is not None and util.compare_dtype(dtype, np.dtype("|i1"))
+
+
+# Rules applied to the attributes of every QARTOD flag variable, in order.
+# Each returns whether the variable passes, or None when it doesn't apply,
+# and is paired with the template ID of its message, see templates.py.
+QARTOD_RULES = (
+    (
+        lambda attrs: attrs.get("valid_min") is not None,
+        "qartod_valid_min_missing",
+    ),
+    (
+        lambda attrs: (
+            _is_byte(attrs["valid_min"])
+            if attrs.get("valid_min") is not None
+            else None
+        ),
+        "qartod_valid_min_byte",
+    ),
+    (
+        lambda attrs: attrs.get("valid_max") is not None,
+        "qartod_valid_max_missing",
+    ),
+    (
+        lambda attrs: (
+            _is_byte(attrs["valid_max"])
+            if attrs.get("valid_max") is not None
+            else None
+        ),
+        "qartod_valid_max_byte",
+    ),
+    (
+        lambda attrs: attrs.get("_FillValue") == np.int8(9),
+        "qartod_fill_value",
+    ),
+    (
+        lambda attrs: attrs.get("long_name", ""),
+        "qartod_long_name",
+    ),
+    (
+        lambda attrs: attrs.get("flag_meanings", ""),
+        "qartod_flag_meanings",
+    ),
+    (
+        lambda attrs: isinstance(attrs.get("flag_values"), np.ndarray),
+        "qartod_flag_values",
+    ),
+    (
+        lambda attrs: (
+            util.compare_dtype(attrs["flag_values"].dtype, np.dtype("|i1"))
+            if isinstance(attrs.get("flag_values"), np.ndarray)
+            else None
+        ),
+        "qartod_flag_values_byte",
+    ),
+)
 
 
 class GliderCheck(BaseNCCheck):
@@ -27,102 +99,441 @@ class GliderCheck(BaseNCCheck):
     _cc_checker_version = __version__
     _cc_url = "https://ioos.github.io/glider-dac/ngdac-netcdf-file-format-version-2.html"
     _cc_display_headers = {3: "Required", 2: "Recommended", 1: "Suggested"}
-    acceptable_platform_types = {"Seaglider", "Spray Glider", "Slocum Glider", "SeaExplorer"}
-
-    def __init__(self, options=None):
+    acceptable_platform_types = {
+        "Seaglider",
+        "Spray Glider",
+        "Slocum Glider",
+        "SeaExplorer",
+    }
+    # fastest plausible speed in m/s between consecutive position fixes
+    DEFAULT_MAX_SPEED = 10.0
+    # furthest in metres a profile position may be from the nearest fix or
+    # the mean position of its records
+    DEFAULT_POSITION_TOLERANCE = 5000.0
+    # position variables checked together with the time of each fix
+    position_variables = (
+        ("lat", "lon", "time"),
+        ("profile_lat", "profile_lon", "profile_time"),
+        ("lat_uv", "lon_uv", "time_uv"),
+    )
+    # checks which read variable data, the other checks only read metadata
+    # and may run concurrently against a snapshot of it, see
+    # cc_plugin_glider.parallel
+    data_checks = frozenset(
+        (
+            "check_monotonically_increasing_time",
+            "check_dim_no_data",
+            "check_depth_array",
+            "check_location_data",
+            "check_qc_flag_data",
+            "check_valid_range_data",
+            "check_profile_consistency",
+        ),
+    )
+    # global attributes which differ between the files of a deployment and
+    # which the metadata checks only test for presence and emptiness, so the
+    # results of those checks are shared between files, see
+    # cc_plugin_glider.cache
+    per_file_attributes = (
+        "date_created",
+        "date_issued",
+        "date_modified",
+        "history",
+        "id",
+        "time_coverage_start",
+        "time_coverage_end",
+        "geospatial_lat_min",
+        "geospatial_lat_max",
+        "geospatial_lon_min",
+        "geospatial_lon_max",
+        "geospatial_vertical_min",
+        "geospatial_vertical_max",
+    )
+
+    def __init__(self, options=None, table_provider=None):
         """
-        Takes a set of options.
+        Takes a set of options, and optionally the `tables.TableProvider`
+        the authority tables are loaded through.
         """
 
         self.options = options
-        iso_xml_location = "https://www.ncei.noaa.gov/access/metadata/landing-page/bin/iso?id=gov.noaa.nodc:IOOS-NGDAC;view=xml;responseType=text/xml"
-        resp = requests.get(iso_xml_location, timeout=10)
-        resp.raise_for_status()
+        self.dataset = None
+        self._attribute_index = None
+        self._rule_set = None
+        self.classic_reader = None
+        self.data_backend = None
+        # whether the checker opened data_backend itself, and so closes it
+        self._owns_data_backend = False
+        self.memory_budget = util.DEFAULT_MEMORY_BUDGET
+        self.read_ahead = 0
+        self.max_speed = self.DEFAULT_MAX_SPEED
+        self.position_tolerance = self.DEFAULT_POSITION_TOLERANCE
+        # -O gliderdac:table_cache:<dir> and the environment variables in
+        # tables.ENVIRONMENT_PATHS choose where the tables are loaded from
+        self.table_provider = table_provider or tables.make_provider(options)
+        self.auth_tables = None
+        self.table_version = None
+        self.tables_loaded_at = None
+        self.update_tables(tables.load_tables(self.table_provider))
+        # -O gliderdac:result_cache reuses the metadata check results of
+        # files with the same header, see cache.ResultCache
+        self.result_cache = (
+            cache.ResultCache()
+            if util._have_option("result_cache", options or ())
+            else None
+        )
+        # index file summaries are written to, see api.summary_index
+        self.summary_index = None
+        # table name -> (table, trigram index of it), built on first use
+        self._suggestion_indexes = {}
 
-        tree = etree.parse(BytesIO(resp.content))
-        table_type = {
-            "project": "NODC PROJECT NAMES THESAURUS",
-            "platform": "NODC PLATFORM NAMES THESAURUS",
-            "instrument": "Provider Instruments",
-            "institution": "NODC COLLECTING INSTITUTION NAMES THESAURUS",
-        }
+    def update_tables(self, auth_tables):
+        """
+        Swaps in a new set of authority tables, see `tables.load_tables`.
+        Tables whose contents are unchanged are kept as they are, with the
+        indexes built from them.
 
-        xpath_selector_template = ".//gmd:MD_Keywords[gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString/text()='{}']/gmd:keyword/{}/text()"
-        namespaces = {
-            "gco": "http://www.isotc211.org/2005/gco",
-            "gmd": "http://www.isotc211.org/2005/gmd",
-            "gmx": "http://www.isotc211.org/2005/gmx",
-        }
-        self.auth_tables = {}
-        for global_att_name, text_content in table_type.items():
-            text_elem = (
-                "gco:CharacterString"
-                if global_att_name == "instrument"
-                else "gmx:Anchor"
-            )
-            self.auth_tables[global_att_name] = tree.xpath(
-                xpath_selector_template.format(text_content, text_elem),
-                namespaces=namespaces,
-            )
-        # handle NCEI sea names table
-        sea_names_url = "https://www.ncei.noaa.gov/data/oceans/ncei/vocabulary/seanames.xml"
-
-        def sea_name_parse(text):
-            """Helper function to handle utf-8 parsing of sea name XML table"""
-            utf8_parser = etree.XMLParser(encoding="utf-8")
-            tree = etree.fromstring(text.encode("utf-8"), parser=utf8_parser)
-            return set(tree.xpath("./seaname/seaname/text()"))
-
-        self.auth_tables["sea_name"] = GliderCheck.request_resource(
-            sea_names_url,
-            os.environ.get("SEA_NAME_TABLE"),
-            sea_name_parse,
+        :return: Whether the tables changed
+        """
+        # cached metadata check results depend on the tables' contents
+        table_version = cache.table_version(
+            auth_tables,
+            self.cf_checks._std_names._version,
         )
+        self.tables_loaded_at = time.time()
+        if table_version == self.table_version:
+            return False
+        # the tables are swapped before their version, so no results checked
+        # against the old tables are ever cached under the new version
+        self.auth_tables = auth_tables
+        self.table_version = table_version
+        return True
+
+    def reload_tables(self):
+        """
+        Loads the authority tables again through the table provider.  Tables
+        which fail to load keep their current contents.
+
+        :return: Whether the tables changed
+        """
+        auth_tables = tables.load_tables(self.table_provider)
+        return self.update_tables(
+            {
+                name: self.auth_tables.get(name) if table is None else table
+                for name, table in auth_tables.items()
+            },
+        )
+
+    def table_status(self):
+        """
+        Returns the version of the authority tables, when they were last
+        loaded and their age in seconds
+        """
+        return {
+            "table_version": self.table_version,
+            "loaded_at": self.tables_loaded_at,
+            "age": time.time() - self.tables_loaded_at,
+        }
 
     @classmethod
     def request_resource(cls, url, backup_resource, fn):
-        # TODO: check modify header vs cached version to see if update is
-        # even necessary
-        fail_flag = False
-        if backup_resource is not None:
-            try:
-                with open(backup_resource) as f:
-                    text_contents = f.read()
-            except OSError:
-                warnings.warn(
-                    f"Could not open {backup_resource}, falling back to web request",
-                    stacklevel=2,
-                )
-                fail_flag = True
-
-        elif backup_resource is None or fail_flag:
-            try:
-                resp = requests.get(url, allow_redirects=True, timeout=10)
-                resp.raise_for_status()
-                text_contents = resp.text
-            except RequestException:
-                warnings.warn(
-                    f"Requests exception encountered while fetching data from {url}",
-                    stacklevel=2,
-                )
-
+        """
+        Reads a resource from a file, or fetches it from a URL if there is
+        none, and returns it parsed by `fn`, or None if either fails
+        """
+        provider = tables.FileProvider(
+            {"resource": backup_resource},
+            tables.HTTPProvider(),
+        )
         try:
-            return fn(text_contents)
-        except Exception as e:
-            warnings.warn(
-                f"Could not deserialize input text: {str(e)}",
-                stacklevel=2,
+            return tables.load_resource(
+                provider,
+                "resource",
+                lambda content: fn(content.decode("utf-8")),
+                url,
             )
-            return None
+        finally:
+            provider.close()
 
     cf_checks = CF1_6Check()
 
+    def close_matches(self, table_name, value):
+        """
+        Returns the entries of an authority table closest to a value which
+        isn't in it, from a trigram index built once per table
+        """
+        table = self.auth_tables.get(table_name)
+        if not table:
+            return []
+        indexed = self._suggestion_indexes.get(table_name)
+        if indexed is None or indexed[0] is not table:
+            indexed = (table, suggest.TrigramIndex(table))
+            self._suggestion_indexes[table_name] = indexed
+        return indexed[1].suggest(value)
+
     @classmethod
     def make_result(cls, level, score, out_of, name, messages):
         return Result(level, (score, out_of), name, messages)
 
     def setup(self, dataset):
+        self.teardown()
         self.dataset = dataset
+        self._attribute_index = None
+        self._rule_set = None
+        # -O gliderdac:reader:memmap reads netCDF-3 classic data through
+        # memory-mapped views instead of copying it out through netCDF4
+        if util._get_option("reader", self.options) == ["memmap"]:
+            self.classic_reader = ClassicReader.from_dataset(dataset)
+        # -O gliderdac:memory_budget:<bytes> bounds the memory the streaming
+        # data checks use for each block, e.g. memory_budget:16M
+        memory_budget = util._get_option("memory_budget", self.options)
+        self.memory_budget = (
+            util.parse_size(memory_budget[0])
+            if memory_budget
+            else util.DEFAULT_MEMORY_BUDGET
+        )
+        # -O gliderdac:read_ahead:<blocks> reads that many blocks ahead on a
+        # background thread while the streaming data checks work on the last
+        read_ahead = util._get_option("read_ahead", self.options)
+        self.read_ahead = int(read_ahead[0]) if read_ahead else 0
+        # -O gliderdac:max_speed:<m/s> sets the fastest plausible speed
+        # between consecutive position fixes
+        max_speed = util._get_option("max_speed", self.options)
+        self.max_speed = (
+            float(max_speed[0]) if max_speed else self.DEFAULT_MAX_SPEED
+        )
+        # -O gliderdac:position_tolerance:<m> sets how far profile positions
+        # may be from the fixes of the profile
+        position_tolerance = util._get_option(
+            "position_tolerance",
+            self.options,
+        )
+        self.position_tolerance = (
+            float(position_tolerance[0])
+            if position_tolerance
+            else self.DEFAULT_POSITION_TOLERANCE
+        )
+        # data of xarray sources is read through their backend, and
+        # -O gliderdac:backend:dask reads files on disk through one,
+        # computing the data checks as parallel chunked reductions.  Other
+        # sources, such as CDL and buffers, are read through netCDF4
+        self.data_backend = lazy.get_backend(dataset)
+        if self.data_backend is not None:
+            self.data_backend.memory_budget = self.memory_budget
+        elif util._get_option(
+            "backend",
+            self.options,
+        ) == ["dask"]:
+            scheduler = util._get_option("scheduler", self.options)
+            self.data_backend = lazy.DaskBackend.from_dataset(
+                dataset,
+                scheduler[0] if scheduler else "threads",
+                self.memory_budget,
+            )
+            self._owns_data_backend = self.data_backend is not None
+
+    def teardown(self):
+        """
+        Closes the readers set up for the last dataset checked.  Called by
+        the check runners once a dataset's checks finish.
+        """
+        if self.classic_reader is not None:
+            self.classic_reader.close()
+            self.classic_reader = None
+        # the backends of xarray sources belong to their caller
+        if self._owns_data_backend:
+            self.data_backend.close()
+        self.data_backend = None
+        self._owns_data_backend = False
+
+    def attribute_index(self, dataset):
+        """
+        Returns the `util.AttributeIndex` of a dataset's variables, built
+        once for the dataset set up for checking, or for a snapshot of it
+        """
+        if isinstance(dataset, parallel.DatasetSnapshot):
+            return dataset.attribute_index
+        if dataset is not self.dataset:
+            return util.AttributeIndex(dataset)
+        if self._attribute_index is None:
+            self._attribute_index = util.AttributeIndex(dataset)
+        return self._attribute_index
+
+    def rule_set(self, dataset):
+        """
+        Returns the `rules.RuleSet` of a dataset's format version, looked up
+        once for the dataset set up for checking
+        """
+        if dataset is not self.dataset:
+            return rules.for_dataset(dataset)
+        if self._rule_set is None:
+            self._rule_set = rules.for_dataset(dataset)
+        return self._rule_set
+
+    def backend_for(self, dataset, *var_names):
+        """
+        Returns the data backend if it holds the named variables of this
+        dataset, otherwise None
+        """
+        backend = self.data_backend
+        if (
+            backend is not None
+            and dataset is self.dataset
+            and all(var_name in backend for var_name in var_names)
+        ):
+            return backend
+        return None
+
+    def read_data(self, dataset, var_name):
+        """
+        Returns all of a variable's data as a masked array, from the data
+        backend or the memory-mapped classic reader when one is enabled for
+        this dataset
+        """
+        backend = self.backend_for(dataset, var_name)
+        if backend is not None:
+            return backend.read(var_name, dataset.variables[var_name])
+        reader = self.classic_reader
+        if (
+            reader is not None
+            and dataset is self.dataset
+            and var_name in reader.variables
+        ):
+            data = reader.read(var_name)
+            if data is not None:
+                return data
+        return dataset.variables[var_name][:]
+
+    def _iter_raw_blocks(self, dataset, var_name, block_elements, rows=None):
+        backend = self.backend_for(dataset, var_name)
+        if backend is not None:
+            for block in util.iter_blocks(
+                backend.array(var_name),
+                block_elements,
+                rows,
+            ):
+                yield np.asarray(backend.compute(block)[0])
+            return
+        reader = self.classic_reader
+        if (
+            reader is not None
+            and dataset is self.dataset
+            and var_name in reader.variables
+        ):
+            yield from util.iter_blocks(
+                reader.view(var_name),
+                block_elements,
+                rows,
+            )
+            return
+        ncvar = dataset.variables[var_name]
+        with util.raw_values(ncvar):
+            yield from util.iter_blocks(ncvar, block_elements, rows)
+
+    def iter_raw_blocks(self, dataset, var_name, block_elements=None):
+        """
+        Yields blocks of a variable's stored values, without masking or
+        scaling, from the memory-mapped classic reader when it is enabled for
+        this dataset.  Blocks are aligned to the variable's chunks and sized
+        to stay within the memory budget unless `block_elements` is given.
+        """
+        if block_elements is None:
+            block_elements = util.block_elements(
+                dataset.variables[var_name].dtype,
+                self.memory_budget,
+            )
+        return util.read_ahead(
+            self._iter_raw_blocks(dataset, var_name, block_elements),
+            self.read_ahead,
+        )
+
+    def _iter_raw_columns(self, dataset, var_names, block_elements):
+        """
+        Returns the number of rows per block and an iterator of raw blocks
+        for each variable, read in step, where names which are None give
+        None for every block
+        """
+        rows = util.block_rows(
+            [
+                dataset.variables[var_name]
+                for var_name in var_names
+                if var_name is not None
+            ],
+            block_elements,
+        )
+        return rows, [
+            itertools.repeat(None)
+            if var_name is None
+            else self._iter_raw_blocks(
+                dataset,
+                var_name,
+                block_elements,
+                rows,
+            )
+            for var_name in var_names
+        ]
+
+    def iter_raw_columns(self, dataset, var_names):
+        """
+        Yields tuples of raw blocks of the named variables, of the same
+        length, read in step along their first dimension within the memory
+        budget and aligned to their chunks.  Names which are None give None
+        for every block.
+        """
+        block_elements = util.block_elements(
+            np.float64,
+            self.memory_budget // max(len(var_names), 1),
+        )
+
+        def columns():
+            _, blocks = self._iter_raw_columns(
+                dataset,
+                var_names,
+                block_elements,
+            )
+            yield from zip(*blocks)
+
+        return util.read_ahead(columns(), self.read_ahead)
+
+    def iter_float_blocks(self, dataset, var_names, length):
+        """
+        Yields tuples of float64 blocks of the named variables, with missing
+        values as NaN.  Variables of `length` records are read in step, and
+        scalar variables, or names which are None, are repeated as a single
+        value for every block.
+        """
+        block_elements = util.block_elements(
+            np.float64,
+            self.memory_budget // max(len(var_names), 1),
+        )
+
+        def float_blocks():
+            rows, raw_columns = self._iter_raw_columns(
+                dataset,
+                var_names,
+                block_elements,
+            )
+            columns = []
+            for var_name, blocks in zip(var_names, raw_columns):
+                if var_name is None:
+                    columns.append(itertools.repeat(np.float64(np.nan)))
+                    continue
+                ncvar = dataset.variables[var_name]
+                blocks = map(
+                    functools.partial(
+                        util.to_float,
+                        missing=util.missing_values(ncvar),
+                    ),
+                    blocks,
+                )
+                if ncvar.ndim == 0:
+                    blocks = itertools.repeat(next(blocks))
+                columns.append(blocks)
+            n_blocks = -(-length // rows)
+            for _, *block in zip(range(n_blocks), *columns):
+                yield tuple(block)
+
+        return util.read_ahead(float_blocks(), self.read_ahead)
 
     """
     HIGH priority checks:
@@ -139,34 +550,14 @@ class GliderCheck(BaseNCCheck):
     check_monotonically_increasing_time
     check_dim_no_data
     check_depth_array
+    check_location_data
     """
 
     def check_required_variables(self, dataset):
         """
         Verifies the dataset has the required variables
         """
-        required_variables = [
-            "trajectory",
-            "time",
-            "lat",
-            "lon",
-            "pressure",
-            "depth",
-            "temperature",
-            "conductivity",
-            "density",
-            "profile_id",
-            "profile_time",
-            "profile_lat",
-            "profile_lon",
-            "time_uv",
-            "lat_uv",
-            "lon_uv",
-            "u",
-            "v",
-            "platform",
-            "instrument_ctd",
-        ]
+        required_variables = self.rule_set(dataset).required_variables
 
         level = BaseCheck.HIGH
         out_of = len(required_variables)
@@ -176,7 +567,12 @@ class GliderCheck(BaseNCCheck):
             test = variable in dataset.variables
             score += int(test)
             if not test:
-                messages.append(f"Variable {variable} is missing")
+                messages.append(
+                    templates.format_message(
+                        "variable_missing",
+                        var_name=variable,
+                    ),
+                )
         return self.make_result(
             level,
             score,
@@ -203,7 +599,12 @@ class GliderCheck(BaseNCCheck):
             test = dimension in dataset.dimensions
             score += int(test)
             if not test:
-                messages.append(f"{dimension} is not a valid dimension")
+                messages.append(
+                    templates.format_message(
+                        "dimension_missing",
+                        dimension=dimension,
+                    ),
+                )
         return self.make_result(
             level,
             score,
@@ -231,12 +632,14 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        rule_set = self.rule_set(dataset)
         check_vars = ["lat", "lon"]
         for var in check_vars:
             stat, num_checks, msgs = util._check_variable_attrs(
                 dataset,
                 var,
                 options=self.options,
+                var_attrs=rule_set.var_attrs,
             )
             score += int(stat)
             out_of += num_checks
@@ -256,7 +659,11 @@ class GliderCheck(BaseNCCheck):
         """
 
         level = BaseCheck.HIGH
-        score, out_of, messages = util._check_variable_attrs(dataset, "time")
+        score, out_of, messages = util._check_variable_attrs(
+            dataset,
+            "time",
+            var_attrs=self.rule_set(dataset).var_attrs,
+        )
 
         return self.make_result(
             level,
@@ -284,12 +691,14 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        rule_set = self.rule_set(dataset)
         check_vars = ["pressure", "depth"]
         for var in check_vars:
             stat, num_checks, msgs = util._check_variable_attrs(
                 dataset,
                 var,
                 options=self.options,
+                var_attrs=rule_set.var_attrs,
             )
             score += int(stat)
             out_of += num_checks
@@ -321,12 +730,14 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        rule_set = self.rule_set(dataset)
         check_vars = ["temperature", "conductivity", "salinity", "density"]
         for var in check_vars:
             stat, num_checks, msgs = util._check_variable_attrs(
                 dataset,
                 var,
                 options=self.options,
+                var_attrs=rule_set.var_attrs,
             )
             score += int(stat)
             out_of += num_checks
@@ -358,6 +769,7 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        rule_set = self.rule_set(dataset)
         check_vars = [
             "profile_id",
             "profile_time",
@@ -373,6 +785,7 @@ class GliderCheck(BaseNCCheck):
                 dataset,
                 var,
                 options=self.options,
+                var_attrs=rule_set.var_attrs,
             )
             score += int(stat)
             out_of += num_checks
@@ -388,121 +801,17 @@ class GliderCheck(BaseNCCheck):
 
     def check_global_attributes(self, dataset):
         """
-        Verifies the base metadata in the global attributes
-
-        TODO: update this check to use @check_has on next cc release
+        Verifies the base metadata in the global attributes against the
+        schema in required_global_attrs: that they exist and aren't empty,
+        that sea_name is from the NODC sea names list, and that
+        platform_type is one the NCEI accepts
         """
         level = BaseCheck.HIGH
-        global_attributes = [
-            "Conventions",
-            "Metadata_Conventions",
-            "comment",
-            "contributor_name",
-            "contributor_role",
-            "creator_email",
-            "creator_name",
-            "creator_url",
-            "date_created",
-            "date_issued",
-            "date_modified",
-            "format_version",
-            "history",
-            "id",
-            "institution",
-            "keywords",
-            "keywords_vocabulary",
-            "license",
-            "metadata_link",
-            "naming_authority",
-            # 'platform_type', # platform_type check is more involved below
-            "processing_level",
-            "project",
-            "publisher_email",
-            "publisher_name",
-            "publisher_url",
-            "references",
-            # 'sea_name',  # sea_name check is more involved below
-            "source",
-            "standard_name_vocabulary",
-            "summary",
-            "title",
-            "wmo_id",
-        ]
-
-        out_of = 0
-        score = 0
-        messages = []
-        for field in global_attributes:
-            # v = getattr(dataset, field, '')
-            test = field in dataset.ncattrs()
-            score += int(test)
-            out_of += 1
-            if not test:
-                messages.append(f"Attr {field} not present")
-                continue
-            v = getattr(dataset, field, "")
-            if isinstance(v, str):
-                test = len(v.strip()) > 0
-            else:
-                test = True
-            score += int(test)
-            out_of += 1
-            if not test:
-                messages.append(f"Attr {field} is empty")
-
-        """
-        Verify that sea_name attribute exists and is valid
-        """
-        if self.auth_tables["sea_name"] is not None:
-            sea_names = {sn.lower() for sn in self.auth_tables["sea_name"]}
-        else:
-            raise RuntimeError("Was unable to fetch sea names table")
-        sea_name = getattr(dataset, "sea_name", "").replace(", ", ",")
-        if sea_name:
-            # Ok score a point for the fact that the attribute exists
-            score += 1
-            out_of += 1
-            sea_name = sea_name.split(",")
-            for sea in sea_name:
-                test = sea.lower() in sea_names
-                score += int(test)
-                out_of += 1
-                if not test:
-                    messages.append(
-                        (
-                            "sea_name attribute should be from the NODC sea names list:"
-                            f" {sea} is not a valid sea name"
-                        ),
-                    )
-        else:
-            out_of += 1
-            messages.append("Attr sea_name not present")
-
-        """
-        Verify that platform_type attribute exists and is valid
-        """
-        platform_type = getattr(dataset, "platform_type", "")
-        if platform_type:
-            # Score a point for the fact that the attribute exists
-            score += 1
-            out_of += 1
-            # Now check that it's one of the NCEI acceptable strings
-            test = platform_type in self.acceptable_platform_types
-            score += int(test)
-            out_of += 1
-            if not test:
-                messages.append(
-                    (
-                        "platform_type {} is not one of the NCEI accepted platforms for archiving: {}"
-                    ).format(
-                        platform_type,
-                        ",".join(self.acceptable_platform_types),
-                    ),
-                )
-        else:
-            out_of += 1
-            messages.append("Attr platform_type not present")
-
+        rule_set = self.rule_set(dataset)
+        score, out_of, messages = rule_set.global_attributes.validate(
+            dataset,
+            self,
+        )
         return self.make_result(
             level,
             score,
@@ -535,10 +844,16 @@ class GliderCheck(BaseNCCheck):
         """
         # shouldn't this already be handled by CF trajectory featureType?
         test_ctx = TestCtx(BaseCheck.HIGH, "Profile data is valid")
-        test_ctx.assert_true(
-            np.all(np.diff(ds.variables["time"]) > 0),
-            "Time variable is not monotonically increasing",
-        )
+        backend = self.backend_for(ds, "time")
+        if backend is not None:
+            (increasing,) = backend.compute(
+                backend.is_increasing("time", ds.variables["time"]),
+            )
+        else:
+            # fill values aren't times, only the valid values must increase
+            time = np.ma.compressed(self.read_data(ds, "time"))
+            increasing = np.all(np.diff(time) > 0)
+        templates.assert_true(test_ctx, increasing, "time_not_increasing")
         return test_ctx.to_result()
 
     def check_dim_no_data(self, dataset):
@@ -551,16 +866,21 @@ class GliderCheck(BaseNCCheck):
         # check that cartesian product of non-nodata/_FillValue values >= 2
         # count here checks the count of non-masked data
         if "time" in dataset.variables and "depth" in dataset.variables:
-            test = (
-                dataset.variables["time"][:].count()
-                * dataset.variables["depth"][:].count()
-            ) >= 2
-            test_ctx.assert_true(
-                test,
-                "Time and depth "
-                "variables must have at least "
-                "two valid data points together",
-            )
+            backend = self.backend_for(dataset, "time", "depth")
+            if backend is not None:
+                counts = backend.compute(
+                    *(
+                        backend.count_valid(name, dataset.variables[name])
+                        for name in ("time", "depth")
+                    ),
+                )
+            else:
+                counts = (
+                    self.read_data(dataset, name).count()
+                    for name in ("time", "depth")
+                )
+            test = np.prod(list(counts)) >= 2
+            templates.assert_true(test_ctx, test, "time_depth_no_data")
         return test_ctx.to_result()
 
     def check_depth_array(self, dataset):
@@ -569,13 +889,90 @@ class GliderCheck(BaseNCCheck):
         """
         test_ctx = TestCtx(BaseCheck.HIGH, "Profile data is valid")
         if "depth" in dataset.variables:
-            depth = dataset.variables["depth"][:]
-            test_ctx.assert_true(
-                np.abs(np.diff(depth[~depth.mask]).sum()) > 1e-4,
-                "Depth array must be valid, ie  abs(Z0 - Zend) > 0",
+            backend = self.backend_for(dataset, "depth")
+            if backend is not None:
+                # the differences between valid values sum to the
+                # difference between the last and first
+                span = backend.valid_span("depth", dataset.variables["depth"])
+            else:
+                depth = self.read_data(dataset, "depth")
+                span = np.diff(depth[~depth.mask]).sum()
+            templates.assert_true(
+                test_ctx,
+                np.abs(span) > 1e-4,
+                "depth_invalid",
             )
         return test_ctx.to_result()
 
+    def check_location_data(self, dataset):
+        """
+        Checks that each set of position variables holds plausible positions:
+        within latitude and longitude bounds, not at (0, 0), and without
+        implausible speeds between consecutive fixes
+        """
+        test_ctx = TestCtx(BaseCheck.HIGH, "Location data is valid")
+        for lat_name, lon_name, time_name in self.position_variables:
+            if not {lat_name, lon_name} <= set(dataset.variables):
+                continue
+            lat = dataset.variables[lat_name]
+            lon = dataset.variables[lon_name]
+            if lat.shape != lon.shape:
+                continue
+            time = dataset.variables.get(time_name)
+            time_scale = util.time_unit_seconds(getattr(time, "units", None))
+            use_time = (
+                time is not None
+                and time.shape == lat.shape
+                and time_scale is not None
+            )
+            missing = (
+                util.missing_values(lat),
+                util.missing_values(lon),
+                util.missing_values(time) if use_time else (),
+            )
+            stats = util.scan_positions(
+                self.iter_raw_columns(
+                    dataset,
+                    [lat_name, lon_name, time_name if use_time else None],
+                ),
+                *missing,
+                time_scale or 1,
+                self.max_speed if use_time else None,
+            )
+            templates.assert_true(
+                test_ctx,
+                stats["out_of_range"] == 0,
+                "positions_out_of_range",
+                lat_name=lat_name,
+                lon_name=lon_name,
+                count=stats["out_of_range"],
+            )
+            templates.assert_true(
+                test_ctx,
+                stats["null_island"] == 0,
+                "positions_null_island",
+                lat_name=lat_name,
+                lon_name=lon_name,
+                count=stats["null_island"],
+            )
+            if use_time:
+                templates.assert_true(
+                    test_ctx,
+                    stats["fast"] == 0,
+                    "positions_too_fast",
+                    lat_name=lat_name,
+                    lon_name=lon_name,
+                    count=stats["fast"],
+                    max_speed=self.max_speed,
+                    fastest=stats["max_speed"],
+                    index=stats["first_fast"],
+                )
+
+        if test_ctx.out_of == 0:
+            return None
+
+        return test_ctx.to_result()
+
     """
     MEDIUM priority checks:
 
@@ -584,10 +981,13 @@ class GliderCheck(BaseNCCheck):
     check_trajectory_variables
     check_container_variables
     check_qartod
+    check_qc_flag_data
     check_ancillary_variables
     check_dtype
     check_valid_min_dtype
     check_valid_max_dtype
+    check_valid_range_data
+    check_profile_consistency
     """
 
     def check_qc_variables(self, dataset):
@@ -662,11 +1062,14 @@ class GliderCheck(BaseNCCheck):
         score += int(test)
         out_of += 1
         if not test:
-            messages.append("trajectory has an invalid dimension")
+            messages.append(
+                templates.format_message("trajectory_dimension"),
+            )
 
         pass_stat, num_checks, attr_msgs = util._check_variable_attrs(
             dataset,
             "trajectory",
+            var_attrs=self.rule_set(dataset).var_attrs,
         )
         score += int(pass_stat)
         out_of += num_checks
@@ -698,6 +1101,7 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        rule_set = self.rule_set(dataset)
         check_vars = [
             "platform",
             "instrument_ctd",
@@ -707,6 +1111,7 @@ class GliderCheck(BaseNCCheck):
                 dataset,
                 var,
                 options=self.options,
+                var_attrs=rule_set.var_attrs,
             )
             score += int(stat)
             out_of += num_checks
@@ -725,75 +1130,93 @@ class GliderCheck(BaseNCCheck):
         If the qartod variables exist, check the attributes
         """
         test_ctx = TestCtx(BaseCheck.MEDIUM, "QARTOD Variables")
-        qartod_variables = [
-            "qartod_{}_climatological_flag",
-            "qartod_{}_flat_line_flag",
-            "qartod_{}_gross_range_flag",
-            "qartod_{}_rate_of_change_flag",
-            "qartod_{}_spike_flag",
-        ]
 
-        # Iterate through each physical variable and each qartod variable name
-        # and check the attributes of all variables if they exist
+        # Find every QARTOD flag variable, for any parameter, in one pass
+        # over the variable names and check them against the same rules
+        for qartod_var, ncvar in dataset.variables.items():
+            if not QARTOD_VARIABLE.fullmatch(qartod_var):
+                continue
+            attrs = {name: ncvar.getncattr(name) for name in ncvar.ncattrs()}
+            for rule, template_id in QARTOD_RULES:
+                passed = rule(attrs)
+                if passed is not None:
+                    templates.assert_true(
+                        test_ctx,
+                        passed,
+                        template_id,
+                        qartod_var=qartod_var,
+                    )
 
-        for param in ("temperature", "conductivity", "density", "pressure"):
-            for qartod in qartod_variables:
-                qartod_var = qartod.format(param)
-                if qartod_var not in dataset.variables:
-                    continue
+        if test_ctx.out_of == 0:
+            return None
 
-                ncvar = dataset.variables[qartod_var]
-                valid_min = getattr(ncvar, "valid_min", None)
-                # TODO: refactor valid_min/valid_max to put in single
-                # conditional check
-                test_ctx.assert_true(
-                    valid_min is not None,
-                    "valid_min attribute for longitude should be defined",
-                )
-                if valid_min is not None:
-                    valid_min_dtype = getattr(valid_min, "dtype", None)
-                    test_ctx.assert_true(
-                        util.compare_dtype(valid_min_dtype, np.dtype("|i1")),
-                        f"attribute {qartod_var}:valid_min must be of type byte",
-                    )
-                valid_max = getattr(ncvar, "valid_max", None)
-                test_ctx.assert_true(
-                    valid_max is not None,
-                    "valid_max attribute for longitude should be defined",
-                )
-                if valid_max is not None:
-                    valid_max_dtype = getattr(valid_max, "dtype", None)
-                    test_ctx.assert_true(
-                        util.compare_dtype(valid_max_dtype, np.dtype("|i1")),
-                        f"attribute {qartod_var}:valid_max must be of type byte",
-                    )
-                flag_values = getattr(ncvar, "flag_values", None)
-                test_ctx.assert_true(
-                    getattr(ncvar, "_FillValue", None) == np.int8(9),
-                    f"variable {qartod_var} must have a _FillValue of 9b",
-                )
+        return test_ctx.to_result()
 
-                test_ctx.assert_true(
-                    getattr(ncvar, "long_name", ""),
-                    f"attribute {qartod_var}:long_name must be a non-empty string",
-                )
+    def check_qc_flag_data(self, dataset):
+        """
+        Checks that every value of the QC and QARTOD flag variables is one of
+        the variable's flag_values or its _FillValue
+        """
+        test_ctx = TestCtx(BaseCheck.MEDIUM, "QC Flag Data")
+        flag_variables = {}
+        for var_name, ncvar in dataset.variables.items():
+            if not (
+                var_name.endswith("_qc") or QARTOD_VARIABLE.fullmatch(var_name)
+            ):
+                continue
+            flag_values = getattr(ncvar, "flag_values", None)
+            if flag_values is None or getattr(
+                ncvar.dtype,
+                "kind",
+                None,
+            ) not in {"i", "u", "f"}:
+                continue
+            fill_value = util.fill_value(ncvar)
+            flag_variables[var_name] = np.append(
+                np.atleast_1d(flag_values),
+                [] if fill_value is None else np.atleast_1d(fill_value),
+            )
 
-                test_ctx.assert_true(
-                    getattr(ncvar, "flag_meanings", ""),
-                    f"attribute {qartod_var}:flag_meanings must be a non-empty string",
+        backend = self.backend_for(dataset, *flag_variables)
+        if backend is not None:
+            counts = backend.compute(
+                *(
+                    backend.count_invalid_values(var_name, allowed)
+                    for var_name, allowed in flag_variables.items()
+                ),
+            )
+        else:
+            counts = (
+                util.count_invalid_values(
+                    self.iter_raw_blocks(dataset, var_name),
+                    allowed,
                 )
-
-                test_ctx.assert_true(
-                    isinstance(flag_values, np.ndarray),
-                    f"attribute {qartod_var}:flag_values must be defined as an array of bytes",
+                for var_name, allowed in flag_variables.items()
+            )
+        for var_name, invalid in zip(flag_variables, counts):
+            summary = None
+            if invalid:
+                summary = ", ".join(
+                    templates.format_message(
+                        "invalid_flag_value_count",
+                        value=value,
+                        count=count,
+                    )
+                    for value, count in list(invalid.items())[:10]
                 )
-
-                if isinstance(flag_values, np.ndarray):
-                    dtype = flag_values.dtype
-                    test_ctx.assert_true(
-                        util.compare_dtype(dtype, np.dtype("|i1")),
-                        f"attribute {qartod_var}:flag_values has an illegal data-type, must be byte",
+                if len(invalid) > 10:
+                    summary += templates.format_message(
+                        "more_invalid_flag_values",
+                        count=len(invalid) - 10,
                     )
+            templates.assert_true(
+                test_ctx,
+                not invalid,
+                "invalid_flag_values",
+                var_name=var_name,
+                count=sum(invalid.values()),
+                counts=summary,
+            )
 
         if test_ctx.out_of == 0:
             return None
@@ -809,19 +1232,22 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
-        check_vars = dataset.variables
-        for var in check_vars:
-            if hasattr(dataset.variables[var], "ancillary_variables"):
-                ancillary_variables = dataset.variables[
-                    var
-                ].ancillary_variables
-                for acv in ancillary_variables.split():
-                    out_of += 1
-                    test = acv in dataset.variables
-                    score += int(test)
-                    if not test:
-                        msg = f"Invalid ancillary_variables attribute for {var}, {acv} is not a variable"
-                        messages.append(msg)
+        references = self.attribute_index(dataset).variables(
+            "ancillary_variables",
+        )
+        for var, ancillary_variables in references.items():
+            for acv in ancillary_variables.split():
+                out_of += 1
+                test = acv in dataset.variables
+                score += int(test)
+                if not test:
+                    messages.append(
+                        templates.format_message(
+                            "ancillary_variable_missing",
+                            var_name=var,
+                            ancillary=acv,
+                        ),
+                    )
 
         return self.make_result(
             level,
@@ -840,9 +1266,14 @@ class GliderCheck(BaseNCCheck):
         score = 0
         messages = []
 
+        var_attrs = self.rule_set(dataset).var_attrs
         check_vars = dataset.variables
         for var in check_vars:
-            stat, num_checks, msgs = util._check_dtype(dataset, var)
+            stat, num_checks, msgs = util._check_dtype(
+                dataset,
+                var,
+                var_attrs,
+            )
             score += int(stat)
             out_of += num_checks
             messages.extend(msgs)
@@ -875,9 +1306,13 @@ class GliderCheck(BaseNCCheck):
                 valid_min_dtype = str(getattr(valid_min, "dtype", None))
 
             if valid_min is not None:
-                test_ctx.assert_true(
+                templates.assert_true(
+                    test_ctx,
                     util.compare_dtype(np.dtype(valid_min_dtype), ncvar.dtype),
-                    f"{var_name}:valid_min has a different data type, {valid_min_dtype}, than variable {var_name}, {ncvar.dtype}",
+                    "valid_min_dtype",
+                    var_name=var_name,
+                    attr_dtype=valid_min_dtype,
+                    dtype=ncvar.dtype,
                 )
 
         return test_ctx.to_result()
@@ -902,14 +1337,199 @@ class GliderCheck(BaseNCCheck):
                 valid_max_dtype = str(getattr(valid_max, "dtype", None))
 
             if valid_max is not None:
-                test_ctx.assert_true(
+                templates.assert_true(
+                    test_ctx,
                     util.compare_dtype(np.dtype(valid_max_dtype), ncvar.dtype),
-                    f"{var_name}:valid_max has a different data type, {valid_max_dtype}, than variable {str(ncvar.dtype)} "
-                    f"{var_name}",
+                    "valid_max_dtype",
+                    var_name=var_name,
+                    attr_dtype=valid_max_dtype,
+                    dtype=ncvar.dtype,
                 )
 
         return test_ctx.to_result()
 
+    def check_valid_range_data(self, dataset):
+        """
+        Checks that the data of every variable with valid_min, valid_max or
+        valid_range lies within those bounds, skipping fill values.  Each
+        variable is read once, in blocks bounded by the memory budget.
+        """
+        test_ctx = TestCtx(BaseCheck.MEDIUM, "Data within valid range")
+        bounded_variables = {}
+        for var_name, ncvar in dataset.variables.items():
+            if getattr(ncvar.dtype, "kind", None) not in {"i", "u", "f"}:
+                continue
+            valid_min, valid_max = util.valid_bounds(ncvar)
+            if valid_min is None and valid_max is None:
+                continue
+            bounded_variables[var_name] = (
+                valid_min,
+                valid_max,
+                util.missing_values(ncvar),
+            )
+
+        backend = self.backend_for(dataset, *bounded_variables)
+        if backend is not None:
+            # one graph for every variable, computed in parallel
+            counts = backend.compute(
+                *(
+                    backend.count_out_of_range(var_name, *bounds)
+                    for var_name, bounds in bounded_variables.items()
+                ),
+            )
+        else:
+            counts = (
+                util.count_out_of_range(
+                    self.iter_raw_blocks(dataset, var_name),
+                    *bounds,
+                )
+                for var_name, bounds in bounded_variables.items()
+            )
+        for (var_name, (valid_min, valid_max, _)), (
+            below,
+            above,
+            indices,
+        ) in zip(bounded_variables.items(), counts):
+            parts = []
+            if below:
+                parts.append(
+                    templates.format_message(
+                        "below_valid_min",
+                        count=below,
+                        valid_min=valid_min,
+                    ),
+                )
+            if above:
+                parts.append(
+                    templates.format_message(
+                        "above_valid_max",
+                        count=above,
+                        valid_max=valid_max,
+                    ),
+                )
+            templates.assert_true(
+                test_ctx,
+                not (below or above),
+                "outside_valid_range",
+                var_name=var_name,
+                count=below + above,
+                counts=", ".join(parts),
+                indices=indices,
+            )
+
+        if test_ctx.out_of == 0:
+            return None
+
+        return test_ctx.to_result()
+
+    def check_profile_consistency(self, dataset):
+        """
+        Checks that the profile variables agree with the time and position
+        series: each profile's profile_time lies within the times of its
+        records and its profile_lat/profile_lon lie near one of its fixes or
+        their mean position.  Profiles are found as runs of profile_id, or
+        of profile_time without one.
+        """
+        test_ctx = TestCtx(
+            BaseCheck.MEDIUM,
+            "Profile variables are consistent",
+        )
+        variables = dataset.variables
+        time = variables.get("time")
+        if time is None or time.ndim != 1 or not time.shape[0]:
+            return None
+
+        def usable(var_name):
+            return var_name in variables and variables[var_name].shape in {
+                (),
+                time.shape,
+            }
+
+        key_name = next(
+            (name for name in ("profile_id", "profile_time") if usable(name)),
+            None,
+        )
+        if key_name is None:
+            return None
+        var_names = [
+            var_name if usable(var_name) else None
+            for var_name in (
+                "time",
+                "lat",
+                "lon",
+                "profile_time",
+                "profile_lat",
+                "profile_lon",
+            )
+        ]
+        stats = util.scan_profiles(
+            self.iter_float_blocks(
+                dataset,
+                [key_name, *var_names],
+                time.shape[0],
+            ),
+        )
+        profiles = [
+            int(key) if float(key).is_integer() else key
+            for key in stats["profile"]
+        ]
+
+        conversion = None
+        if var_names[3] is not None:
+            conversion = util.time_conversion(
+                getattr(variables["profile_time"], "units", None),
+                getattr(time, "units", None),
+                getattr(time, "calendar", "standard"),
+            )
+        if conversion is not None:
+            scale, offset = conversion
+            profile_time = stats["profile_time"] * scale + offset
+            with np.errstate(invalid="ignore"):
+                outside = (profile_time < stats["time_min"]) | (
+                    profile_time > stats["time_max"]
+                )
+            if outside.any():
+                first = np.argmax(outside)
+                templates.assert_true(
+                    test_ctx,
+                    False,
+                    "profile_time_outside",
+                    count=np.count_nonzero(outside),
+                    profile=profiles[first],
+                    profile_time=profile_time[first],
+                    time_min=stats["time_min"][first],
+                    time_max=stats["time_max"][first],
+                )
+            else:
+                templates.assert_true(test_ctx, True, "profile_time_outside")
+
+        if None not in var_names[1:3] and None not in var_names[4:]:
+            with np.errstate(invalid="ignore"):
+                far = (
+                    ~np.isnan(stats["nearest"])
+                    & ~(stats["nearest"] <= self.position_tolerance)
+                    & ~(stats["mean"] <= self.position_tolerance)
+                )
+            if far.any():
+                first = np.argmax(far)
+                templates.assert_true(
+                    test_ctx,
+                    False,
+                    "profile_position_far",
+                    count=np.count_nonzero(far),
+                    tolerance=self.position_tolerance,
+                    profile=profiles[first],
+                    nearest=stats["nearest"][first],
+                    mean=stats["mean"][first],
+                )
+            else:
+                templates.assert_true(test_ctx, True, "profile_position_far")
+
+        if test_ctx.out_of == 0:
+            return None
+
+        return test_ctx.to_result()
+
     """
     LOW priority checks:
 
@@ -930,10 +1550,7 @@ class GliderCheck(BaseNCCheck):
 
         ioos_ra = getattr(dataset, "ioos_regional_association", None)
 
-        test_ctx.assert_true(
-            ioos_ra,
-            "ioos_regional_association global attribute should be defined",
-        )
+        templates.assert_true(test_ctx, ioos_ra, "ioos_ra_missing")
 
         return test_ctx.to_result()
 
@@ -952,19 +1569,14 @@ class GliderCheck(BaseNCCheck):
         longitude = dataset.variables["lon"]
         valid_min = getattr(longitude, "valid_min", None)
         if valid_min is None:
-            test_ctx.assert_true(
-                False,
-                "valid_min attribute for longitude should be defined",
-            )
+            templates.assert_true(test_ctx, False, "lon_valid_min_missing")
         valid_max = getattr(longitude, "valid_max", None)
         if valid_min is None:
-            test_ctx.assert_true(
-                False,
-                "valid_max attribute for longitude should be defined",
-            )
-        test_ctx.assert_true(
+            templates.assert_true(test_ctx, False, "lon_valid_max_missing")
+        templates.assert_true(
+            test_ctx,
             not (valid_min == -90 and valid_max == 90),
-            "Longitude's valid_min and valid_max are [-90, 90], it's likely this was a mistake",
+            "lon_latitude_range",
         )
         return test_ctx.to_result()
 
@@ -989,23 +1601,28 @@ class GliderCheck(BaseNCCheck):
         # some top level attrs map to other things
         var_remap = {"platform": "id", "instrument": "make_model"}
 
+        attribute_index = self.attribute_index(dataset)
         for global_att_name in table_type:
             # instruments have to be handled specially since they aren't
             # global attributes
             if global_att_name not in {"instrument", "platform"}:
                 global_att_present = hasattr(dataset, global_att_name)
-                test_ctx.assert_true(
+                templates.assert_true(
+                    test_ctx,
                     global_att_present,
-                    f"Attribute {global_att_name} not in dataset",
+                    "ncei_attribute_missing",
+                    attr=global_att_name,
                 )
                 if not global_att_present:
                     continue
 
             if global_att_name not in {"instrument", "platform"}:
                 global_att_present = hasattr(dataset, global_att_name)
-                test_ctx.assert_true(
+                templates.assert_true(
+                    test_ctx,
                     global_att_present,
-                    f"Attribute {global_att_name} not in dataset",
+                    "ncei_attribute_missing",
+                    attr=global_att_name,
                 )
                 if not global_att_present:
                     continue
@@ -1022,42 +1639,81 @@ class GliderCheck(BaseNCCheck):
             if global_att_name in {"instrument", "platform"}:
                 # variables which contain an instrument attribute,
                 # which should point to an instrument variable
-                kwargs = {global_att_name: lambda v: v is not None}
-                att_vars = dataset.get_variables_by_attributes(**kwargs)
+                references = attribute_index.variables(global_att_name)
                 # potentially, there could be more than one instrument
-                var_name_set = {getattr(v, global_att_name) for v in att_vars}
+                var_name_set = set(references.values())
+                # values of the remapped attribute, e.g. make_model, by
+                # variable name
+                remapped = attribute_index.variables(
+                    var_remap[global_att_name],
+                )
 
                 # treat no instruments/platforms defined as an error
-                test_ctx.assert_true(
+                templates.assert_true(
+                    test_ctx,
                     len(var_name_set) > 0,
-                    f"Cannot find any {global_att_name} attributes in dataset",
+                    "ncei_no_references",
+                    attr=global_att_name,
                 )
 
                 for var_name in var_name_set:
                     if var_name not in dataset.variables:
-                        msg = f"Referenced {global_att_name} variable {var_name} does not exist"
-                        test_ctx.assert_true(False, msg)
+                        templates.assert_true(
+                            test_ctx,
+                            False,
+                            "ncei_reference_missing",
+                            attr=global_att_name,
+                            var_name=var_name,
+                        )
                         continue
 
-                    var = dataset.variables[var_name]
-                    # have to use .ncattrs, hangs if using `in var` ?
-                    var_attr_exists = (
-                        var_remap[global_att_name] in var.ncattrs()
+                    var_attr_exists = var_name in remapped
+                    templates.assert_true(
+                        test_ctx,
+                        var_attr_exists,
+                        "ncei_variable_attribute_missing",
+                        attr=var_remap[global_att_name],
+                        var_name=var_name,
                     )
-                    msg = f"Attribute {var_remap[global_att_name]} should exist in variable {var_name}"
-                    test_ctx.assert_true(var_attr_exists, msg)
 
                     if not var_attr_exists:
                         continue
-                    search_attr = getattr(var, var_remap[global_att_name])
-
-                    msg = f"Attribute {var_remap[global_att_name]} '{search_attr}' for variable {var_name} not contained in {global_att_name} authority table"
-                    test_ctx.assert_true(search_attr in check_set, msg)
+                    search_attr = remapped[var_name]
+
+                    found = search_attr in check_set
+                    suggestions = ""
+                    if not found:
+                        suggestions = suggest.describe(
+                            self.close_matches(global_att_name, search_attr),
+                        )
+                    templates.assert_true(
+                        test_ctx,
+                        found,
+                        "ncei_variable_value",
+                        attr=var_remap[global_att_name],
+                        value=search_attr,
+                        var_name=var_name,
+                        table=global_att_name,
+                        suggestions=suggestions,
+                    )
 
             else:
                 # check for global attribute existence already handled above
                 global_att_value = getattr(dataset, global_att_name)
-                msg = f"Global attribute {global_att_name} value '{global_att_value}' not contained in {global_att_name} authority table"
-                test_ctx.assert_true(global_att_value in check_set, msg)
+                found = global_att_value in check_set
+                suggestions = ""
+                if not found:
+                    suggestions = suggest.describe(
+                        self.close_matches(global_att_name, global_att_value),
+                    )
+                templates.assert_true(
+                    test_ctx,
+                    found,
+                    "ncei_global_value",
+                    attr=global_att_name,
+                    value=global_att_value,
+                    table=global_att_name,
+                    suggestions=suggestions,
+                )
 
         return test_ctx.to_result()
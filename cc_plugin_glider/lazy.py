@@ -0,0 +1,399 @@
+"""
+cc_plugin_glider/lazy.py
+
+Optional xarray/Dask backend for the data checks.
+
+With ``-O gliderdac:backend:dask``, or when validating an xarray.Dataset,
+variable data is read as Dask arrays chunked along their first dimension.
+The time, depth, QC flag and valid range checks then run as chunked
+reductions which Dask computes in parallel, using all cores on one large
+file.  Each chunk is reduced with the same vectorized functions from
+`cc_plugin_glider.util` the serial checks use, so the results match.
+
+Needs the optional xarray and dask packages:
+``pip install cc-plugin-glider[dask]``.
+"""
+
+import os
+import uuid
+import weakref
+
+import numpy as np
+from netCDF4 import Dataset
+
+from cc_plugin_glider import util
+
+# Dask schedulers which may be chosen with -O gliderdac:scheduler:<name>
+SCHEDULERS = ("threads", "processes", "synchronous")
+# header datasets created for xarray sources, and their backends
+_backends = weakref.WeakKeyDictionary()
+
+
+def _import_dask():
+    try:
+        import dask
+        import dask.array as da
+        import xarray as xr
+    except ImportError as e:
+        raise ImportError(
+            "The dask backend needs xarray and dask, install them with "
+            "pip install cc-plugin-glider[dask]",
+        ) from e
+    return dask, da, xr
+
+
+def is_xarray(source):
+    """
+    Returns True if source is an xarray.Dataset, without importing xarray
+    """
+    return type(source).__module__.startswith("xarray") and hasattr(
+        source,
+        "data_vars",
+    )
+
+
+def get_backend(dataset):
+    """
+    Returns the backend holding the data of a header dataset created by
+    `open_xarray`, or None
+    """
+    try:
+        return _backends.get(dataset)
+    except TypeError:
+        return None
+
+
+def open_xarray(xr_dataset, scheduler="threads", name=None):
+    """
+    Creates an in-memory netCDF4 dataset with the dimensions, variables and
+    attributes of an xarray.Dataset, but no data, for the metadata checks.
+    The data checks read the xarray data through a DaskBackend registered
+    for the returned dataset.
+
+    :rtype: netCDF4.Dataset
+    """
+    backend = DaskBackend.from_xarray(xr_dataset, scheduler=scheduler)
+    header = backend.header_dataset(name)
+    _backends[header] = backend
+    return header
+
+
+def _merge_invalid(parts):
+    invalid = {}
+    for part in parts:
+        for value, count in part.items():
+            invalid[value] = invalid.get(value, 0) + count
+    return dict(sorted(invalid.items()))
+
+
+def _merge_out_of_range(parts, offsets, max_indices):
+    below = 0
+    above = 0
+    indices = []
+    for (part_below, part_above, part_indices), offset in zip(
+        parts,
+        offsets,
+    ):
+        below += part_below
+        above += part_above
+        for index in part_indices[: max_indices - len(indices)]:
+            if isinstance(index, tuple):
+                indices.append((index[0] + offset, *index[1:]))
+            else:
+                indices.append(index + offset)
+    return below, above, indices
+
+
+def _increasing_block(data, valid):
+    values = data[valid]
+    if not values.size:
+        return True, None, None
+    return bool(np.all(np.diff(values) > 0)), values[0], values[-1]
+
+
+def _merge_increasing(parts):
+    last = None
+    for increasing, part_first, part_last in parts:
+        if not increasing:
+            return False
+        if part_first is None:
+            continue
+        if last is not None and part_first <= last:
+            return False
+        last = part_last
+    return True
+
+
+class DaskBackend:
+    """
+    Dask arrays of the encoded (raw) values of a dataset's variables.
+
+    :param xr_dataset: An xarray.Dataset holding encoded values, e.g. opened
+                       with ``decode_cf=False``
+    :param str scheduler: Dask scheduler used to compute the reductions,
+                          one of `SCHEDULERS`
+    :param int memory_budget: Bytes per chunk for variables which aren't
+                              already chunked
+    """
+
+    def __init__(
+        self,
+        xr_dataset,
+        scheduler="threads",
+        memory_budget=util.DEFAULT_MEMORY_BUDGET,
+    ):
+        self.dask, self.da, self.xr = _import_dask()
+        if scheduler not in SCHEDULERS:
+            raise ValueError(
+                f"Unknown scheduler {scheduler}, use one of {SCHEDULERS}",
+            )
+        self.dataset = xr_dataset
+        self.scheduler = scheduler
+        self.memory_budget = memory_budget
+
+    @classmethod
+    def open(
+        cls,
+        path,
+        scheduler="threads",
+        memory_budget=util.DEFAULT_MEMORY_BUDGET,
+    ):
+        """
+        Opens a netCDF file lazily, with every dimension chunked to fit the
+        memory budget
+        """
+        _, _, xr = _import_dask()
+        with Dataset(path) as dataset:
+            dimensions = list(dataset.dimensions)
+        chunk = util.block_elements(np.float64, memory_budget)
+        xr_dataset = xr.open_dataset(
+            path,
+            decode_cf=False,
+            chunks=dict.fromkeys(dimensions, chunk),
+        )
+        return cls(xr_dataset, scheduler, memory_budget)
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset,
+        scheduler="threads",
+        memory_budget=util.DEFAULT_MEMORY_BUDGET,
+    ):
+        """
+        Opens the file backing an open netCDF4.Dataset lazily, see `open`,
+        or returns None if the dataset isn't a file on disk, e.g. one read
+        from CDL or an in-memory buffer
+        """
+        try:
+            path = dataset.filepath()
+        except (ValueError, AttributeError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        return cls.open(path, scheduler, memory_budget)
+
+    @classmethod
+    def from_xarray(cls, xr_dataset, scheduler="threads"):
+        """
+        Creates a backend for an xarray.Dataset, lazily encoding variables
+        which were decoded when it was opened so that fill values, packing
+        and times are checked as they are stored
+        """
+        _, _, xr = _import_dask()
+        variables, attributes = xr.conventions.cf_encoder(
+            dict(xr_dataset.variables),
+            dict(xr_dataset.attrs),
+        )
+        return cls(xr.Dataset(variables, attrs=attributes), scheduler)
+
+    def __contains__(self, var_name):
+        return var_name in self.dataset.variables
+
+    def header_dataset(self, name=None):
+        """
+        Returns a diskless netCDF4 dataset with the structure and attributes
+        of the backend's dataset, but no data
+        """
+        header = Dataset(
+            name or f"xarray-{uuid.uuid4().hex}",
+            "w",
+            diskless=True,
+        )
+        for dim_name, size in self.dataset.sizes.items():
+            header.createDimension(dim_name, size)
+        for var_name, variable in self.dataset.variables.items():
+            attrs = {
+                attr: int(value) if isinstance(value, bool) else value
+                for attr, value in variable.attrs.items()
+                if value is not None
+            }
+            fill_value = attrs.pop("_FillValue", None)
+            dtype = variable.dtype
+            if dtype.kind in "OU" or dtype.kind == "S" and dtype.itemsize > 1:
+                # strings are stored as variable length strings
+                dtype = str
+            ncvar = header.createVariable(
+                var_name,
+                dtype,
+                variable.dims,
+                fill_value=fill_value,
+            )
+            ncvar.setncatts(attrs)
+        header.setncatts(
+            {
+                attr: value
+                for attr, value in self.dataset.attrs.items()
+                if value is not None
+            },
+        )
+        return header
+
+    def array(self, var_name):
+        """
+        Returns a variable's raw values as a Dask array chunked along its
+        first dimension only
+        """
+        data = self.dataset.variables[var_name].data
+        if not isinstance(data, self.da.Array):
+            data = self.da.from_array(
+                np.asarray(data),
+                chunks=(
+                    util.block_elements(data.dtype, self.memory_budget),
+                    *(-1,) * (data.ndim - 1),
+                )
+                if data.ndim
+                else (),
+            )
+        if data.ndim > 1:
+            data = data.rechunk(dict.fromkeys(range(1, data.ndim), -1))
+        return data
+
+    def compute(self, *values):
+        """
+        Computes lazy values together, sharing chunk reads between them
+        """
+        return self.dask.compute(*values, scheduler=self.scheduler)
+
+    def read(self, var_name, variable):
+        """
+        Returns all of a variable's data as a masked array, masked the same
+        way netCDF4 masks values by default
+        """
+        data, valid = self.compute(
+            self.array(var_name),
+            self.valid(var_name, variable),
+        )
+        return np.ma.masked_array(data, mask=~valid)
+
+    def _blocks(self, var_name):
+        """
+        Returns the delayed chunks of a variable with the offset of each
+        chunk along the first dimension
+        """
+        data = self.array(var_name)
+        if not data.ndim:
+            return [data.to_delayed().item()], [0]
+        offsets = np.cumsum((0, *data.chunks[0][:-1])).tolist()
+        return list(data.to_delayed().ravel()), offsets
+
+    def valid(self, var_name, variable):
+        """
+        Returns a lazy boolean array of which values netCDF4 wouldn't mask:
+        not a fill or missing value and within the valid range.  Attributes
+        are read from `variable`, e.g. the header dataset's variable.
+        """
+        data = self.array(var_name)
+        valid = self.da.ones(data.shape, dtype=bool, chunks=data.chunks)
+        missing = util.missing_values(variable)
+        if missing.size:
+            valid &= ~self.da.isin(data, missing)
+            if data.dtype.kind == "f" and np.isnan(missing).any():
+                valid &= ~self.da.isnan(data)
+        valid_min, valid_max = util.valid_bounds(variable)
+        if valid_min is not None:
+            valid &= data >= valid_min
+        if valid_max is not None:
+            valid &= data <= valid_max
+        return valid
+
+    def count_valid(self, var_name, variable):
+        """
+        Lazily counts the values netCDF4 wouldn't mask
+        """
+        return self.valid(var_name, variable).sum()
+
+    def is_increasing(self, var_name, variable):
+        """
+        Lazily tests whether a 1-D variable's valid values strictly
+        increase, chunk by chunk, skipping the values netCDF4 would mask
+        """
+        delayed = self.dask.delayed
+        blocks, _ = self._blocks(var_name)
+        valid = self.valid(var_name, variable).to_delayed().ravel()
+        parts = [
+            delayed(_increasing_block)(block, block_valid)
+            for block, block_valid in zip(blocks, valid)
+        ]
+        return delayed(_merge_increasing)(parts)
+
+    def valid_span(self, var_name, variable):
+        """
+        Returns the difference between the last and first valid values of a
+        1-D variable, the sum of the differences between its valid values,
+        unpacked with scale_factor, or 0 if there are fewer than two
+        """
+        data = self.array(var_name)
+        valid = self.valid(var_name, variable)
+        index = self.da.arange(data.shape[0], chunks=data.chunks)
+        first, last = self.compute(
+            self.da.where(valid, index, data.shape[0]).min(),
+            self.da.where(valid, index, -1).max(),
+        )
+        if last <= first:
+            return 0
+        first_value, last_value = self.compute(data[first], data[last])
+        scale = getattr(variable, "scale_factor", 1)
+        return (float(last_value) - float(first_value)) * scale
+
+    def count_invalid_values(self, var_name, allowed):
+        """
+        Lazily counts the values which aren't in `allowed`, chunk by chunk,
+        see `util.count_invalid_values`
+        """
+        delayed = self.dask.delayed
+        blocks, _ = self._blocks(var_name)
+        parts = [
+            delayed(util.count_invalid_values)([block], allowed)
+            for block in blocks
+        ]
+        return delayed(_merge_invalid)(parts)
+
+    def count_out_of_range(
+        self,
+        var_name,
+        valid_min=None,
+        valid_max=None,
+        missing=(),
+        max_indices=5,
+    ):
+        """
+        Lazily counts the values outside a valid range, chunk by chunk, see
+        `util.count_out_of_range`
+        """
+        delayed = self.dask.delayed
+        blocks, offsets = self._blocks(var_name)
+        parts = [
+            delayed(util.count_out_of_range)(
+                [block],
+                valid_min,
+                valid_max,
+                missing,
+                max_indices,
+            )
+            for block in blocks
+        ]
+        return delayed(_merge_out_of_range)(parts, offsets, max_indices)
+
+    def close(self):
+        self.dataset.close()
@@ -0,0 +1,170 @@
+"""
+cc_plugin_glider/ndjson.py
+
+Streaming newline-delimited JSON output for batch runs.
+
+Each file, or each check of each file, is written as one compact JSON line
+as soon as it has been checked, so memory use doesn't grow with the number
+of files and downstream tools can consume the stream while it is running.
+"""
+
+import json
+
+import numpy as np
+
+from cc_plugin_glider import api
+
+
+def result_value(result):
+    """
+    Returns a Result's value as a (score, out_of) tuple, translating the
+    shorthand True/False/None values the same way compliance-checker does
+    """
+    value = result.value
+    if value is True:
+        return (1, 1)
+    if value is False:
+        return (0, 1)
+    if value is None:
+        return (0, 0)
+    return tuple(value)
+
+
+def result_record(result):
+    """
+    Converts a Result into a JSON serializable dictionary
+    """
+    check_method = getattr(result, "check_method", None)
+    score, out_of = result_value(result)
+    return {
+        "check": getattr(check_method, "__name__", None),
+        "name": result.name,
+        "weight": result.weight,
+        "score": score,
+        "out_of": out_of,
+        "msgs": list(result.msgs),
+    }
+
+
+def _error_message(error):
+    exception = error[0]
+    return f"{type(exception).__name__}: {exception}"
+
+
+def file_record(source, results, errors):
+    """
+    Builds the record for one file from the output of `api.run_checks`
+    """
+    records = [result_record(result) for result in results]
+    return {
+        "source": source,
+        "scored_points": sum(record["score"] for record in records),
+        "possible_points": sum(record["out_of"] for record in records),
+        "results": records,
+        "errors": {
+            check_name: _error_message(error)
+            for check_name, error in errors.items()
+        },
+    }
+
+
+def check_record(source, check_name, results, error):
+    """
+    Builds the record for one check of one file from the output of
+    `api.iter_check_results`
+    """
+    records = [result_record(result) for result in results]
+    return {
+        "source": source,
+        "check": check_name,
+        "scored_points": sum(record["score"] for record in records),
+        "possible_points": sum(record["out_of"] for record in records),
+        "results": records,
+        "error": None if error is None else _error_message(error),
+    }
+
+
+def iter_records(
+    sources,
+    checker,
+    per_check=False,
+    include_checks=None,
+    skip_checks=None,
+):
+    """
+    Checks each source in turn and yields its records as they are produced.
+    A source which can't be opened yields a single record with an ``error``
+    instead of stopping the batch.
+    """
+    for source in sources:
+        name = api.source_name(source)
+        try:
+            dataset = api.open_dataset(source)
+        except Exception as e:
+            yield {"source": name, "error": f"{type(e).__name__}: {e}"}
+            continue
+        try:
+            if per_check:
+                for check_name, results, error in api.iter_check_results(
+                    checker,
+                    dataset,
+                    include_checks,
+                    skip_checks,
+                ):
+                    yield check_record(name, check_name, results, error)
+            else:
+                results, errors = api.run_checks(
+                    checker,
+                    dataset,
+                    include_checks,
+                    skip_checks,
+                    source=source,
+                )
+                yield file_record(name, results, errors)
+        finally:
+            if dataset is not source:
+                dataset.close()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(record):
+    """
+    Serializes a record as a single compact line of JSON
+    """
+    return json.dumps(record, separators=(",", ":"), default=_json_default)
+
+
+def write_ndjson(
+    sources,
+    stream,
+    checker,
+    per_check=False,
+    include_checks=None,
+    skip_checks=None,
+):
+    """
+    Checks each source and writes one JSON line per file, or per check with
+    `per_check`, to a text stream, flushing after every line.
+
+    :return: The number of records written
+    """
+    count = 0
+    for record in iter_records(
+        sources,
+        checker,
+        per_check,
+        include_checks,
+        skip_checks,
+    ):
+        stream.write(dumps(record))
+        stream.write("\n")
+        stream.flush()
+        count += 1
+    return count
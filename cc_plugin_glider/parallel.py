@@ -0,0 +1,320 @@
+"""
+cc_plugin_glider/parallel.py
+
+Runs the checks of a single file concurrently.
+
+The netCDF library isn't thread-safe, so the metadata checks run on a pool
+of threads against a `DatasetSnapshot`, a pure Python copy of the file's
+dimensions, variables and attributes taken before any check starts.  The
+data checks, which read variable data, run one at a time on a single reader
+thread holding `netcdf_lock`, overlapping their I/O with the metadata
+checks.  Anything a metadata check reads from the snapshot beyond the
+copied metadata is fetched from the file behind the same lock.
+
+Results are returned in the same order as the serial runner returns them,
+whichever check finishes first.  Metadata check results cached for a file
+with the same header are reused, see `cc_plugin_glider.cache`.
+"""
+
+import functools
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import RLock
+
+import numpy as np
+from compliance_checker.suite import CheckSuite
+
+from cc_plugin_glider import util
+
+# serializes every netCDF call made while checks run concurrently
+netcdf_lock = RLock()
+# the CheckSuite methods the check runners are built on.  They are private
+# to compliance-checker, so requirements.txt keeps it below its next major
+# version and the tests fail if any of them goes away
+SUITE_METHODS = ("_process_skip_checks", "_get_checks", "_run_check")
+_suite = CheckSuite()
+
+
+def _locked(lock, obj, name):
+    """
+    Gets an attribute of a netCDF object behind the lock, wrapping methods
+    so that calling them also holds the lock
+    """
+    with lock:
+        value = getattr(obj, name)
+    if not callable(value):
+        return value
+
+    @functools.wraps(value)
+    def call(*args, **kwargs):
+        with lock:
+            return value(*args, **kwargs)
+
+    return call
+
+
+class _AttributeSnapshot:
+    """
+    Copied netCDF attributes, read with getattr, getncattr and ncattrs like
+    the attributes of a netCDF4 object
+    """
+
+    def __init__(self, source, lock):
+        self._source = source
+        self._lock = lock
+        self._attrs = {
+            attr: source.getncattr(attr) for attr in source.ncattrs()
+        }
+
+    def ncattrs(self):
+        return list(self._attrs)
+
+    def getncattr(self, name):
+        try:
+            return self._attrs[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getattr__(self, name):
+        # only called for names which aren't set on the snapshot itself
+        attrs = self.__dict__.get("_attrs")
+        if attrs is None or name.startswith("__"):
+            raise AttributeError(name)
+        if name in attrs:
+            return attrs[name]
+        # other netCDF4 methods and properties are read from the file, but
+        # missing attributes are answered without touching it
+        if name.startswith("_") or not hasattr(type(self._source), name):
+            raise AttributeError(name)
+        return _locked(self._lock, self._source, name)
+
+
+class DimensionSnapshot:
+    """
+    A netCDF dimension's name, size and whether it is unlimited
+    """
+
+    def __init__(self, dimension):
+        self.name = dimension.name
+        self.size = dimension.size
+        self._unlimited = dimension.isunlimited()
+
+    def __len__(self):
+        return self.size
+
+    def isunlimited(self):
+        return self._unlimited
+
+
+class VariableSnapshot(_AttributeSnapshot):
+    """
+    The metadata of a netCDF4.Variable.  Indexing reads the variable's data
+    from the file behind the lock.
+    """
+
+    def __init__(self, variable, lock):
+        super().__init__(variable, lock)
+        self.name = variable.name
+        self.dtype = variable.dtype
+        self.datatype = variable.datatype
+        self.dimensions = variable.dimensions
+        self.shape = variable.shape
+        self.ndim = variable.ndim
+        self.size = variable.size
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError("len() of unsized object")
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._source[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[...], dtype=dtype)
+
+
+class DatasetSnapshot(_AttributeSnapshot):
+    """
+    A pure Python copy of the metadata of a netCDF4.Dataset, which checks
+    can read from any thread.  Only the root group is copied.
+
+    :param netCDF4.Dataset dataset: An open dataset
+    :param lock: Lock held while anything is read from the dataset itself
+    """
+
+    def __init__(self, dataset, lock=netcdf_lock):
+        with lock:
+            super().__init__(dataset, lock)
+            self.dimensions = {
+                name: DimensionSnapshot(dimension)
+                for name, dimension in dataset.dimensions.items()
+            }
+            self.variables = {
+                name: VariableSnapshot(variable, lock)
+                for name, variable in dataset.variables.items()
+            }
+            self.data_model = dataset.data_model
+            self.file_format = dataset.file_format
+            self._filepath = dataset.filepath()
+        self.groups = {}
+
+    def filepath(self):
+        return self._filepath
+
+    @functools.cached_property
+    def attribute_index(self):
+        """
+        The `util.AttributeIndex` of the snapshot's variables, built the
+        first time a check asks for it
+        """
+        return util.AttributeIndex(self)
+
+    def get_variables_by_attributes(self, **kwargs):
+        """
+        Returns the variables with matching attributes, with the same
+        semantics as netCDF4.Dataset.get_variables_by_attributes
+        """
+        matches = []
+        for variable in self.variables.values():
+            for attr, expected in kwargs.items():
+                value = variable._attrs.get(attr)
+                if callable(expected):
+                    matched = expected(value)
+                else:
+                    matched = attr in variable._attrs and value == expected
+                if not matched:
+                    break
+            else:
+                matches.append(variable)
+        return matches
+
+
+def is_data_check(checker, check_name):
+    """
+    Returns True unless the checker declares the check as only reading
+    metadata, i.e. the check isn't listed in its `data_checks`.  Checks of
+    checkers which don't declare their data checks are all treated as data
+    checks, so they are run one at a time behind the lock.
+    """
+    data_checks = getattr(checker, "data_checks", None)
+    return data_checks is None or check_name in data_checks
+
+
+def result_cache_key(checker, dataset):
+    """
+    Returns the checker's `cache.ResultCache` and the key for the results of
+    its metadata checks on a dataset or a `DatasetSnapshot` of it, or
+    (None, None) if the checker doesn't cache results
+    """
+    result_cache = getattr(checker, "result_cache", None)
+    if result_cache is None:
+        return None, None
+    return result_cache, result_cache.key(checker, dataset)
+
+
+def get_checks(checker, include_checks=None, skip_checks=None):
+    """
+    Returns the (check method, max skipped level) pairs of a checker to run,
+    selected the same way as by compliance-checker's ``-i`` and ``-s``
+    options
+    """
+    skip_check_dict = CheckSuite._process_skip_checks(skip_checks or [])
+    include_dict = dict.fromkeys(include_checks or [], 0)
+    return _suite._get_checks(checker, include_dict, skip_check_dict)
+
+
+def run_check(check_method, dataset, max_level):
+    """
+    Runs a check method and returns its Results above the max skipped level
+    """
+    return _suite._run_check(check_method, dataset, max_level)
+
+
+def teardown(checker):
+    """
+    Closes what a checker opened to check a dataset, for checkers with a
+    teardown method
+    """
+    teardown = getattr(checker, "teardown", None)
+    if teardown is not None:
+        teardown()
+
+
+def _run(check_method, dataset, max_level, lock=None):
+    try:
+        if lock is None:
+            return run_check(check_method, dataset, max_level), None
+        with lock:
+            return run_check(check_method, dataset, max_level), None
+    except Exception as e:
+        return [], (e, sys.exc_info()[2])
+
+
+def iter_check_results(
+    checker,
+    dataset,
+    include_checks=None,
+    skip_checks=None,
+    workers=4,
+):
+    """
+    Runs the check methods of a checker against an open dataset, with the
+    metadata checks on `workers` threads reading a `DatasetSnapshot` while
+    the data checks run on a single reader thread.  Yields the same
+    (check method name, list of Results, error) tuples, in the same order,
+    as `api.iter_check_results`.
+    """
+    try:
+        with netcdf_lock:
+            checker.setup(dataset)
+            checks = get_checks(checker, include_checks, skip_checks)
+            snapshot = DatasetSnapshot(dataset)
+        result_cache, cache_key = result_cache_key(checker, snapshot)
+
+        reader = ThreadPoolExecutor(1, "glider-reader")
+        pool = ThreadPoolExecutor(max(workers, 1), "glider-check")
+        with reader, pool:
+            pending = []
+            for check_method, max_level in checks:
+                check_name = check_method.__func__.__name__
+                if is_data_check(checker, check_name):
+                    future = reader.submit(
+                        _run,
+                        check_method,
+                        dataset,
+                        max_level,
+                        netcdf_lock,
+                    )
+                    pending.append((check_name, max_level, future, False))
+                    continue
+                if cache_key is not None:
+                    results = result_cache.get(
+                        cache_key,
+                        check_name,
+                        max_level,
+                    )
+                    if results is not None:
+                        future = Future()
+                        future.set_result((results, None))
+                        pending.append((check_name, max_level, future, False))
+                        continue
+                future = pool.submit(
+                    _run,
+                    check_method,
+                    snapshot,
+                    max_level,
+                )
+                pending.append(
+                    (check_name, max_level, future, cache_key is not None),
+                )
+
+            for check_name, max_level, future, cacheable in pending:
+                results, error = future.result()
+                if cacheable and error is None:
+                    result_cache.put(cache_key, check_name, max_level, results)
+                yield check_name, results, error
+    finally:
+        with netcdf_lock:
+            teardown(checker)
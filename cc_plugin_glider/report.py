@@ -0,0 +1,295 @@
+"""
+cc_plugin_glider/report.py
+
+Columnar reports of batch runs for fleet-wide compliance analytics.
+
+A report has one row per check result of each file, with the file's
+institution, project and other identifying global attributes, the check's
+score, and the template IDs of its failures, see
+`cc_plugin_glider.templates`.  Rows are buffered and written in row groups,
+so memory use doesn't grow with the number of files, and questions such as
+which checks fail most often per institution become a single group-by over
+the report, e.g. with pandas or DuckDB.
+
+Reports are written as Parquet or Arrow IPC files with the optional pyarrow
+package, ``pip install cc-plugin-glider[report]``, and as CSV otherwise.
+"""
+
+import csv
+import os
+
+from cc_plugin_glider import api, ndjson, templates
+
+# global attributes identifying a file's deployment, one column each
+REPORT_ATTRIBUTES = (
+    "institution",
+    "project",
+    "platform_type",
+    "wmo_id",
+    "format_version",
+)
+COLUMNS = (
+    "source",
+    *REPORT_ATTRIBUTES,
+    "check",
+    "name",
+    "weight",
+    "score",
+    "out_of",
+    "failures",
+    "error",
+)
+FORMATS = ("parquet", "arrow", "csv")
+_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".csv": "csv",
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Arrow reports need pyarrow, install it with "
+            "pip install cc-plugin-glider[report], or write a CSV report",
+        ) from e
+    return pa
+
+
+def _has_pyarrow():
+    try:
+        _import_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+def report_format(path, report_type=None):
+    """
+    Returns the format of a report: the given type, else the one implied by
+    the path's extension, else Parquet if pyarrow is installed and CSV
+    otherwise
+    """
+    if report_type is None:
+        extension = os.path.splitext(os.fspath(path))[1].lower()
+        report_type = _EXTENSIONS.get(extension)
+    if report_type is None:
+        report_type = "parquet" if _has_pyarrow() else "csv"
+    if report_type not in FORMATS:
+        raise ValueError(
+            f"Unknown report format {report_type}, expected one of "
+            f"{', '.join(FORMATS)}",
+        )
+    return report_type
+
+
+def file_metadata(dataset):
+    """
+    Returns the report attributes of an open dataset as strings, with an
+    empty string for those it doesn't have
+    """
+    ncattrs = set(dataset.ncattrs())
+    return {
+        attr: str(dataset.getncattr(attr)) if attr in ncattrs else ""
+        for attr in REPORT_ATTRIBUTES
+    }
+
+
+def failures(result):
+    """
+    Returns the template IDs of a Result's messages, separated by spaces.
+    Messages which weren't formatted from a template are left out.
+    """
+    return " ".join(
+        template_id
+        for template_id in map(templates.get_template_id, result.msgs or ())
+        if template_id is not None
+    )
+
+
+class ReportWriter:
+    """
+    Writes check results to a columnar report, in row groups of
+    `row_group_size` rows.
+
+    :param path: The report file
+    :param str report_type: ``parquet``, ``arrow`` or ``csv``, see
+                            `report_format`
+    :param int row_group_size: Rows buffered before each write
+    """
+
+    def __init__(self, path, report_type=None, row_group_size=65536):
+        self.path = os.fspath(path)
+        self.report_type = report_format(self.path, report_type)
+        self.row_group_size = max(int(row_group_size), 1)
+        self.files = 0
+        self.rows = 0
+        self._columns = {column: [] for column in COLUMNS}
+        self._buffered = 0
+        self._writer = None
+        self._stream = None
+        if self.report_type == "csv":
+            self._stream = open(self.path, "w", newline="", encoding="utf8")
+            self._writer = csv.writer(self._stream)
+            self._writer.writerow(COLUMNS)
+        else:
+            pa = _import_pyarrow()
+            self._schema = pa.schema(
+                [
+                    ("source", pa.string()),
+                    *((attr, pa.string()) for attr in REPORT_ATTRIBUTES),
+                    ("check", pa.string()),
+                    ("name", pa.string()),
+                    ("weight", pa.int8()),
+                    ("score", pa.float64()),
+                    ("out_of", pa.float64()),
+                    ("failures", pa.string()),
+                    ("error", pa.string()),
+                ],
+            )
+            if self.report_type == "parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _append(self, row):
+        for column, value in zip(COLUMNS, row):
+            self._columns[column].append(value)
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def add(self, source, results, errors=None, metadata=None):
+        """
+        Adds the results of one file.
+
+        :param source: The file's name
+        :param results: List of Results, from `api.run_checks`
+        :param errors: Dictionary of check method name to an (exception,
+                       traceback) tuple or an error message
+        :param metadata: The file's report attributes, see `file_metadata`
+        """
+        metadata = metadata or {}
+        attributes = tuple(
+            metadata.get(attr, "") for attr in REPORT_ATTRIBUTES
+        )
+        for result in results:
+            score, out_of = ndjson.result_value(result)
+            check_method = getattr(result, "check_method", None)
+            self._append(
+                (
+                    source,
+                    *attributes,
+                    getattr(check_method, "__name__", None),
+                    result.name,
+                    result.weight,
+                    score,
+                    out_of,
+                    failures(result),
+                    None,
+                ),
+            )
+        for check_name, error in (errors or {}).items():
+            self._append(
+                (
+                    source,
+                    *attributes,
+                    check_name,
+                    None,
+                    None,
+                    0,
+                    0,
+                    "",
+                    error
+                    if isinstance(error, str)
+                    else ndjson._error_message(error),
+                ),
+            )
+        self.files += 1
+
+    def flush(self):
+        """
+        Writes the buffered rows as one row group
+        """
+        if not self._buffered:
+            return
+        if self.report_type == "csv":
+            self._writer.writerows(
+                zip(*(self._columns[column] for column in COLUMNS)),
+            )
+            self._stream.flush()
+        else:
+            pa = _import_pyarrow()
+            self._writer.write_table(
+                pa.table(self._columns, schema=self._schema),
+            )
+        self.rows += self._buffered
+        self._columns = {column: [] for column in COLUMNS}
+        self._buffered = 0
+
+    def close(self):
+        """
+        Writes any buffered rows and closes the report
+        """
+        if self._writer is None:
+            return
+        self.flush()
+        if self.report_type == "csv":
+            self._stream.close()
+        else:
+            self._writer.close()
+        self._writer = None
+
+
+def write_report(
+    sources,
+    path,
+    checker,
+    report_type=None,
+    include_checks=None,
+    skip_checks=None,
+    row_group_size=65536,
+    workers=1,
+):
+    """
+    Checks each source in turn and writes its results to a columnar report.
+    A source which can't be opened is written as a single row with an
+    ``error`` instead of stopping the batch.
+
+    :return: The number of files written
+    """
+    with ReportWriter(path, report_type, row_group_size) as writer:
+        for source in sources:
+            name = api.source_name(source)
+            try:
+                dataset = api.open_dataset(source)
+            except Exception as e:
+                writer.add(name, [], {None: f"{type(e).__name__}: {e}"})
+                continue
+            try:
+                results, errors = api.run_checks(
+                    checker,
+                    dataset,
+                    include_checks,
+                    skip_checks,
+                    workers,
+                    source,
+                )
+                writer.add(name, results, errors, file_metadata(dataset))
+            finally:
+                if dataset is not source:
+                    dataset.close()
+    return writer.files
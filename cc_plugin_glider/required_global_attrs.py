@@ -0,0 +1,54 @@
+"""
+cc_plugin_glider/required_global_attrs.py
+
+Dictionary of required global attributes and the rules their values are
+checked against, in the order they are checked
+
+Attributes with rules set to None must exist, and must not be empty if they
+are strings.  Other rules are dictionaries with one of:
+ - "vocabulary": the authority table holding the valid values, compared
+   case insensitively.  The value may list several, separated by commas.
+ - "values": the name of the checker attribute holding the valid values
+
+and "message", the ID of the template for invalid values.  See
+`cc_plugin_glider.schema` for how they are checked.
+"""
+
+required_global_attrs = {
+    "Conventions": None,
+    "Metadata_Conventions": None,
+    "comment": None,
+    "contributor_name": None,
+    "contributor_role": None,
+    "creator_email": None,
+    "creator_name": None,
+    "creator_url": None,
+    "date_created": None,
+    "date_issued": None,
+    "date_modified": None,
+    "format_version": None,
+    "history": None,
+    "id": None,
+    "institution": None,
+    "keywords": None,
+    "keywords_vocabulary": None,
+    "license": None,
+    "metadata_link": None,
+    "naming_authority": None,
+    "processing_level": None,
+    "project": None,
+    "publisher_email": None,
+    "publisher_name": None,
+    "publisher_url": None,
+    "references": None,
+    "source": None,
+    "standard_name_vocabulary": None,
+    "summary": None,
+    "title": None,
+    "wmo_id": None,
+    "sea_name": {"vocabulary": "sea_name", "message": "sea_name_invalid"},
+    "platform_type": {
+        "values": "acceptable_platform_types",
+        "message": "platform_type_invalid",
+    },
+}
@@ -0,0 +1,147 @@
+"""
+cc_plugin_glider/rules.py
+
+Rule sets for each version of the IOOS Glider DAC file format.
+
+A file's version is read once from its ``format_version`` attribute, e.g.
+``IOOS_Glider_NetCDF_v2.0.nc`` or ``IOOS_Glider_NetCDF_v3.0-qartod``, and
+the checks use that version's required variables, variable attributes and
+global attributes.  Each version's rules are the base rules with its changes
+from `VERSION_CHANGES` applied, built and compiled once per process and
+shared by every file of that version.
+"""
+
+import copy
+import functools
+import re
+
+from cc_plugin_glider import schema
+from cc_plugin_glider.required_global_attrs import required_global_attrs
+from cc_plugin_glider.required_var_attrs import required_var_attrs
+
+REQUIRED_VARIABLES = (
+    "trajectory",
+    "time",
+    "lat",
+    "lon",
+    "pressure",
+    "depth",
+    "temperature",
+    "conductivity",
+    "density",
+    "profile_id",
+    "profile_time",
+    "profile_lat",
+    "profile_lon",
+    "time_uv",
+    "lat_uv",
+    "lon_uv",
+    "u",
+    "v",
+    "platform",
+    "instrument_ctd",
+)
+# changes to the base rules, which are those of version 3, in each major
+# format version, with any of:
+#  - "required_variables": the variables required instead of
+#    REQUIRED_VARIABLES
+#  - "var_attrs": variable names to the attributes added to or changed in
+#    their required_var_attrs
+#  - "global_attrs": attribute names to the rules added to or changed in
+#    required_global_attrs
+#  - "acknowledgement": the spelling of the acknowledgement attribute
+#  - "ioos_regional_association": whether the format defines the
+#    ioos_regional_association attribute
+# The last two describe the format only: the checks score every version the
+# same way, so that scores stay comparable between versions.  QARTOD flag
+# variables, introduced in v3, are checked wherever they are present.
+VERSION_CHANGES = {
+    "2": {
+        # v2 follows ACDD 1.0, and ioos_regional_association was introduced
+        # in v3
+        "acknowledgement": "acknowledgment",
+        "ioos_regional_association": False,
+    },
+    "3": {},
+}
+# version of files without a recognizable format_version
+DEFAULT_VERSION = "3"
+_FORMAT_VERSION = re.compile(r"v(\d+)", re.IGNORECASE)
+
+
+class RuleSet:
+    """
+    The compiled rules of one format version.
+
+    :param str version: The major format version
+    :param required_variables: Names of the required variables
+    :param dict var_attrs: Variable names to their required attributes, see
+                           `cc_plugin_glider.required_var_attrs`
+    :param dict global_attrs: Global attribute names to their rules, see
+                              `cc_plugin_glider.required_global_attrs`
+    :param str acknowledgement: The spelling of the acknowledgement attribute
+    :param bool ioos_regional_association: Whether the format defines the
+                                           ioos_regional_association
+                                           attribute
+    """
+
+    def __init__(
+        self,
+        version,
+        required_variables,
+        var_attrs,
+        global_attrs,
+        acknowledgement="acknowledgement",
+        ioos_regional_association=True,
+    ):
+        self.version = version
+        self.required_variables = tuple(required_variables)
+        self.var_attrs = var_attrs
+        self.global_attributes = schema.GlobalAttributeValidator(
+            global_attrs,
+        )
+        self.acknowledgement = acknowledgement
+        self.ioos_regional_association = ioos_regional_association
+
+    def __repr__(self):
+        return f"<RuleSet v{self.version}>"
+
+
+@functools.cache
+def rule_set(version):
+    """
+    Returns the `RuleSet` of a major format version, built once
+    """
+    changes = dict(VERSION_CHANGES[version])
+    var_attrs = copy.deepcopy(required_var_attrs)
+    for var_name, attrs in changes.pop("var_attrs", {}).items():
+        var_attrs.setdefault(var_name, {}).update(attrs)
+    return RuleSet(
+        version,
+        changes.pop("required_variables", REQUIRED_VARIABLES),
+        var_attrs,
+        {**required_global_attrs, **changes.pop("global_attrs", {})},
+        **changes,
+    )
+
+
+def format_version(dataset):
+    """
+    Returns the major format version of a dataset from its format_version
+    attribute, or DEFAULT_VERSION if it has none this module knows
+    """
+    try:
+        value = dataset.getncattr("format_version")
+    except AttributeError:
+        return DEFAULT_VERSION
+    match = _FORMAT_VERSION.search(str(value))
+    if match is None or match.group(1) not in VERSION_CHANGES:
+        return DEFAULT_VERSION
+    return match.group(1)
+
+
+def for_dataset(dataset):
+    """
+    Returns the `RuleSet` of a dataset's format version
+    """
+    return rule_set(format_version(dataset))
@@ -0,0 +1,152 @@
+"""
+cc_plugin_glider/schema.py
+
+Compiles a declarative global attribute schema, see
+`cc_plugin_glider.required_global_attrs`, into a validator.
+
+Each rule is compiled once into a function, and a dataset's global
+attributes are read in a single pass, so checking a file is one call to
+``ncattrs()`` and one read per attribute whatever the size of the schema.
+Authority tables are lowercased once per table rather than once per file.
+"""
+
+from cc_plugin_glider import suggest, templates
+
+
+def _required(name):
+    def check(validator, attrs, checker, messages):
+        if name not in attrs:
+            messages.append(
+                templates.format_message(
+                    "global_attribute_missing", attr=name
+                ),
+            )
+            return 0, 1
+        value = attrs[name]
+        if isinstance(value, str) and not value.strip():
+            messages.append(
+                templates.format_message("global_attribute_empty", attr=name),
+            )
+            return 1, 2
+        return 2, 2
+
+    return check
+
+
+def _vocabulary(name, table_name, template_id):
+    def check(validator, attrs, checker, messages):
+        valid = validator.vocabulary(checker, table_name)
+        value = attrs.get(name, "").replace(", ", ",")
+        if not value:
+            messages.append(
+                templates.format_message(
+                    "global_attribute_missing", attr=name
+                ),
+            )
+            return 0, 1
+        # a point for the fact that the attribute exists
+        score = out_of = 1
+        for item in value.split(","):
+            out_of += 1
+            if item.lower() in valid:
+                score += 1
+            else:
+                messages.append(
+                    templates.format_message(
+                        template_id,
+                        value=item,
+                        suggestions=suggest.describe(
+                            checker.close_matches(table_name, item),
+                        ),
+                    ),
+                )
+        return score, out_of
+
+    return check
+
+
+def _values(name, values_name, template_id):
+    def check(validator, attrs, checker, messages):
+        value = attrs.get(name, "")
+        if not value:
+            messages.append(
+                templates.format_message(
+                    "global_attribute_missing", attr=name
+                ),
+            )
+            return 0, 1
+        valid = getattr(checker, values_name)
+        if value in valid:
+            return 2, 2
+        messages.append(
+            templates.format_message(
+                template_id,
+                value=value,
+                accepted=",".join(valid),
+            ),
+        )
+        return 1, 2
+
+    return check
+
+
+def compile_rule(name, rule):
+    """
+    Compiles the rule of one global attribute into a function of
+    (validator, attrs, checker, messages) returning (score, out_of)
+    """
+    if rule is None:
+        return _required(name)
+    if "vocabulary" in rule:
+        return _vocabulary(name, rule["vocabulary"], rule["message"])
+    if "values" in rule:
+        return _values(name, rule["values"], rule["message"])
+    raise ValueError(f"Unknown rule for global attribute {name}: {rule}")
+
+
+class GlobalAttributeValidator:
+    """
+    A global attribute schema compiled into a validator.
+
+    :param dict schema: Attribute names to their rules, see
+                        `cc_plugin_glider.required_global_attrs`
+    """
+
+    def __init__(self, schema):
+        self.attributes = tuple(schema)
+        self._rules = tuple(
+            compile_rule(name, rule) for name, rule in schema.items()
+        )
+        self._vocabularies = {}
+
+    def vocabulary(self, checker, table_name):
+        """
+        Returns the lowercased values of one of a checker's authority tables,
+        computed again only when the table is replaced
+        """
+        table = checker.auth_tables[table_name]
+        if table is None:
+            raise RuntimeError(f"Was unable to fetch {table_name} table")
+        cached = self._vocabularies.get(table_name)
+        if cached is None or cached[0] is not table:
+            cached = self._vocabularies[table_name] = (
+                table,
+                frozenset(str(value).lower() for value in table),
+            )
+        return cached[1]
+
+    def validate(self, dataset, checker):
+        """
+        Checks a dataset's global attributes against the schema
+
+        :return: A (score, out_of, messages) tuple
+        """
+        attrs = {name: dataset.getncattr(name) for name in dataset.ncattrs()}
+        score = 0
+        out_of = 0
+        messages = []
+        for rule in self._rules:
+            rule_score, rule_out_of = rule(self, attrs, checker, messages)
+            score += rule_score
+            out_of += rule_out_of
+        return score, out_of, messages
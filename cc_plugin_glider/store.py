@@ -0,0 +1,359 @@
+"""
+cc_plugin_glider/store.py
+
+Compact storage of check results for large batch runs.
+
+Holding the Result objects of tens of thousands of files keeps millions of
+small objects and repeated message strings alive.  A ResultStore keeps each
+result as a row of typed arrays instead: check and result names are
+interned, and messages formatted from `cc_plugin_glider.templates` are
+stored as their interned template ID and argument names, plus the argument
+values as interned parameters.  Most messages differ between files only in
+their arguments, so each template is stored once.  Other messages, e.g.
+those of the CF checks, are interned whole.  Results and NDJSON records are
+rebuilt only when asked for, with messages formatted again from their
+templates.
+"""
+
+import sys
+from array import array
+
+from compliance_checker.base import Result
+
+from cc_plugin_glider import ndjson, templates
+
+# how a Result's value was given, so it can be rebuilt as it was
+_INT_TUPLE, _FLOAT_TUPLE, _TRUE, _FALSE, _NONE, _OTHER = range(6)
+
+
+def split_message(message):
+    """
+    Splits a message into its template, a (template ID, argument names)
+    tuple, and a tuple of its argument values.  Messages which weren't
+    formatted from a template are returned as (None, message) with no
+    arguments.
+    """
+    template_id = templates.get_template_id(message)
+    arguments = getattr(message, "arguments", None)
+    if template_id is None or arguments is None:
+        return (None, str(message)), ()
+    return (template_id, tuple(arguments)), tuple(arguments.values())
+
+
+def join_message(template, parameters):
+    """
+    Rebuilds a message split by `split_message`
+    """
+    template_id, names = template
+    if template_id is None:
+        return names
+    return templates.format_message(
+        template_id, **dict(zip(names, parameters))
+    )
+
+
+class InternTable:
+    """
+    Assigns each distinct value a small integer id
+    """
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def id(self, value):
+        # keyed by type too, so 1, 1.0 and True are told apart
+        key = (type(value), value)
+        try:
+            value_id = self.ids.get(key)
+        except TypeError:
+            # unhashable values, e.g. lists, are kept without interning
+            self.values.append(value)
+            return len(self.values) - 1
+        if value_id is None:
+            value_id = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def __getitem__(self, value_id):
+        return self.values[value_id]
+
+    def __len__(self):
+        return len(self.values)
+
+    def nbytes(self):
+        def size(value):
+            if isinstance(value, tuple):
+                return sys.getsizeof(value) + sum(map(sys.getsizeof, value))
+            return sys.getsizeof(value)
+
+        return (
+            sys.getsizeof(self.values)
+            + sys.getsizeof(self.ids)
+            + sum(map(size, self.values))
+        )
+
+
+def _value_kind(value):
+    if value is True:
+        return _TRUE
+    if value is False:
+        return _FALSE
+    if value is None:
+        return _NONE
+    if isinstance(value, tuple) and len(value) == 2:
+        if all(isinstance(part, int) for part in value):
+            return _INT_TUPLE
+        if all(isinstance(part, (int, float)) for part in value):
+            return _FLOAT_TUPLE
+    return _OTHER
+
+
+class ResultStore:
+    """
+    An append-only, array-backed store of the results of many files.
+
+    ``store.add(name, results, errors)`` takes the output of
+    `api.run_checks`, or of `api.validate_batch`, and `results`, `record`
+    and `scores` rebuild a file's results on demand.
+    """
+
+    def __init__(self):
+        self.sources = []
+        self.names = InternTable()
+        self.templates = InternTable()
+        self.parameters = InternTable()
+        # per file: index of its first result row
+        self._file_start = array("q")
+        # per result row
+        self._check = array("i")
+        self._name = array("i")
+        self._variable = array("i")
+        self._weight = array("b")
+        self._kind = array("b")
+        self._score = array("d")
+        self._out_of = array("d")
+        self._message_start = array("q")
+        # per message
+        self._template = array("i")
+        self._parameter_start = array("q")
+        # per parameter
+        self._parameter = array("i")
+        # rarely used: row -> (value, children), file -> {check: error}
+        self._extra = {}
+        self._errors = {}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def add(self, source, results, errors=None):
+        """
+        Stores the results of one file.
+
+        :param source: The file's name
+        :param results: List of Results
+        :param errors: Dictionary of check method name to an (exception,
+                       traceback) tuple or an error message
+        :return: The index of the file in the store
+        """
+        index = len(self.sources)
+        self.sources.append(source)
+        self._file_start.append(len(self._check))
+        for result in results:
+            self._add_result(result)
+        if errors:
+            self._errors[index] = {
+                self.names.id(check_name): (
+                    error
+                    if isinstance(error, str)
+                    else ndjson._error_message(error)
+                )
+                for check_name, error in errors.items()
+            }
+        return index
+
+    def _add_result(self, result):
+        row = len(self._check)
+        check_method = getattr(result, "check_method", None)
+        check_name = getattr(check_method, "__name__", None)
+        self._check.append(
+            -1 if check_name is None else self.names.id(check_name),
+        )
+        self._name.append(self.names.id(result.name))
+        variable_name = getattr(result, "variable_name", None)
+        self._variable.append(
+            -1 if variable_name is None else self.names.id(variable_name),
+        )
+        self._weight.append(result.weight)
+        kind = _value_kind(result.value)
+        self._kind.append(kind)
+        score, out_of = ndjson.result_value(result)
+        self._score.append(score)
+        self._out_of.append(out_of)
+        if kind == _OTHER or result.children:
+            self._extra[row] = (result.value, result.children)
+
+        self._message_start.append(len(self._template))
+        for message in result.msgs or ():
+            template, parameters = split_message(message)
+            self._template.append(self.templates.id(template))
+            self._parameter_start.append(len(self._parameter))
+            for parameter in parameters:
+                self._parameter.append(self.parameters.id(parameter))
+
+    def _rows(self, index):
+        start = self._file_start[index]
+        end = (
+            self._file_start[index + 1]
+            if index + 1 < len(self._file_start)
+            else len(self._check)
+        )
+        return range(start, end)
+
+    def _messages(self, row):
+        start = self._message_start[row]
+        end = (
+            self._message_start[row + 1]
+            if row + 1 < len(self._message_start)
+            else len(self._template)
+        )
+        messages = []
+        for message in range(start, end):
+            parameter_start = self._parameter_start[message]
+            parameter_end = (
+                self._parameter_start[message + 1]
+                if message + 1 < len(self._parameter_start)
+                else len(self._parameter)
+            )
+            messages.append(
+                join_message(
+                    self.templates[self._template[message]],
+                    [
+                        self.parameters[self._parameter[parameter]]
+                        for parameter in range(parameter_start, parameter_end)
+                    ],
+                ),
+            )
+        return messages
+
+    def _value(self, row):
+        kind = self._kind[row]
+        if kind == _INT_TUPLE:
+            return (int(self._score[row]), int(self._out_of[row]))
+        if kind == _FLOAT_TUPLE:
+            return (self._score[row], self._out_of[row])
+        if kind == _OTHER:
+            return self._extra[row][0]
+        return {_TRUE: True, _FALSE: False, _NONE: None}[kind]
+
+    def check_name(self, row):
+        check = self._check[row]
+        return None if check < 0 else self.names[check]
+
+    def results(self, index):
+        """
+        Rebuilds the Results of a file.  The check methods themselves aren't
+        kept, see `record` for the check method names.
+        """
+        results = []
+        for row in self._rows(index):
+            variable = self._variable[row]
+            extra = self._extra.get(row)
+            results.append(
+                Result(
+                    self._weight[row],
+                    self._value(row),
+                    self.names[self._name[row]],
+                    self._messages(row),
+                    extra[1] if extra is not None else None,
+                    variable_name=(
+                        None if variable < 0 else self.names[variable]
+                    ),
+                ),
+            )
+        return results
+
+    def errors(self, index):
+        """
+        Returns a file's errors as a dictionary of check method name to
+        error message
+        """
+        return {
+            self.names[check]: message
+            for check, message in self._errors.get(index, {}).items()
+        }
+
+    def scores(self, index):
+        """
+        Returns a file's total (score, out_of) without rebuilding results
+        """
+        rows = self._rows(index)
+        return (
+            sum(self._score[rows.start : rows.stop]),
+            sum(self._out_of[rows.start : rows.stop]),
+        )
+
+    def record(self, index):
+        """
+        Rebuilds a file's record in the same form as `ndjson.file_record`
+        """
+        records = []
+        for row in self._rows(index):
+            score, out_of = ndjson.result_value(
+                Result(value=self._value(row)),
+            )
+            records.append(
+                {
+                    "check": self.check_name(row),
+                    "name": self.names[self._name[row]],
+                    "weight": self._weight[row],
+                    "score": score,
+                    "out_of": out_of,
+                    "msgs": self._messages(row),
+                },
+            )
+        return {
+            "source": self.sources[index],
+            "scored_points": sum(record["score"] for record in records),
+            "possible_points": sum(record["out_of"] for record in records),
+            "results": records,
+            "errors": self.errors(index),
+        }
+
+    def iter_records(self):
+        """
+        Yields the record of each file in the order they were added
+        """
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def nbytes(self):
+        """
+        Returns the approximate memory used by the store, in bytes
+        """
+        arrays = (
+            self._file_start,
+            self._check,
+            self._name,
+            self._variable,
+            self._weight,
+            self._kind,
+            self._score,
+            self._out_of,
+            self._message_start,
+            self._template,
+            self._parameter_start,
+            self._parameter,
+        )
+        return (
+            sum(a.buffer_info()[1] * a.itemsize for a in arrays)
+            + self.names.nbytes()
+            + self.templates.nbytes()
+            + self.parameters.nbytes()
+            + sys.getsizeof(self.sources)
+            + sum(map(sys.getsizeof, self.sources))
+            + sys.getsizeof(self._extra)
+            + sys.getsizeof(self._errors)
+        )
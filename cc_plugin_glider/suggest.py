@@ -0,0 +1,130 @@
+"""
+cc_plugin_glider/suggest.py
+
+Near-match suggestions for values missing from an authority table.
+
+Each table is indexed once by the trigrams of its entries, in the style of
+PostgreSQL's pg_trgm: entries are lowercased, split into words, and each
+word is padded with two leading spaces and one trailing space before being
+split into three character grams.  Single letter words such as the "N" and
+"A" of "N/A" are left out, they match too much to be useful.
+
+A query only touches the postings of its own trigrams, so suggestions from
+tables of thousands of entries take tens of microseconds.  Similarity is the
+mean of the cosine similarity of the two trigram sets and the fraction of the
+query's trigrams found in the entry, so that a shortened form of a long
+official name, e.g. "Rutgers University" for "Rutgers University Center for
+Ocean Observing Leadership", ranks that name first.
+"""
+
+import re
+
+import numpy as np
+
+_WORD = re.compile(r"[^\W_]+")
+# minimum similarity of a suggestion
+DEFAULT_THRESHOLD = 0.5
+
+
+def trigrams(text):
+    """
+    Returns the set of trigrams of a string
+    """
+    grams = set()
+    for word in _WORD.findall(str(text).lower()):
+        if len(word) < 2:
+            continue
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(query, entry):
+    """
+    Returns the trigram similarity of a query to an entry, from 0 to 1
+    """
+    query_grams = trigrams(query)
+    entry_grams = trigrams(entry)
+    return float(
+        _score(
+            len(query_grams & entry_grams),
+            len(query_grams),
+            len(entry_grams),
+        ),
+    )
+
+
+def _score(shared, query_size, entry_size):
+    """
+    Mean of the cosine similarity and the fraction of the query's trigrams
+    shared with an entry
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = (
+            shared / np.sqrt(query_size * entry_size) + shared / query_size
+        ) / 2
+    return np.nan_to_num(score)
+
+
+class TrigramIndex:
+    """
+    An inverted index from trigrams to the entries of an authority table.
+
+    :param entries: The valid values, e.g. an authority table
+    """
+
+    def __init__(self, entries):
+        self.entries = sorted({str(entry) for entry in entries})
+        postings = {}
+        sizes = np.empty(len(self.entries), dtype=np.int32)
+        for position, entry in enumerate(self.entries):
+            grams = trigrams(entry)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self._postings = {
+            gram: np.array(positions, dtype=np.int32)
+            for gram, positions in postings.items()
+        }
+        self._sizes = sizes
+
+    def __len__(self):
+        return len(self.entries)
+
+    def suggest(self, value, limit=3, threshold=DEFAULT_THRESHOLD):
+        """
+        Returns up to `limit` entries most similar to `value`, most similar
+        first, leaving out entries less similar than `threshold`
+        """
+        grams = trigrams(value)
+        postings = [
+            self._postings[gram] for gram in grams if gram in self._postings
+        ]
+        if not postings or limit < 1:
+            return []
+        shared = np.bincount(
+            np.concatenate(postings),
+            minlength=len(self.entries),
+        )
+        scores = _score(shared, len(grams), self._sizes)
+        candidates = np.flatnonzero(scores >= threshold)
+        if candidates.size > limit:
+            # keep the best candidates before sorting them
+            best = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            cutoff = scores[candidates[best]].min()
+            candidates = candidates[scores[candidates] >= cutoff]
+        # most similar first, alphabetically between equally similar entries
+        ordered = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [self.entries[position] for position in ordered[:limit]]
+
+
+def describe(matches):
+    """
+    Returns a sentence listing suggestions, to append to a failure message,
+    or an empty string when there are none
+    """
+    if not matches:
+        return ""
+    return ". Possible close matches: {}".format(
+        ", ".join(f"'{match}'" for match in matches),
+    )
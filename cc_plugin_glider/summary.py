@@ -0,0 +1,277 @@
+"""
+cc_plugin_glider/summary.py
+
+Per-file summaries of checked files, kept in a deployment index.
+
+A summary holds what deployment-wide tooling needs from each file without
+opening it again: its trajectory, time range, bounding box, profile_id
+range and whether it passed the checks, along with the file's size and
+modification time, so that re-validation can skip files which haven't
+changed.  Summaries are upserted into a single SQLite index, which any
+number of worker threads or processes can write to and which cross-file
+checks can query instead of reopening thousands of files:
+
+    with SummaryIndex("deployment.sqlite") as index:
+        index.execute(
+            "SELECT trajectory, min(time_min), max(time_max) FROM files "
+            "GROUP BY trajectory"
+        )
+
+The checker writes summaries while validating when given
+``-O gliderdac:summary_index:<path>``, see `api.run_checks`.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from compliance_checker.base import BaseCheck
+
+from cc_plugin_glider import __version__, ndjson, util
+
+# summary fields and their SQLite column types, in column order
+FIELDS = {
+    "source": "TEXT PRIMARY KEY",
+    "size": "INTEGER",
+    "mtime_ns": "INTEGER",
+    "trajectory": "TEXT",
+    "records": "INTEGER",
+    "time_min": "REAL",
+    "time_max": "REAL",
+    "lat_min": "REAL",
+    "lat_max": "REAL",
+    "lon_min": "REAL",
+    "lon_max": "REAL",
+    "profile_id_min": "REAL",
+    "profile_id_max": "REAL",
+    "scored_points": "REAL",
+    "possible_points": "REAL",
+    "failed_checks": "INTEGER",
+    "errors": "INTEGER",
+    "passed": "INTEGER",
+    "format_version": "TEXT",
+    "checker_version": "TEXT",
+    "table_version": "TEXT",
+    "checked_at": "REAL",
+}
+# times in the index, whatever the units of the files
+TIME_UNITS = "seconds since 1970-01-01T00:00:00Z"
+
+
+def value_range(variable, memory_budget=util.DEFAULT_MEMORY_BUDGET):
+    """
+    Returns the (min, max) of a variable's valid values as floats, read in
+    blocks within a memory budget, or (None, None) if it has none
+    """
+    low = high = None
+    for block in util.iter_blocks(
+        variable,
+        util.block_elements(np.float64, memory_budget),
+    ):
+        block = np.ma.masked_invalid(np.ma.asarray(block, dtype=np.float64))
+        if not block.count():
+            continue
+        block_low, block_high = float(block.min()), float(block.max())
+        low = block_low if low is None else min(low, block_low)
+        high = block_high if high is None else max(high, block_high)
+    return low, high
+
+
+def trajectory_name(dataset):
+    """
+    Returns the trajectory of a dataset as a string, or None if it has none
+    """
+    variable = dataset.variables.get("trajectory")
+    if variable is None:
+        return None
+    value = variable[...]
+    if isinstance(value, str):
+        return value.strip() or None
+    value = np.ma.filled(np.atleast_1d(value), b"")
+    if value.dtype.kind == "S":
+        value = b"".join(value.ravel().tolist()).decode("utf-8", "replace")
+    else:
+        value = "".join(map(str, value.ravel().tolist()))
+    return value.strip("\x00 ") or None
+
+
+def file_summary(
+    dataset,
+    results,
+    errors,
+    source=None,
+    checker=None,
+):
+    """
+    Returns the summary of a checked dataset.
+
+    :param dataset: The open dataset
+    :param results: Its Results, from `api.run_checks`
+    :param errors: Its errors, from `api.run_checks`
+    :param source: The path the dataset was opened from
+    :param checker: The GliderCheck which checked it
+    :rtype: dict
+    """
+    memory_budget = getattr(checker, "memory_budget", None)
+    memory_budget = memory_budget or util.DEFAULT_MEMORY_BUDGET
+    summary = dict.fromkeys(FIELDS)
+    summary["source"] = (
+        os.path.abspath(source) if source is not None else dataset.filepath()
+    )
+    try:
+        stat = os.stat(summary["source"])
+    except OSError:
+        pass
+    else:
+        summary["size"] = stat.st_size
+        summary["mtime_ns"] = stat.st_mtime_ns
+    summary["trajectory"] = trajectory_name(dataset)
+
+    variables = dataset.variables
+    if "time" in variables:
+        time_var = variables["time"]
+        summary["records"] = int(time_var.shape[0]) if time_var.shape else 1
+        time_min, time_max = value_range(time_var, memory_budget)
+        conversion = util.time_conversion(
+            getattr(time_var, "units", None),
+            TIME_UNITS,
+            getattr(time_var, "calendar", "standard"),
+        )
+        if conversion is not None and time_min is not None:
+            scale, offset = conversion
+            summary["time_min"] = time_min * scale + offset
+            summary["time_max"] = time_max * scale + offset
+    for var_name in ("lat", "lon", "profile_id"):
+        if var_name in variables:
+            (
+                summary[f"{var_name}_min"],
+                summary[f"{var_name}_max"],
+            ) = value_range(variables[var_name], memory_budget)
+
+    scored_points = possible_points = 0
+    failed_checks = 0
+    passed = not errors
+    for result in results:
+        score, out_of = ndjson.result_value(result)
+        scored_points += score
+        possible_points += out_of
+        if score < out_of:
+            failed_checks += 1
+            # only failures of the high priority checks fail a file
+            if result.weight == BaseCheck.HIGH:
+                passed = False
+    summary["scored_points"] = scored_points
+    summary["possible_points"] = possible_points
+    summary["failed_checks"] = failed_checks
+    summary["errors"] = len(errors)
+    summary["passed"] = passed
+    if "format_version" in dataset.ncattrs():
+        summary["format_version"] = str(dataset.getncattr("format_version"))
+    summary["checker_version"] = __version__
+    summary["table_version"] = getattr(checker, "table_version", None)
+    summary["checked_at"] = time.time()
+    return summary
+
+
+class SummaryIndex:
+    """
+    A SQLite index of file summaries, one row per file in the ``files``
+    table, keyed by the file's absolute path.
+
+    :param path: The index file, created if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        # shared by the threads of a worker pool behind the lock, and with
+        # other processes through SQLite's own locking
+        self.connection = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,
+        )
+        self.connection.row_factory = sqlite3.Row
+        with self._lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(
+                f"{name} {column_type}" for name, column_type in FIELDS.items()
+            )
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS files ({columns})",
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.execute("SELECT count(*) FROM files")[0][0]
+
+    def __iter__(self):
+        return iter(
+            [dict(row) for row in self.execute("SELECT * FROM files")],
+        )
+
+    def execute(self, sql, parameters=()):
+        """
+        Runs a query against the index and returns its rows
+        """
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def add(self, summary):
+        """
+        Adds a file's summary, replacing any earlier one of the same file
+        """
+        summary = {**summary, "source": os.path.abspath(summary["source"])}
+        with self._lock, self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(FIELDS))})",
+                [summary.get(name) for name in FIELDS],
+            )
+
+    def get(self, source):
+        """
+        Returns the summary of a file as a dict, or None if it has none
+        """
+        rows = self.execute(
+            "SELECT * FROM files WHERE source = ?",
+            (os.path.abspath(source),),
+        )
+        if not rows:
+            return None
+        summary = dict(rows[0])
+        summary["passed"] = bool(summary["passed"])
+        return summary
+
+    def is_current(self, source, checker=None):
+        """
+        Returns True if a file is unchanged since its summary was written,
+        and was checked with the same checker version and, if a checker is
+        given, the same authority tables
+        """
+        summary = self.get(source)
+        if summary is None or summary["checker_version"] != __version__:
+            return False
+        if checker is not None and (
+            summary["table_version"] != checker.table_version
+        ):
+            return False
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False
+        return (summary["size"], summary["mtime_ns"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
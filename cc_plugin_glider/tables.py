@@ -0,0 +1,478 @@
+"""
+cc_plugin_glider/tables.py
+
+Providers of the resources the authority tables are parsed from.
+
+A provider returns the raw bytes of a named resource: ``ncei_iso``, the NCEI
+ISO metadata record holding the institution, project, platform and
+instrument thesauri, and ``sea_name``, the NCEI sea names table.  The
+checker only parses what its provider returns, so where the tables come
+from is chosen independently of the checks:
+
+ - `HTTPProvider` fetches them through one pooled ``requests.Session``, with
+   retries and exponential backoff, reusing connections across reloads and
+   revalidating unchanged resources with conditional requests
+ - `FileProvider` reads them from local files, falling back to another
+   provider for those it has no file for
+ - `MemoryProvider` serves them from memory, for tests and benchmarks
+ - `SnapshotProvider` keeps a copy of whatever another provider last
+   returned and serves it when that provider fails
+
+`make_provider` builds the default chain from the checker options and
+environment variables, see the README.  `TableRefresher` reloads a
+checker's tables periodically on a background thread.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import warnings
+from io import BytesIO
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cc_plugin_glider import util
+
+URLS = {
+    "ncei_iso": "https://www.ncei.noaa.gov/access/metadata/landing-page/bin/iso?id=gov.noaa.nodc:IOOS-NGDAC;view=xml;responseType=text/xml",
+    "sea_name": "https://www.ncei.noaa.gov/data/oceans/ncei/vocabulary/seanames.xml",
+}
+# environment variables holding the path of a local copy of each resource
+ENVIRONMENT_PATHS = {
+    "ncei_iso": "NCEI_ISO_TABLE",
+    "sea_name": "SEA_NAME_TABLE",
+}
+# titles of the thesauri in the NCEI ISO record, by authority table name
+ISO_THESAURI = {
+    "project": "NODC PROJECT NAMES THESAURUS",
+    "platform": "NODC PLATFORM NAMES THESAURUS",
+    "instrument": "Provider Instruments",
+    "institution": "NODC COLLECTING INSTITUTION NAMES THESAURUS",
+}
+_ISO_XPATH = ".//gmd:MD_Keywords[gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString/text()='{}']/gmd:keyword/{}/text()"
+_ISO_NAMESPACES = {
+    "gco": "http://www.isotc211.org/2005/gco",
+    "gmd": "http://www.isotc211.org/2005/gmd",
+    "gmx": "http://www.isotc211.org/2005/gmx",
+}
+
+
+class TableProvider:
+    """
+    Base class of the authority table providers
+    """
+
+    def fetch(self, name, url=None):
+        """
+        Returns the bytes of a resource.
+
+        :param str name: The resource's name, e.g. ``sea_name``
+        :param str url: Where the resource usually lives, defaults to its
+                        entry in URLS
+        :raises LookupError: if the provider has no such resource
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Releases any connections the provider holds
+        """
+
+
+class HTTPProvider(TableProvider):
+    """
+    Fetches resources over HTTP through a pooled session.
+
+    :param dict urls: Resource names to the URLs to fetch them from instead
+                      of the usual ones, e.g. a local stand-in server
+    :param session: A ``requests.Session`` to use, by default a new one
+                    which retries failed requests
+    :param int retries: Times a failed request is retried
+    :param float backoff_factor: Seconds before the first retry, doubling
+                                 before each further one
+    :param float timeout: Seconds to wait for the server
+    """
+
+    def __init__(
+        self,
+        urls=None,
+        session=None,
+        retries=3,
+        backoff_factor=0.5,
+        timeout=10,
+    ):
+        self.urls = dict(urls or {})
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                max_retries=Retry(
+                    total=retries,
+                    backoff_factor=backoff_factor,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET",),
+                ),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        # url -> (ETag, Last-Modified, content) of the last response
+        self._validators = {}
+
+    def fetch(self, name, url=None):
+        url = self.urls.get(name) or url or URLS[name]
+        headers = {}
+        cached = self._validators.get(url)
+        if cached is not None:
+            etag, last_modified, content = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        resp = self.session.get(
+            url,
+            headers=headers,
+            allow_redirects=True,
+            timeout=self.timeout,
+        )
+        if cached is not None and resp.status_code == 304:
+            return cached[2]
+        resp.raise_for_status()
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._validators[url] = (etag, last_modified, resp.content)
+        return resp.content
+
+    def close(self):
+        self.session.close()
+
+
+class FileProvider(TableProvider):
+    """
+    Reads resources from local files.
+
+    :param dict paths: Resource names to file paths
+    :param fallback: Provider of the resources without a readable file
+    """
+
+    def __init__(self, paths, fallback=None):
+        self.paths = {name: path for name, path in paths.items() if path}
+        self.fallback = fallback
+
+    def fetch(self, name, url=None):
+        path = self.paths.get(name)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                if self.fallback is None:
+                    raise
+                warnings.warn(
+                    f"Could not open {path}, falling back to web request",
+                    stacklevel=2,
+                )
+        if self.fallback is None:
+            raise LookupError(f"No file for the {name} table")
+        return self.fallback.fetch(name, url)
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+class MemoryProvider(TableProvider):
+    """
+    Serves resources from memory.
+
+    :param dict resources: Resource names to their bytes or text
+    """
+
+    def __init__(self, resources):
+        self.resources = {
+            name: content.encode("utf-8")
+            if isinstance(content, str)
+            else bytes(content)
+            for name, content in resources.items()
+        }
+
+    def fetch(self, name, url=None):
+        try:
+            return self.resources[name]
+        except KeyError:
+            raise LookupError(f"No {name} table in memory") from None
+
+
+class SnapshotProvider(TableProvider):
+    """
+    Keeps a snapshot on disk of each resource another provider returns, and
+    serves the snapshot when that provider fails.
+
+    :param provider: The provider of fresh copies
+    :param directory: Where the snapshots are kept
+    :param float max_age: If given, snapshots younger than this many seconds
+                          are served without asking the provider
+    """
+
+    def __init__(self, provider, directory, max_age=None):
+        self.provider = provider
+        self.directory = os.fspath(directory)
+        self.max_age = max_age
+
+    def snapshot_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read(self, name):
+        with open(self.snapshot_path(name), "rb") as f:
+            return f.read()
+
+    def _write(self, name, content):
+        os.makedirs(self.directory, exist_ok=True)
+        # written to a temporary file and renamed, so concurrent readers
+        # never see a partial snapshot
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, self.snapshot_path(name))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def fetch(self, name, url=None):
+        if self.max_age is not None:
+            try:
+                age = time.time() - os.path.getmtime(self.snapshot_path(name))
+            except OSError:
+                age = None
+            if age is not None and age < self.max_age:
+                return self._read(name)
+        try:
+            content = self.provider.fetch(name, url)
+        except Exception as e:
+            try:
+                content = self._read(name)
+            except OSError:
+                raise e from None
+            warnings.warn(
+                f"Could not fetch the {name} table ({e}), using the snapshot "
+                f"in {self.directory}",
+                stacklevel=2,
+            )
+            return content
+        try:
+            self._write(name, content)
+        except OSError as e:
+            warnings.warn(
+                f"Could not save a snapshot of the {name} table: {e}",
+                stacklevel=2,
+            )
+        return content
+
+    def close(self):
+        self.provider.close()
+
+
+def make_provider(options=None, environ=None):
+    """
+    Returns the provider chosen by the checker options and environment.
+
+    Resources with a file named in their environment variable, see
+    ENVIRONMENT_PATHS, are read from it.  The others are fetched over HTTP,
+    through a snapshot directory if ``-O gliderdac:table_cache:<dir>`` or
+    the ``GLIDER_TABLE_CACHE`` environment variable names one.
+    ``-O gliderdac:table_max_age:<seconds>`` serves snapshots younger than
+    that without fetching.
+    """
+    environ = os.environ if environ is None else environ
+    provider = HTTPProvider()
+    table_cache = util._get_option("table_cache", options)
+    directory = table_cache[0] if table_cache else None
+    directory = directory or environ.get("GLIDER_TABLE_CACHE")
+    if directory:
+        max_age = util._get_option("table_max_age", options)
+        provider = SnapshotProvider(
+            provider,
+            directory,
+            float(max_age[0]) if max_age else None,
+        )
+    return FileProvider(
+        {
+            name: environ.get(variable)
+            for name, variable in ENVIRONMENT_PATHS.items()
+        },
+        provider,
+    )
+
+
+def parse_iso(content):
+    """
+    Returns the institution, project, platform and instrument tables held
+    in the NCEI ISO metadata record
+    """
+    tree = etree.parse(BytesIO(content))
+    tables = {}
+    for table_name, title in ISO_THESAURI.items():
+        text_elem = (
+            "gco:CharacterString"
+            if table_name == "instrument"
+            else "gmx:Anchor"
+        )
+        tables[table_name] = tree.xpath(
+            _ISO_XPATH.format(title, text_elem),
+            namespaces=_ISO_NAMESPACES,
+        )
+    return tables
+
+
+def parse_sea_names(content):
+    """
+    Returns the set of names in the NCEI sea names table
+    """
+    utf8_parser = etree.XMLParser(encoding="utf-8")
+    tree = etree.fromstring(content, parser=utf8_parser)
+    return set(tree.xpath("./seaname/seaname/text()"))
+
+
+def load_resource(provider, name, parse, url=None):
+    """
+    Fetches and parses one resource, warning and returning None if either
+    fails
+    """
+    try:
+        content = provider.fetch(name, url)
+    except Exception as e:
+        warnings.warn(
+            f"Could not fetch the {name} table from "
+            f"{url or URLS.get(name, name)}: {e}",
+            stacklevel=2,
+        )
+        return None
+    try:
+        return parse(content)
+    except Exception as e:
+        warnings.warn(
+            f"Could not deserialize input text: {str(e)}",
+            stacklevel=2,
+        )
+        return None
+
+
+def freeze(tables):
+    """
+    Returns a dict of authority tables with each table made immutable, so
+    that tables can be shared between threads and swapped as a whole
+    """
+    return {
+        name: None
+        if table is None
+        else frozenset(table)
+        if isinstance(table, (set, frozenset))
+        else tuple(table)
+        for name, table in tables.items()
+    }
+
+
+def load_tables(provider):
+    """
+    Returns the authority tables, by name, loaded through a provider.  A sea
+    names table which can't be loaded is None, with a warning, while a
+    failure to load the NCEI ISO record is raised.
+    """
+    tables = parse_iso(provider.fetch("ncei_iso"))
+    tables["sea_name"] = load_resource(provider, "sea_name", parse_sea_names)
+    return freeze(tables)
+
+
+class TableRefresher:
+    """
+    Reloads a checker's authority tables every `interval` seconds on a
+    background thread.  Checks keep using the tables they started with, and
+    new tables are swapped in whole once loaded, so a check never waits for
+    a fetch.  A failed reload keeps the current tables.
+
+    :param checker: The GliderCheck whose tables are refreshed
+    :param float interval: Seconds between reloads
+    :param on_refresh: Optional callable called with the `status` after
+                       each background reload, e.g. to report it to the
+                       process monitoring the checker
+    """
+
+    def __init__(self, checker, interval, on_refresh=None):
+        self.checker = checker
+        self.interval = interval
+        self.on_refresh = on_refresh
+        self.last_attempt = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def refresh(self):
+        """
+        Reloads the tables now
+
+        :return: Whether the tables changed
+        """
+        self.last_attempt = time.time()
+        try:
+            changed = self.checker.reload_tables()
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            warnings.warn(
+                f"Could not refresh the authority tables: {self.last_error}",
+                stacklevel=2,
+            )
+            return False
+        self.last_error = None
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+            if self.on_refresh is not None:
+                self.on_refresh(self.status())
+
+    def start(self):
+        """
+        Starts refreshing in the background
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="table-refresher",
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stops refreshing, waiting for a reload in progress to finish
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self):
+        """
+        Returns the checker's table version and age, and the outcome of the
+        last reload, for monitoring
+        """
+        return {
+            **self.checker.table_status(),
+            "last_attempt": self.last_attempt,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,200 @@
+"""
+cc_plugin_glider/templates.py
+
+Message templates for the check results.
+
+Checks refer to their messages by template ID and pass the arguments, and a
+message is only formatted when its assertion fails.  Passing assertions, by
+far the common case on files with hundreds of variables, format nothing.
+Formatted messages are still strings, as compliance-checker expects, but
+keep their template ID and arguments, see `Message`.
+"""
+
+TEMPLATES = {
+    # required variables, dimensions and variable attributes
+    "variable_missing": "Variable {var_name} is missing",
+    "dimension_missing": "{dimension} is not a valid dimension",
+    "attribute_missing": "Variable {var_name} must contain attribute: {attr}",
+    "units_not_convertible": (
+        "Variable {var_name} units attribute must be convertible to {units}"
+    ),
+    "attribute_value": "Variable {var_name} attribute {attr} must be {value}",
+    "attribute_empty": "Variable {var_name} attribute {attr} is empty",
+    "dtype": (
+        "Variable {var_name} is expected to have a dtype of {expected}, "
+        "instead has a dtype of {dtype}"
+    ),
+    "fill_value_dtype": (
+        "Variable {var_name} _FillValue dtype does not match variable dtype"
+    ),
+    "trajectory_dimension": "trajectory has an invalid dimension",
+    "ancillary_variable_missing": (
+        "Invalid ancillary_variables attribute for {var_name}, {ancillary} "
+        "is not a variable"
+    ),
+    "valid_min_dtype": (
+        "{var_name}:valid_min has a different data type, {attr_dtype}, than "
+        "variable {var_name}, {dtype}"
+    ),
+    "valid_max_dtype": (
+        "{var_name}:valid_max has a different data type, {attr_dtype}, than "
+        "variable {dtype} {var_name}"
+    ),
+    # global attributes
+    "global_attribute_missing": "Attr {attr} not present",
+    "global_attribute_empty": "Attr {attr} is empty",
+    "sea_name_invalid": (
+        "sea_name attribute should be from the NODC sea names list: {value} "
+        "is not a valid sea name{suggestions}"
+    ),
+    "platform_type_invalid": (
+        "platform_type {value} is not one of the NCEI accepted platforms for "
+        "archiving: {accepted}"
+    ),
+    "ioos_ra_missing": (
+        "ioos_regional_association global attribute should be defined"
+    ),
+    # longitude valid range
+    "lon_valid_min_missing": (
+        "valid_min attribute for longitude should be defined"
+    ),
+    "lon_valid_max_missing": (
+        "valid_max attribute for longitude should be defined"
+    ),
+    "lon_latitude_range": (
+        "Longitude's valid_min and valid_max are [-90, 90], it's likely this "
+        "was a mistake"
+    ),
+    # QARTOD flag variables, see glider_dac.QARTOD_RULES
+    "qartod_valid_min_missing": (
+        "valid_min attribute for longitude should be defined"
+    ),
+    "qartod_valid_min_byte": (
+        "attribute {qartod_var}:valid_min must be of type byte"
+    ),
+    "qartod_valid_max_missing": (
+        "valid_max attribute for longitude should be defined"
+    ),
+    "qartod_valid_max_byte": (
+        "attribute {qartod_var}:valid_max must be of type byte"
+    ),
+    "qartod_fill_value": "variable {qartod_var} must have a _FillValue of 9b",
+    "qartod_long_name": (
+        "attribute {qartod_var}:long_name must be a non-empty string"
+    ),
+    "qartod_flag_meanings": (
+        "attribute {qartod_var}:flag_meanings must be a non-empty string"
+    ),
+    "qartod_flag_values": (
+        "attribute {qartod_var}:flag_values must be defined as an array of "
+        "bytes"
+    ),
+    "qartod_flag_values_byte": (
+        "attribute {qartod_var}:flag_values has an illegal data-type, must "
+        "be byte"
+    ),
+    # data checks
+    "time_not_increasing": "Time variable is not monotonically increasing",
+    "time_depth_no_data": (
+        "Time and depth variables must have at least two valid data points "
+        "together"
+    ),
+    "depth_invalid": "Depth array must be valid, ie  abs(Z0 - Zend) > 0",
+    "positions_out_of_range": (
+        "{lat_name}/{lon_name} have {count} positions outside latitude [-90, 90] or "
+        "longitude [-180, 180]"
+    ),
+    "positions_null_island": "{lat_name}/{lon_name} have {count} positions at (0, 0)",
+    "positions_too_fast": (
+        "{lat_name}/{lon_name} imply {count} speeds above {max_speed} m/s between "
+        "consecutive fixes, up to {fastest:.1f} m/s, first reaching index "
+        "{index}"
+    ),
+    "invalid_flag_values": (
+        "Variable {var_name} has {count} values which are not in flag_values "
+        "or _FillValue: {counts}"
+    ),
+    "invalid_flag_value_count": "{value} ({count} times)",
+    "more_invalid_flag_values": " and {count} more",
+    "outside_valid_range": (
+        "Variable {var_name} has {count} values outside its valid range "
+        "({counts}), first at indices {indices}"
+    ),
+    "below_valid_min": "{count} below valid_min {valid_min}",
+    "above_valid_max": "{count} above valid_max {valid_max}",
+    "profile_time_outside": (
+        "profile_time of {count} profiles is outside the time range of their "
+        "records, e.g. profile {profile} at {profile_time}, records from "
+        "{time_min} to {time_max}"
+    ),
+    "profile_position_far": (
+        "profile_lat/profile_lon of {count} profiles are more than "
+        "{tolerance:.0f} m from their fixes, e.g. profile {profile} is "
+        "{nearest:.0f} m from the nearest fix and {mean:.0f} m from their "
+        "mean position"
+    ),
+    # NCEI authority tables
+    "ncei_attribute_missing": "Attribute {attr} not in dataset",
+    "ncei_no_references": "Cannot find any {attr} attributes in dataset",
+    "ncei_reference_missing": (
+        "Referenced {attr} variable {var_name} does not exist"
+    ),
+    "ncei_variable_attribute_missing": (
+        "Attribute {attr} should exist in variable {var_name}"
+    ),
+    "ncei_variable_value": (
+        "Attribute {attr} '{value}' for variable {var_name} not contained in "
+        "{table} authority table{suggestions}"
+    ),
+    "ncei_global_value": (
+        "Global attribute {attr} value '{value}' not contained in {table} "
+        "authority table{suggestions}"
+    ),
+}
+
+
+class Message(str):
+    """
+    A formatted message, which remembers the ID of its template and its
+    arguments, so reports can group failures by template rather than by
+    message text and result stores can keep the arguments alone
+    """
+
+    template_id = None
+    arguments = None
+
+
+def get_template_id(message):
+    """
+    Returns the template ID of a message, or None for messages which weren't
+    formatted from a template, e.g. those of the CF checks
+    """
+    return getattr(message, "template_id", None)
+
+
+def format_message(template_id, **kwargs):
+    """
+    Formats the message with a template ID
+
+    :rtype: Message
+    """
+    message = Message(TEMPLATES[template_id].format(**kwargs))
+    message.template_id = template_id
+    message.arguments = kwargs
+    return message
+
+
+def assert_true(test_ctx, test, template_id, **kwargs):
+    """
+    Like TestCtx.assert_true, but takes a template ID and the arguments of
+    the message, which is only formatted if the test fails
+
+    :rtype: bool
+    :return: Boolean indicating whether test condition passed or not
+    """
+    test_ctx.out_of += 1
+    if test:
+        test_ctx.score += 1
+    else:
+        test_ctx.messages.append(format_message(template_id, **kwargs))
+    return test
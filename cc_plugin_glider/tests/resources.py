@@ -3,22 +3,17 @@ cc_plugin_glider/tests/resources.py
 """
 
 import importlib
-import subprocess
+
+from cc_plugin_glider import tables
+from cc_plugin_glider.glider_dac import GliderCheck
 
 
 def get_filename(path):
     """
-    Returns the path to a valid dataset
+    Returns the path to a CDL dataset fixture.  The fixtures are loaded with
+    `cc_plugin_glider.cdl.read_cdl`, so no netCDF files need to be generated.
     """
-    filename = importlib.resources.files("cc_plugin_glider") / path
-    nc_path = filename.with_suffix(".nc")
-    if not nc_path.exists():
-        generate_dataset(filename, nc_path)
-    return str(nc_path)
-
-
-def generate_dataset(cdl_path, nc_path):
-    subprocess.call(["ncgen", "-o", nc_path, cdl_path])
+    return str(importlib.resources.files("cc_plugin_glider") / path)
 
 
 STATIC_FILES = {
@@ -31,3 +26,33 @@ STATIC_FILES = {
     "bad_standard_name": get_filename("tests/data/bad_standard_name.cdl"),
     "bad_units": get_filename("tests/data/bad_units.cdl"),
 }
+
+DATA_DIR = get_filename("tests/data")
+# authority table fixtures, by the table names of `tables.URLS`
+TABLE_FILES = {
+    "ncei_iso": get_filename("tests/data/ncei_metadata.xml"),
+    "sea_name": get_filename("tests/data/seanames.xml"),
+}
+
+
+def table_resources():
+    """
+    Returns the contents of the authority table fixtures by table name, for
+    a `cc_plugin_glider.tables.MemoryProvider`
+    """
+    resources = {}
+    for name, path in TABLE_FILES.items():
+        with open(path, "rb") as f:
+            resources[name] = f.read()
+    return resources
+
+
+def make_checker(**kwargs):
+    """
+    Returns a GliderCheck with its authority tables loaded from the fixtures
+    rather than over the network
+    """
+    return GliderCheck(
+        table_provider=tables.MemoryProvider(table_resources()),
+        **kwargs,
+    )
@@ -0,0 +1,117 @@
+"""
+cc_plugin_glider/tests/test_cdl.py
+"""
+
+import unittest
+
+import numpy as np
+
+from cc_plugin_glider import cdl
+from cc_plugin_glider.tests.resources import STATIC_FILES
+
+CDL_TEXT = """
+netcdf example {
+dimensions:
+    time = UNLIMITED ; // (3 currently)
+    traj_strlen = 8 ;
+variables:
+    char trajectory(traj_strlen) ;
+        trajectory:cf_role = "trajectory_id" ;
+    double depth(time) ;
+        depth:_FillValue = -999. ;
+        depth:valid_min = 0 ;
+        depth:valid_max = 2000.f ;
+    byte depth_qc(time) ;
+        depth_qc:flag_values = 0b, 1b, 9b ;
+        depth_qc:flag_meanings = "no_qc_performed " "good_data" ;
+    int platform ;
+
+// global attributes:
+        :title = "Escaped \\"title\\"" ;
+        int :wmo_count = 2 ;
+data:
+
+ trajectory = "unit-01" ;
+
+ depth = 1, _, 3.5 ;
+
+ platform = _ ;
+}
+"""
+
+
+class TestCDL(unittest.TestCase):
+    def get_dataset(self, text):
+        dataset = cdl.cdl_to_dataset(text)
+        self.addCleanup(dataset.close)
+        return dataset
+
+    def test_header(self):
+        """
+        Checks dimensions, variable types and attribute types match what
+        ncgen would produce
+        """
+        dataset = self.get_dataset(CDL_TEXT)
+        self.assertEqual(dataset.data_model, "NETCDF3_CLASSIC")
+        self.assertTrue(dataset.dimensions["time"].isunlimited())
+        self.assertEqual(len(dataset.dimensions["traj_strlen"]), 8)
+
+        depth = dataset.variables["depth"]
+        self.assertEqual(depth.dtype, np.dtype("f8"))
+        self.assertEqual(depth._FillValue, -999)
+        self.assertEqual(depth.valid_min.dtype, np.dtype("i4"))
+        self.assertEqual(depth.valid_max.dtype, np.dtype("f4"))
+
+        depth_qc = dataset.variables["depth_qc"]
+        self.assertEqual(depth_qc.flag_values.dtype, np.dtype("i1"))
+        np.testing.assert_array_equal(depth_qc.flag_values, [0, 1, 9])
+        self.assertEqual(
+            depth_qc.flag_meanings,
+            "no_qc_performed good_data",
+        )
+        self.assertEqual(dataset.title, 'Escaped "title"')
+        np.testing.assert_array_equal(dataset.wmo_count, [2])
+
+    def test_data(self):
+        """
+        Checks the data section sizes unlimited dimensions and masks fills
+        """
+        dataset = self.get_dataset(CDL_TEXT)
+        self.assertEqual(len(dataset.dimensions["time"]), 3)
+        depth = dataset.variables["depth"][:]
+        self.assertEqual(depth.count(), 2)
+        self.assertEqual(depth[2], 3.5)
+        self.assertIs(dataset.variables["depth_qc"][:].mask.all(), np.True_)
+        trajectory = dataset.variables["trajectory"][:]
+        self.assertEqual(b"".join(trajectory.compressed()), b"unit-01")
+        self.assertTrue(np.ma.is_masked(dataset.variables["platform"][...]))
+
+    def test_netcdf4_types(self):
+        """
+        Headers using netCDF-4 only types are created as netCDF-4
+        """
+        dataset = self.get_dataset(
+            "netcdf nc4 { variables: int64 counter ; ubyte flag ; }",
+        )
+        self.assertEqual(dataset.data_model, "NETCDF4")
+        self.assertEqual(dataset.variables["counter"].dtype, np.dtype("i8"))
+
+    def test_fixtures(self):
+        """
+        All the fixture CDL files can be loaded
+        """
+        for path in STATIC_FILES.values():
+            dataset = cdl.read_cdl(path)
+            self.addCleanup(dataset.close)
+            self.assertIn("time", dataset.dimensions)
+
+    def test_invalid(self):
+        """
+        Malformed CDL raises a CDLError with the offending line
+        """
+        with self.assertRaisesRegex(cdl.CDLError, "line 3"):
+            cdl.parse_cdl(
+                "netcdf bad {\nvariables:\n  double x(nodim) ;\n}",
+            )
+        with self.assertRaises(cdl.CDLError):
+            cdl.parse_cdl("netcdf bad { variables: x:units = 1.2.3 ; }")
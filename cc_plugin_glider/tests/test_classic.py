@@ -0,0 +1,136 @@
+"""
+cc_plugin_glider/tests/test_classic.py
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from netCDF4 import Dataset
+
+from cc_plugin_glider.classic import (
+    ClassicFormatError,
+    ClassicReader,
+    is_classic,
+)
+
+
+def write_classic(path, file_format, size=100):
+    """
+    Writes a small glider-like file with interleaved record variables
+    """
+    with Dataset(path, "w", format=file_format) as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("traj_strlen", 4)
+        dataset.createVariable("time", "f8", ("time",))[:] = np.arange(size)
+        depth = dataset.createVariable(
+            "depth",
+            "f4",
+            ("time",),
+            fill_value=np.float32(-999),
+        )
+        depth[:] = np.ma.masked_array(
+            np.linspace(0, 50, size),
+            mask=np.arange(size) % 5 == 0,
+        )
+        depth_qc = dataset.createVariable(
+            "depth_qc",
+            "i1",
+            ("time",),
+            fill_value=np.int8(9),
+        )
+        depth_qc.valid_min = np.int8(0)
+        depth_qc.valid_max = np.int8(4)
+        depth_qc[:] = np.arange(size) % 10
+        trajectory = dataset.createVariable(
+            "trajectory",
+            "S1",
+            ("traj_strlen",),
+        )
+        trajectory[:] = np.array([b"u", b"0", b"1", b""])
+        dataset.createVariable("platform", "i4", ()).assignValue(1)
+
+
+class TestClassicReader(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def test_matches_netcdf4(self):
+        """
+        Memory-mapped reads match netCDF4 reads, including the mask, for all
+        classic format variants
+        """
+        for file_format in (
+            "NETCDF3_CLASSIC",
+            "NETCDF3_64BIT_OFFSET",
+            "NETCDF3_64BIT_DATA",
+        ):
+            path = os.path.join(self.tmpdir, f"{file_format}.nc")
+            write_classic(path, file_format)
+            self.assertTrue(is_classic(path))
+            with Dataset(path) as dataset:
+                reader = ClassicReader.from_dataset(dataset)
+                for name in dataset.variables:
+                    expected = dataset.variables[name][:]
+                    data = reader.read(name)
+                    np.testing.assert_array_equal(
+                        np.ma.getmaskarray(data),
+                        np.ma.getmaskarray(expected),
+                    )
+                    self.assertTrue(np.ma.allequal(data, expected))
+                    # the data is a view of the memory map, not a copy
+                    self.assertTrue(np.shares_memory(data, reader._buffer))
+                reader.close()
+
+    def test_byte_default_fills(self):
+        """
+        Single byte variables without a _FillValue are masked at the netCDF
+        default fill, like netCDF4 masks them
+        """
+        path = os.path.join(self.tmpdir, "bytes.nc")
+        with Dataset(path, "w", format="NETCDF3_64BIT_DATA") as dataset:
+            dataset.createDimension("x", 3)
+            dataset.createVariable("u1", "u1", ("x",))[:] = [1, 255, 3]
+            dataset.createVariable("i1", "i1", ("x",))[:] = [1, -127, 3]
+        reader = ClassicReader(path)
+        with Dataset(path) as dataset:
+            for name in ("u1", "i1"):
+                expected = dataset.variables[name][:]
+                data = reader.read(name)
+                np.testing.assert_array_equal(
+                    np.ma.getmaskarray(data),
+                    [False, True, False],
+                )
+                np.testing.assert_array_equal(
+                    np.ma.getmaskarray(data),
+                    np.ma.getmaskarray(expected),
+                )
+        reader.close()
+
+    def test_buffer(self):
+        """
+        A reader can also be created over an in-memory buffer
+        """
+        path = os.path.join(self.tmpdir, "buffer.nc")
+        write_classic(path, "NETCDF3_CLASSIC", size=10)
+        with open(path, "rb") as nc_file:
+            reader = ClassicReader(nc_file.read())
+        self.assertEqual(reader.numrecs, 10)
+        np.testing.assert_array_equal(reader.read("time"), np.arange(10))
+
+    def test_not_classic(self):
+        """
+        netCDF-4 and in-memory datasets fall back to netCDF4 reads
+        """
+        path = os.path.join(self.tmpdir, "nc4.nc")
+        write_classic(path, "NETCDF4")
+        self.assertFalse(is_classic(path))
+        with Dataset(path) as dataset:
+            self.assertIsNone(ClassicReader.from_dataset(dataset))
+        with self.assertRaises(ClassicFormatError):
+            ClassicReader(path)
+        with Dataset("diskless", "w", diskless=True) as dataset:
+            self.assertIsNone(ClassicReader.from_dataset(dataset))
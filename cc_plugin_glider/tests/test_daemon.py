@@ -0,0 +1,167 @@
+"""
+cc_plugin_glider/tests/test_daemon.py
+"""
+
+import functools
+import json
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from cc_plugin_glider import daemon, tables
+from cc_plugin_glider.cdl import cdl_to_bytes
+from cc_plugin_glider.glider_dac import GliderCheck
+from cc_plugin_glider.tests.resources import (
+    STATIC_FILES,
+    make_checker,
+    table_resources,
+)
+
+
+class TestValidationService(unittest.TestCase):
+    def setUp(self):
+        self.check = make_checker()
+
+    def test_daemon(self):
+        """
+        Checks that the validation daemon accepts paths and request bodies,
+        reports its status and reloads its checkers
+        """
+        factory_calls = []
+
+        def checker_factory():
+            factory_calls.append(True)
+            return self.check
+
+        service = daemon.ValidationService(
+            checker_factory,
+            workers=1,
+            use_processes=False,
+        )
+        self.addCleanup(service.shutdown)
+        server = daemon.make_server(service, port=0)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def request(path, data=b""):
+            req = urllib.request.Request(f"{url}{path}", data=data)
+            try:
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    return resp.status, json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read())
+
+        path = STATIC_FILES["bad_qc"]
+        status, record = request(
+            f"/validate?path={path}&include=check_global_attributes",
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            (record["scored_points"], record["possible_points"]),
+            (42, 64),
+        )
+
+        with open(path, encoding="utf-8") as cdl_file:
+            nc_bytes = cdl_to_bytes(cdl_file.read())
+        status, record = request(
+            "/validate?include=check_global_attributes",
+            nc_bytes,
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(record["possible_points"], 64)
+
+        status, record = request("/validate", b"not netcdf")
+        self.assertEqual(status, 400)
+        self.assertIn("error", record)
+
+        status, record = request("/reload")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(factory_calls), 2)
+        with urllib.request.urlopen(f"{url}/status", timeout=30) as resp:
+            status = json.loads(resp.read())
+        self.assertEqual(status["workers"], 1)
+        self.assertEqual(status["table_version"], self.check.table_version)
+
+        # workers refresh their own checker's tables, keeping the pool
+        provider = tables.MemoryProvider(table_resources())
+        refreshed = GliderCheck(table_provider=provider)
+        refreshing_calls = []
+
+        def refreshing_factory():
+            refreshing_calls.append(True)
+            return refreshed
+
+        def wait_for(condition):
+            for _ in range(500):
+                if condition(refreshing_service.status()):
+                    break
+                threading.Event().wait(0.01)
+            return refreshing_service.status()
+
+        refreshing_service = daemon.ValidationService(
+            refreshing_factory,
+            workers=1,
+            use_processes=False,
+            refresh_interval=0.01,
+        )
+        self.addCleanup(refreshing_service.shutdown)
+        version = refreshing_service.status()["table_version"]
+        self.assertEqual(version, refreshed.table_version)
+        provider.resources["sea_name"] = (
+            b"<seanames><seaname><seaname>Gulf of Mexico</seaname>"
+            b"</seaname></seanames>"
+        )
+        status = wait_for(lambda status: status["table_version"] != version)
+        self.assertEqual(status["table_version"], refreshed.table_version)
+        self.assertNotEqual(status["table_version"], version)
+        self.assertLess(status["vocabulary_age"], 60)
+        self.assertIsNone(status["last_reload_error"])
+        self.assertEqual(len(refreshing_calls), 1)
+
+        # a failed refresh is reported and keeps the current tables
+        refreshed.table_provider = tables.MemoryProvider({})
+        status = wait_for(lambda status: status["last_reload_error"])
+        self.assertIn("LookupError", status["last_reload_error"])
+        self.assertEqual(status["table_version"], refreshed.table_version)
+        refreshing_service.shutdown()
+        self.assertIsNone(refreshing_service._refreshers[0]._thread)
+
+        # worker processes report their refreshes through a queue
+        refreshing_service = daemon.ValidationService(
+            functools.partial(GliderCheck, table_provider=provider),
+            workers=1,
+            refresh_interval=0.01,
+        )
+        self.addCleanup(refreshing_service.shutdown)
+        loaded_at = refreshing_service.status()["tables_loaded_at"]
+        status = wait_for(
+            lambda status: status["tables_loaded_at"] > loaded_at,
+        )
+        self.assertGreater(status["tables_loaded_at"], loaded_at)
+        self.assertEqual(
+            status["table_version"],
+            GliderCheck(table_provider=provider).table_version,
+        )
+
+        root_service = daemon.ValidationService(
+            lambda: self.check,
+            workers=1,
+            use_processes=False,
+            root=tempfile.gettempdir(),
+        )
+        self.addCleanup(root_service.shutdown)
+        with self.assertRaises(PermissionError):
+            root_service.submit(path)
+
+        # netCDF access isn't thread-safe, threads only run one worker
+        with self.assertRaises(ValueError):
+            daemon.ValidationService(
+                lambda: self.check,
+                workers=2,
+                use_processes=False,
+            )
@@ -2,16 +2,40 @@
 cc_plugin_glider/tests/test_glidercheck.py
 """
 
+import importlib.util
+import io
+import json
 import os
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
 import numpy as np
 import requests_mock
+from compliance_checker.base import BaseCheck, Result, TestCtx
+from compliance_checker.suite import CheckSuite
 from compliance_checker.tests.helpers import MockTimeSeries
 from netCDF4 import Dataset
 
-from cc_plugin_glider import util
+from cc_plugin_glider import (
+    api,
+    cache,
+    lazy,
+    ndjson,
+    parallel,
+    rules,
+    schema,
+    suggest,
+    summary,
+    tables,
+    templates,
+    util,
+)
+from cc_plugin_glider.cdl import cdl_to_bytes, read_cdl
+from cc_plugin_glider.classic import ClassicReader
 from cc_plugin_glider.tests.resources import STATIC_FILES
+from cc_plugin_glider.tests.test_classic import write_classic
 
 from ..glider_dac import GliderCheck
 
@@ -42,7 +66,7 @@ class TestGliderCheck(unittest.TestCase):
         Return a pairwise object for the dataset
         """
         if isinstance(nc_dataset, str):
-            nc_dataset = Dataset(nc_dataset, "r")
+            nc_dataset = read_cdl(nc_dataset)
             self.addCleanup(nc_dataset.close)
         return nc_dataset
 
@@ -404,3 +428,1086 @@ class TestGliderCheck(unittest.TestCase):
             self.check.check_ncei_tables,
             mock_nc_file,
         )
+
+    def test_close_matches(self):
+        """
+        Checks that authority table failures suggest the closest entries
+        """
+        index = suggest.TrigramIndex(self.check.auth_tables["institution"])
+        self.assertEqual(
+            index.suggest("Rutgers Univ"),
+            ["Rutgers University Center for Ocean Observing Leadership"],
+        )
+        self.assertEqual(index.suggest("N/A"), [])
+        self.assertEqual(index.suggest("Unknown"), [])
+        self.assertLessEqual(len(index.suggest("University", limit=2)), 2)
+
+        mock_nc_file = MockTimeSeries()
+        mock_nc_file.project = "MARACOOS"
+        mock_nc_file.institution = "Rutgers Univ"
+        mock_nc_file.sea_name = "Atlantc Ocean"
+        result = self.check.check_ncei_tables(mock_nc_file)
+        self.assertIn(
+            "Global attribute project value 'MARACOOS' not contained in "
+            "project authority table. Possible close matches: 'Mid-Atlantic "
+            "Regional Association Coastal Ocean Observing System "
+            "(MARACOOS)'",
+            result.msgs,
+        )
+        self.assertIn(
+            "Global attribute institution value 'Rutgers Univ' not contained "
+            "in institution authority table. Possible close matches: 'Rutgers "
+            "University Center for Ocean Observing Leadership'",
+            result.msgs,
+        )
+        result = self.check.check_global_attributes(mock_nc_file)
+        self.assertIn(
+            "sea_name attribute should be from the NODC sea names list: "
+            "Atlantc Ocean is not a valid sea name. Possible close matches: "
+            "'North Atlantic Ocean', 'South Atlantic Ocean', 'Equatorial "
+            "Atlantic Ocean'",
+            result.msgs,
+        )
+
+    def test_global_attribute_schema(self):
+        """
+        Checks that the global attribute schema reads each attribute once
+        and scores them like the individual rules
+        """
+        dataset = MockTimeSeries()
+        dataset.title = " "
+        dataset.wmo_id = 4801234
+        dataset.sea_name = "Gulf of Mexico, Atlantc Ocean"
+        dataset.platform_type = "Slocum Glider"
+        dataset = parallel.DatasetSnapshot(dataset)
+        validator = schema.GlobalAttributeValidator(
+            {
+                "title": None,
+                "wmo_id": None,
+                "summary": None,
+                "sea_name": {
+                    "vocabulary": "sea_name",
+                    "message": "sea_name_invalid",
+                },
+                "platform_type": {
+                    "values": "acceptable_platform_types",
+                    "message": "platform_type_invalid",
+                },
+            },
+        )
+        with mock.patch.object(
+            dataset,
+            "ncattrs",
+            wraps=dataset.ncattrs,
+        ) as ncattrs:
+            score, out_of, messages = validator.validate(dataset, self.check)
+        self.assertEqual(ncattrs.call_count, 1)
+        self.assertEqual((score, out_of), (7, 10))
+        self.assertEqual(
+            [templates.get_template_id(message) for message in messages],
+            [
+                "global_attribute_empty",
+                "global_attribute_missing",
+                "sea_name_invalid",
+            ],
+        )
+        vocabulary = validator.vocabulary(self.check, "sea_name")
+        self.assertIs(validator.vocabulary(self.check, "sea_name"), vocabulary)
+        self.assertIn("gulf of mexico", vocabulary)
+
+        with self.assertRaises(ValueError):
+            schema.GlobalAttributeValidator({"title": {"pattern": ".+"}})
+        self.check.auth_tables = dict(self.check.auth_tables, sea_name=None)
+        with self.assertRaises(RuntimeError):
+            validator.validate(dataset, self.check)
+
+    def test_rule_sets(self):
+        """
+        Checks that each file is checked against the compiled rule set of
+        its format version
+        """
+        dataset = MockTimeSeries()
+        self.assertEqual(rules.format_version(dataset), rules.DEFAULT_VERSION)
+        dataset.format_version = "IOOS_Glider_NetCDF_v2.0.nc"
+        self.assertEqual(rules.format_version(dataset), "2")
+        dataset.format_version = "IOOS_Glider_NetCDF_v3.0-qartod"
+        self.assertEqual(rules.format_version(dataset), "3")
+        dataset.format_version = "IOOS_Glider_NetCDF_v99.0"
+        self.assertEqual(rules.format_version(dataset), rules.DEFAULT_VERSION)
+        self.assertIs(rules.rule_set("2"), rules.rule_set("2"))
+
+        for name, version in (("glider_std", "2"), ("glider_std3", "3")):
+            dataset = self.get_dataset(STATIC_FILES[name])
+            self.check.setup(dataset)
+            rule_set = self.check.rule_set(dataset)
+            self.assertEqual(rule_set.version, version)
+            self.assertIs(self.check.rule_set(dataset), rule_set)
+
+        # the rules describe each version's attributes, which match the
+        # fixtures of that version
+        v2 = self.get_dataset(STATIC_FILES["glider_std"])
+        v3 = self.get_dataset(STATIC_FILES["glider_std3"])
+        for dataset, version in ((v2, "2"), (v3, "3")):
+            rule_set = rules.rule_set(version)
+            self.assertTrue(getattr(dataset, rule_set.acknowledgement))
+            self.assertEqual(
+                hasattr(dataset, "ioos_regional_association"),
+                rule_set.ioos_regional_association,
+            )
+            self.check.setup(dataset)
+            self.assertEqual(
+                self.check.check_required_variables(dataset).value,
+                (20, 20),
+            )
+        self.assertEqual(rules.rule_set("2").acknowledgement, "acknowledgment")
+        self.assertFalse(hasattr(v2, "acknowledgement"))
+
+        # QARTOD variables are checked whatever the version
+        self.check.setup(v2)
+        self.assertIsNone(self.check.check_qartod(v2))
+        v2.createVariable("qartod_temperature_flag", "i1", ("time",))
+        self.assertEqual(self.check.check_qartod(v2).value, (0, 6))
+
+        # ignored attributes don't leak into the shared rules
+        self.check.options = {"ignore_attributes:ancillary_variables"}
+        self.check.check_lat_lon_attributes(v2)
+        self.assertIn(
+            "ancillary_variables",
+            rules.rule_set("3").var_attrs["lat"],
+        )
+
+    def test_attribute_index(self):
+        """
+        Checks that variable references are resolved through one attribute
+        index per dataset
+        """
+        dataset = self.get_dataset(STATIC_FILES["glider_std3"])
+        index = util.AttributeIndex(dataset)
+        self.assertIn("ancillary_variables", index)
+        self.assertNotIn("not_an_attribute", index)
+        self.assertEqual(
+            index.variables("instrument"),
+            {
+                var_name: ncvar.instrument
+                for var_name, ncvar in dataset.variables.items()
+                if "instrument" in ncvar.ncattrs()
+            },
+        )
+
+        self.check.setup(dataset)
+        index = self.check.attribute_index(dataset)
+        self.assertIs(self.check.attribute_index(dataset), index)
+        with mock.patch.object(
+            util,
+            "AttributeIndex",
+            side_effect=AssertionError("index rebuilt"),
+        ):
+            expected = (
+                self.check.check_ancillary_variables(dataset),
+                self.check.check_ncei_tables(dataset),
+            )
+        snapshot = parallel.DatasetSnapshot(dataset)
+        self.assertIs(
+            self.check.attribute_index(snapshot),
+            self.check.attribute_index(snapshot),
+        )
+        for result, snapshot_result in zip(
+            expected,
+            (
+                self.check.check_ancillary_variables(snapshot),
+                self.check.check_ncei_tables(snapshot),
+            ),
+        ):
+            self.assertEqual(result.value, snapshot_result.value)
+            self.assertEqual(result.msgs, snapshot_result.msgs)
+
+        # a new run indexes the dataset again
+        self.check.setup(dataset)
+        self.assertIsNot(self.check.attribute_index(dataset), index)
+
+    def test_message_templates(self):
+        """
+        Checks that messages are only formatted for failed assertions
+        """
+        dataset = self.get_dataset(STATIC_FILES["glider_std3"])
+        passing_checks = (
+            self.check.check_dtype,
+            self.check.check_qartod,
+            self.check.check_qc_flag_data,
+            self.check.check_valid_min_dtype,
+            self.check.check_valid_max_dtype,
+            self.check.check_valid_range_data,
+            self.check.check_location_data,
+        )
+        with mock.patch.object(
+            templates,
+            "format_message",
+            wraps=templates.format_message,
+        ) as format_message:
+            for check in passing_checks:
+                result = check(dataset)
+                self.assertEqual(result.value[0], result.value[1])
+            self.assertEqual(format_message.call_count, 0)
+
+            result = self.check.check_ncei_tables(dataset)
+            self.assertEqual(format_message.call_count, len(result.msgs))
+
+        test_ctx = TestCtx(BaseCheck.LOW, "Templates")
+        self.assertTrue(
+            templates.assert_true(test_ctx, True, "variable_missing"),
+        )
+        self.assertFalse(
+            templates.assert_true(
+                test_ctx,
+                False,
+                "variable_missing",
+                var_name="depth",
+            ),
+        )
+        self.assertEqual(test_ctx.to_result().value, (1, 2))
+        self.assertEqual(test_ctx.messages, ["Variable depth is missing"])
+
+    def test_validate_buffer(self):
+        """
+        Checks that in-memory netCDF buffers give the same results as files
+        """
+        path = STATIC_FILES["glider_std3"]
+        with open(path, encoding="utf-8") as cdl_file:
+            nc_bytes = cdl_to_bytes(cdl_file.read())
+
+        def scores(results):
+            return sorted((r.name, r.value) for r in results)
+
+        expected, errors = api.validate(path, checker=self.check)
+        self.assertFalse(errors)
+        for buffer in (nc_bytes, bytearray(nc_bytes), memoryview(nc_bytes)):
+            results, errors = api.validate(buffer, checker=self.check)
+            self.assertFalse(errors)
+            self.assertEqual(scores(results), scores(expected))
+
+        batch = list(
+            api.validate_batch(
+                [path, nc_bytes],
+                checker=self.check,
+                include_checks=["check_required_variables"],
+            ),
+        )
+        self.assertEqual([source for source, _, _ in batch], [path, nc_bytes])
+        for _, results, _ in batch:
+            self.assertEqual(len(results), 1)
+            self.assertEqual(results[0].value, (20, 20))
+
+    def test_suite_internals(self):
+        """
+        Checks that the compliance-checker internals the check runners use
+        still exist and select checks like ``-i`` and ``-s``
+        """
+        for name in parallel.SUITE_METHODS:
+            self.assertTrue(
+                callable(getattr(CheckSuite, name, None)),
+                f"CheckSuite.{name} is gone",
+            )
+        check_names = [
+            method.__name__ for method, _ in parallel.get_checks(self.check)
+        ]
+        self.assertIn("check_dtype", check_names)
+        self.assertTrue(all(n.startswith("check_") for n in check_names))
+        self.assertNotIn(
+            "check_dtype",
+            [
+                method.__name__
+                for method, _ in parallel.get_checks(
+                    self.check,
+                    skip_checks=["check_dtype"],
+                )
+            ],
+        )
+        checks = parallel.get_checks(
+            self.check,
+            include_checks=["check_valid_lon"],
+            skip_checks=["check_valid_lon:L"],
+        )
+        self.assertEqual(
+            [(method.__name__, level) for method, level in checks],
+            [("check_valid_lon", BaseCheck.LOW)],
+        )
+        dataset = self.get_dataset(STATIC_FILES["glider_std3"])
+        self.check.setup(dataset)
+        results = parallel.run_check(checks[0][0], dataset, None)
+        self.assertTrue(all(isinstance(r, Result) for r in results))
+
+    def test_parallel_checks(self):
+        """
+        Checks that running the metadata checks concurrently with the data
+        checks gives the same results, in the same order, as running them
+        in turn
+        """
+
+        def outcomes(results):
+            return [(r.name, r.value, r.msgs) for r in results]
+
+        for name in (
+            "glider_std",
+            "glider_std3",
+            "bad_qc",
+            "bad_metadata",
+            "bad_location",
+            "bad_standard_name",
+        ):
+            with api.dataset_context(STATIC_FILES[name]) as dataset:
+                expected = list(api.iter_check_results(self.check, dataset))
+                parallel_results = list(
+                    api.iter_check_results(self.check, dataset, workers=4),
+                )
+            self.assertEqual(
+                [check_name for check_name, _, _ in parallel_results],
+                [check_name for check_name, _, _ in expected],
+            )
+            for (_, results, error), (_, expected_results, _) in zip(
+                parallel_results,
+                expected,
+            ):
+                self.assertIsNone(error)
+                self.assertEqual(outcomes(results), outcomes(expected_results))
+
+        with api.dataset_context(STATIC_FILES["glider_std3"]) as dataset:
+            snapshot = parallel.DatasetSnapshot(dataset)
+            self.assertEqual(snapshot.ncattrs(), dataset.ncattrs())
+            self.assertEqual(snapshot.title, dataset.title)
+            self.assertFalse(hasattr(snapshot, "not_an_attribute"))
+            self.assertEqual(
+                [
+                    v.name
+                    for v in snapshot.get_variables_by_attributes(
+                        axis=lambda v: v is not None,
+                    )
+                ],
+                [
+                    v.name
+                    for v in dataset.get_variables_by_attributes(
+                        axis=lambda v: v is not None,
+                    )
+                ],
+            )
+            np.testing.assert_array_equal(
+                snapshot.variables["depth"][:],
+                dataset.variables["depth"][:],
+            )
+
+    def test_result_cache(self):
+        """
+        Checks that metadata check results are reused for files with the
+        same header, and only for them
+        """
+
+        def outcomes(results):
+            return [(r.name, r.value, r.msgs) for r in results]
+
+        # the cache is opt in
+        self.assertIsNone(self.check.result_cache)
+        with mock.patch.object(
+            tables,
+            "load_tables",
+            return_value=self.check.auth_tables,
+        ):
+            checker = GliderCheck(options={"result_cache"})
+        self.assertIsInstance(checker.result_cache, cache.ResultCache)
+        result_cache = self.check.result_cache = cache.ResultCache()
+        metadata_checks = [
+            check_name
+            for check_name, _, _ in api.iter_check_results(
+                self.check,
+                read_cdl(STATIC_FILES["glider_std3"]),
+            )
+            if check_name not in self.check.data_checks
+        ]
+
+        def run(dataset, **kwargs):
+            hits = result_cache.hits
+            results, errors = api.run_checks(self.check, dataset, **kwargs)
+            self.assertEqual(errors, {})
+            return outcomes(results), result_cache.hits - hits
+
+        dataset = read_cdl(STATIC_FILES["glider_std3"])
+        # a single worker keys the results without snapshotting the dataset
+        with mock.patch.object(parallel, "DatasetSnapshot") as snapshot:
+            expected, hits = run(dataset)
+        snapshot.assert_not_called()
+        self.assertEqual(hits, len(metadata_checks))
+        self.assertEqual(run(dataset, workers=4), (expected, hits))
+
+        # values of per file attributes don't change the results
+        dataset.date_created = "2024-01-01T00:00:00Z"
+        dataset.history = "regridded"
+        self.assertEqual(run(dataset), (expected, hits))
+
+        # updating returned results doesn't change the cached results
+        results, _ = api.run_checks(self.check, dataset)
+        for result in results:
+            result.msgs.append("changed")
+        self.assertEqual(run(dataset), (expected, hits))
+
+        # but an empty one does, as do other attributes and the options
+        dataset.history = " "
+        results, hits = run(dataset)
+        self.assertEqual(hits, 0)
+        self.assertNotEqual(results, expected)
+        dataset.history = "regridded"
+        dataset.sea_name = "Not a sea"
+        self.assertEqual(run(dataset)[1], 0)
+        dataset.sea_name = read_cdl(STATIC_FILES["glider_std3"]).sea_name
+        self.assertEqual(run(dataset)[1], len(metadata_checks))
+        self.check.options = {"ignore_attributes:ancillary_variables"}
+        self.assertEqual(run(dataset)[1], 0)
+
+        # as do dimension sizes
+        self.check.options = None
+        self.assertEqual(run(dataset)[1], len(metadata_checks))
+        dataset.variables["time"][:3] = [1.0, 2.0, 3.0]
+        self.assertEqual(run(dataset)[1], 0)
+
+    def test_summary_index(self):
+        """
+        Checks that validating with a summary index upserts one summary per
+        file, and that a summary goes stale when its file changes
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, "glider.nc")
+            with open(STATIC_FILES["glider_std3"], encoding="utf-8") as f:
+                data = cdl_to_bytes(f.read())
+            with open(source, "wb") as f:
+                f.write(data)
+            with Dataset(source, "a") as dataset:
+                dataset.variables["time"][:] = 1.6e9 + np.arange(10.0)
+                dataset.variables["lat"][:] = np.linspace(40, 41, 10)
+                dataset.variables["lon"][:] = np.ma.masked_array(
+                    np.linspace(-70, -69, 10),
+                    mask=np.arange(10) == 0,
+                )
+                dataset.variables["profile_id"].assignValue(7)
+            size = os.path.getsize(source)
+            self.check.options = {f"summary_index:{tmpdir}/index.sqlite"}
+            results, errors = api.validate(source, checker=self.check)
+            api.validate(source, checker=self.check)
+            index = self.check.summary_index
+            self.assertEqual(len(index), 1)
+            row = index.get(source)
+            self.assertEqual(row["source"], os.path.abspath(source))
+            self.assertEqual(row["size"], size)
+            self.assertEqual(row["records"], 10)
+            self.assertEqual(row["errors"], len(errors))
+            self.assertEqual(
+                row["scored_points"],
+                sum(ndjson.result_value(r)[0] for r in results),
+            )
+            self.assertEqual(
+                (row["time_min"], row["time_max"]), (1.6e9, 1.6e9 + 9)
+            )
+            self.assertEqual((row["lat_min"], row["lat_max"]), (40, 41))
+            # masked values are left out of the ranges
+            self.assertAlmostEqual(row["lon_min"], -70 + 1 / 9)
+            self.assertEqual(
+                (row["profile_id_min"], row["profile_id_max"]), (7, 7)
+            )
+            with Dataset(source) as dataset:
+                self.assertEqual(
+                    row["trajectory"],
+                    summary.trajectory_name(dataset),
+                )
+            self.assertTrue(index.is_current(source, self.check))
+            # buffers have no file to summarize
+            api.validate(data, checker=self.check)
+            self.assertEqual(len(index), 1)
+
+            index.add({**row, "source": "bad.nc", "passed": True})
+            with Dataset(source) as dataset:
+                failed = summary.file_summary(
+                    dataset,
+                    [Result(BaseCheck.HIGH, (0, 1), "check_x")],
+                    {},
+                    "bad.nc",
+                )
+            self.assertFalse(failed["passed"])
+            self.assertIsNone(failed["size"])
+            index.add(failed)
+            self.assertEqual(len(index), 2)
+            self.assertFalse(index.get("bad.nc")["passed"])
+            self.assertEqual(
+                index.execute(
+                    "SELECT count(*) FROM files WHERE passed",
+                )[0][0],
+                int(row["passed"]),
+            )
+
+            os.utime(source, ns=(0, 0))
+            self.assertFalse(index.is_current(source))
+            self.assertFalse(index.is_current("missing.nc"))
+            index.close()
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("pyarrow"),
+        "pyarrow is not installed",
+    )
+    def test_memmap_reader(self):
+        """
+        Checks that the memmap reader option gives the same data check
+        results as netCDF4 reads for classic files
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "classic.nc")
+            write_classic(path, "NETCDF3_CLASSIC")
+            data_checks = (
+                self.check.check_monotonically_increasing_time,
+                self.check.check_dim_no_data,
+                self.check.check_depth_array,
+            )
+            with Dataset(path) as dataset:
+                self.check.setup(dataset)
+                self.assertIsNone(self.check.classic_reader)
+                expected = [check(dataset).value for check in data_checks]
+
+                self.check.options = {"reader:memmap"}
+                self.check.setup(dataset)
+                self.assertIsNotNone(self.check.classic_reader)
+                depth = self.check.read_data(dataset, "depth")
+                self.assertTrue(
+                    np.shares_memory(depth, self.check.classic_reader._buffer),
+                )
+                results = [check(dataset).value for check in data_checks]
+                reader = self.check.classic_reader
+                # setting up again closes the last dataset's reader
+                self.check.setup(dataset)
+                self.assertIsNone(reader._buffer)
+                self.check.teardown()
+                self.assertIsNone(self.check.classic_reader)
+
+            # and so does the end of a run
+            with mock.patch.object(
+                ClassicReader,
+                "close",
+                autospec=True,
+            ) as close:
+                api.validate(path, checker=self.check)
+            close.assert_called_once()
+            self.assertIsNone(self.check.classic_reader)
+        self.assertEqual(results, expected)
+
+    def test_time_with_fills(self):
+        """
+        Checks that fill values in time are left out of the monotonically
+        increasing time check, with every reader and backend, including
+        chunks which only hold fill values
+        """
+        all_options = (
+            None,
+            {"reader:memmap"},
+            {"backend:dask"},
+            {"backend:dask", "memory_budget:60"},
+        )
+
+        def run(path):
+            values = []
+            with Dataset(path) as dataset:
+                for options in all_options:
+                    self.check.options = options
+                    self.check.setup(dataset)
+                    result = self.check.check_monotonically_increasing_time(
+                        dataset,
+                    )
+                    values.append(result.value)
+                    self.check.teardown()
+            return values
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "classic.nc")
+            write_classic(path, "NETCDF3_CLASSIC")
+            with Dataset(path, "a") as dataset:
+                # 60 bytes is 5 values a chunk, so the second is all fills
+                dataset.variables["time"][5:10] = np.ma.masked
+                dataset.variables["time"][12] = np.ma.masked
+            self.assertEqual(run(path), [(1, 1)] * len(all_options))
+            with Dataset(path, "a") as dataset:
+                time = dataset.variables["time"]
+                time[10] = time[4]
+            self.assertEqual(run(path), [(0, 1)] * len(all_options))
+
+    def test_qartod(self):
+        """
+        Checks that QARTOD flag variables are found for any parameter
+        """
+        dataset = self.get_dataset(STATIC_FILES["glider_std3"])
+        result = self.check.check_qartod(dataset)
+        # 26 flag variables, including salinity and whole-file tests
+        self.assertEqual(result.value, (234, 234))
+
+        dataset = Dataset("qartod", "w", diskless=True)
+        self.addCleanup(dataset.close)
+        dataset.createDimension("time", 1)
+        good = dataset.createVariable(
+            "qartod_oxygen_gross_range_flag",
+            "i1",
+            ("time",),
+            fill_value=np.int8(9),
+        )
+        good.setncatts(
+            {
+                "long_name": "QARTOD gross range test",
+                "flag_meanings": "PASS NOT_EVALUATED SUSPECT FAIL MISSING",
+                "flag_values": np.int8([1, 2, 3, 4, 9]),
+                "valid_min": np.int8(1),
+                "valid_max": np.int8(9),
+            },
+        )
+        bad = dataset.createVariable(
+            "qartod_salinity_spike_flag",
+            "i2",
+            ("time",),
+        )
+        bad.setncatts(
+            {
+                "long_name": "QARTOD spike test",
+                "flag_values": np.int16([1, 2, 3, 4, 9]),
+                "valid_min": np.int16(1),
+            },
+        )
+        dataset.createVariable("qartod_flag_notes", "i1", ("time",))
+        result = self.check.check_qartod(dataset)
+        self.assertEqual(result.value, (12, 17))
+        self.assertEqual(
+            result.msgs,
+            [
+                "attribute qartod_salinity_spike_flag:valid_min must be of "
+                "type byte",
+                "valid_max attribute for longitude should be defined",
+                "variable qartod_salinity_spike_flag must have a _FillValue "
+                "of 9b",
+                "attribute qartod_salinity_spike_flag:flag_meanings must be a "
+                "non-empty string",
+                "attribute qartod_salinity_spike_flag:flag_values has an "
+                "illegal data-type, must be byte",
+            ],
+        )
+
+    def test_qc_flag_data(self):
+        """
+        Checks that QC flag values outside flag_values and _FillValue are
+        counted, reading with netCDF4, in blocks and through the memmap reader
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "classic.nc")
+            write_classic(path, "NETCDF3_CLASSIC")
+            with Dataset(path, "a") as dataset:
+                dataset.variables["depth_qc"].flag_values = np.int8(
+                    [0, 1, 2, 3, 4],
+                )
+                qartod = dataset.createVariable(
+                    "qartod_depth_spike_flag",
+                    "i2",
+                    ("time",),
+                )
+                qartod.flag_values = np.int16([1, 2, 3, 4, 9])
+                qartod[:] = np.arange(100) % 10
+                # not a QARTOD variable name, see QARTOD_VARIABLE
+                unnamed = dataset.createVariable(
+                    "qartod__flag",
+                    "i2",
+                    ("time",),
+                )
+                unnamed.flag_values = np.int16([1])
+                unnamed[:] = 5
+            expected_msg = (
+                "Variable depth_qc has 40 values which are not in flag_values "
+                "or _FillValue: 5 (10 times), 6 (10 times), 7 (10 times), "
+                "8 (10 times)"
+            )
+            with Dataset(path) as dataset:
+                self.check.setup(dataset)
+                result = self.check.check_qc_flag_data(dataset)
+                self.assertEqual(result.value, (0, 2))
+                self.assertEqual(result.msgs[0], expected_msg)
+                self.assertIn("0 (10 times), 5 (10 times)", result.msgs[1])
+                self.assertEqual(dataset.variables["depth_qc"].mask, True)
+
+                self.assertEqual(
+                    util.count_invalid_values(
+                        util.iter_blocks(
+                            dataset.variables["qartod_depth_spike_flag"],
+                            block_elements=7,
+                        ),
+                        [0, 1, 2, 3, 4, 5, 6, 7, 8],
+                    ),
+                    {9: 10},
+                )
+
+                self.check.options = {"reader:memmap"}
+                self.check.setup(dataset)
+                result = self.check.check_qc_flag_data(dataset)
+                self.assertEqual(result.msgs[0], expected_msg)
+                self.check.classic_reader.close()
+
+    def test_valid_range_data(self):
+        """
+        Checks that values outside valid_min/valid_max are counted once,
+        skipping fill values, whatever the block size or reader
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "classic.nc")
+            write_classic(path, "NETCDF3_CLASSIC")
+            with Dataset(path, "a") as dataset:
+                dataset.variables["depth"].valid_range = np.float32([0, 45])
+            expected_msgs = [
+                "Variable depth has 8 values outside its valid range (8 "
+                "above valid_max 45.0), first at indices [91, 92, 93, 94, 96]",
+                "Variable depth_qc has 40 values outside its valid range (40 "
+                "above valid_max 4), first at indices [5, 6, 7, 8, 15]",
+            ]
+            with Dataset(path) as dataset:
+                for options in (
+                    None,
+                    {"memory_budget:20"},
+                    {"memory_budget:20", "read_ahead:2"},
+                    {"memory_budget:1K", "reader:memmap"},
+                ):
+                    self.check.options = options
+                    self.check.setup(dataset)
+                    result = self.check.check_valid_range_data(dataset)
+                    self.assertEqual(result.value, (0, 2))
+                    self.assertEqual(result.msgs, expected_msgs)
+                self.assertEqual(self.check.memory_budget, 1024)
+                self.check.classic_reader.close()
+
+    def test_chunk_aligned_blocks(self):
+        """
+        Checks that blocks are aligned to the variables' chunks, and read the
+        same with read-ahead
+        """
+        dataset = Dataset("chunked", "w", diskless=True)
+        self.addCleanup(dataset.close)
+        dataset.createDimension("time", None)
+        dataset.createDimension("wide", 1000)
+        depth = dataset.createVariable(
+            "depth",
+            "f8",
+            ("time",),
+            zlib=True,
+            chunksizes=(100,),
+        )
+        depth[:] = np.arange(1050.0)
+        temperature = dataset.createVariable(
+            "temperature",
+            "f4",
+            ("time",),
+            chunksizes=(150,),
+        )
+        temperature[:] = np.arange(1050.0)
+        contiguous = dataset.createVariable("contiguous", "f8", ("wide",))
+
+        self.assertEqual(util.chunk_rows(depth), 100)
+        self.assertIsNone(util.chunk_rows(contiguous))
+        self.assertIsNone(util.chunk_rows(np.arange(10)))
+        self.assertEqual(util.block_rows([depth], 250), 200)
+        # at least one chunk, even over the budget
+        self.assertEqual(util.block_rows([depth], 50), 100)
+        self.assertEqual(util.block_rows([contiguous], 250), 250)
+        # chunks of variables read in step line up every 300 rows
+        self.assertEqual(util.block_rows([depth, temperature], 700), 600)
+        self.assertEqual(util.block_rows([depth, temperature], 250), 150)
+
+        blocks = list(util.iter_blocks(depth, 250))
+        self.assertEqual([len(block) for block in blocks], [200] * 5 + [50])
+        np.testing.assert_array_equal(np.concatenate(blocks), depth[:])
+        ahead = list(util.read_ahead(util.iter_blocks(depth, 250), 2))
+        self.assertEqual(len(ahead), len(blocks))
+        for block, expected in zip(ahead, blocks):
+            np.testing.assert_array_equal(block, expected)
+
+        # errors are raised in the caller, and closing stops the reader
+        def failing():
+            yield 1
+            raise ValueError("unreadable")
+
+        with self.assertRaises(ValueError):
+            list(util.read_ahead(failing()))
+        reader = util.read_ahead(util.iter_blocks(depth, 100), 1)
+        next(reader)
+        reader.close()
+        self.assertNotIn(
+            "glider-read-ahead",
+            [thread.name for thread in threading.enumerate()],
+        )
+
+        self.check.options = {"memory_budget:8K", "read_ahead:1"}
+        self.check.setup(dataset)
+        self.assertEqual(self.check.read_ahead, 1)
+        columns = list(
+            self.check.iter_raw_columns(dataset, ["depth", "temperature"]),
+        )
+        self.assertEqual(
+            [len(depth_block) for depth_block, _ in columns],
+            [300, 300, 300, 150],
+        )
+        for depth_block, temperature_block in columns:
+            np.testing.assert_array_equal(depth_block, temperature_block)
+
+    def test_location_data(self):
+        """
+        Checks that out of range positions, (0, 0) positions and jumps
+        between fixes are found across block boundaries
+        """
+        dataset = Dataset("location", "w", diskless=True)
+        self.addCleanup(dataset.close)
+        dataset.createDimension("time", 100)
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "seconds since 1970-01-01T00:00:00Z"
+        time[:] = np.arange(100) * 60.0
+        # about 0.5 m/s to the north
+        lat_values = 40 + np.arange(100) * 30 / 111195
+        lon_values = np.full(100, -70.0)
+        lat_values[10] = 95
+        lat_values[20], lon_values[20] = 0, 0
+        # a 1.1 km jump in one minute, then back
+        lat_values[50:52] += 0.01
+        lat = dataset.createVariable("lat", "f8", ("time",), fill_value=-999)
+        lat[:] = np.ma.masked_array(lat_values, mask=np.arange(100) == 30)
+        dataset.createVariable("lon", "f8", ("time",))[:] = lon_values
+        profile_lat = dataset.createVariable("profile_lat", "f8", ())
+        profile_lat.assignValue(40)
+        dataset.createVariable("profile_lon", "f8", ()).assignValue(-70)
+
+        for options in (
+            None,
+            {"memory_budget:300"},
+            {"memory_budget:300", "read_ahead:1"},
+        ):
+            self.check.options = options
+            self.check.setup(dataset)
+            result = self.check.check_location_data(dataset)
+            self.assertEqual(result.value, (2, 5))
+            self.assertEqual(
+                result.msgs,
+                [
+                    "lat/lon have 1 positions outside latitude [-90, 90] or "
+                    "longitude [-180, 180]",
+                    "lat/lon have 1 positions at (0, 0)",
+                    "lat/lon imply 2 speeds above 10.0 m/s between "
+                    "consecutive fixes, up to 19.0 m/s, first reaching "
+                    "index 50",
+                ],
+            )
+
+        self.check.options = {"max_speed:20"}
+        self.check.setup(dataset)
+        self.assertEqual(
+            self.check.check_location_data(dataset).value,
+            (3, 5),
+        )
+
+    def test_profile_consistency(self):
+        """
+        Checks that profile times and positions are compared with the
+        records of each profile, including profiles split between blocks
+        """
+        dataset = Dataset("profiles", "w", diskless=True)
+        self.addCleanup(dataset.close)
+        dataset.createDimension("time", 300)
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "seconds since 1970-01-01T00:00:00Z"
+        time[:] = np.arange(300) * 10.0
+        lat = dataset.createVariable("lat", "f8", ("time",))
+        lat[:] = 40 + np.arange(300) * 1e-5
+        dataset.createVariable("lon", "f8", ("time",))[:] = -70.0
+        profile_id = dataset.createVariable(
+            "profile_id",
+            "i4",
+            ("time",),
+            fill_value=-999,
+        )
+        profile_id[:] = np.ma.masked_array(
+            np.repeat([1, 2, 3], 100),
+            mask=np.arange(300) % 100 < 5,
+        )
+        # profile times are given in minutes
+        profile_time = dataset.createVariable("profile_time", "f8", ("time",))
+        profile_time.units = "minutes since 1970-01-01T00:00:00Z"
+        profile_time[:] = np.repeat([8.0, 25.0, 55.0], 100)
+        profile_lat = dataset.createVariable("profile_lat", "f8", ("time",))
+        profile_lat[:] = np.repeat([40.0005, 40.0015, 41.0], 100)
+        dataset.createVariable("profile_lon", "f8", ("time",))[:] = -70.0
+
+        for options in (
+            None,
+            {"memory_budget:1K"},
+            {"memory_budget:1K", "read_ahead:2"},
+        ):
+            self.check.options = options
+            self.check.setup(dataset)
+            result = self.check.check_profile_consistency(dataset)
+            self.assertEqual(result.value, (0, 2))
+            self.assertEqual(
+                result.msgs,
+                [
+                    "profile_time of 1 profiles is outside the time range of "
+                    "their records, e.g. profile 3 at 3300.0, records from "
+                    "2050.0 to 2990.0",
+                    "profile_lat/profile_lon of 1 profiles are more than 5000 "
+                    "m from their fixes, e.g. profile 3 is 110863 m from the "
+                    "nearest fix and 110915 m from their mean position",
+                ],
+            )
+
+        # a single profile file with scalar profile variables
+        dataset = Dataset("profile", "w", diskless=True)
+        self.addCleanup(dataset.close)
+        dataset.createDimension("time", 10)
+        dataset.createVariable("time", "f8", ("time",))[:] = np.arange(10)
+        dataset.createVariable("lat", "f8", ("time",))[:] = 40.0
+        dataset.createVariable("lon", "f8", ("time",))[:] = -70.0
+        dataset.createVariable("profile_id", "i4", ()).assignValue(1)
+        for name, value in (
+            ("profile_time", 4.5),
+            ("profile_lat", 40.01),
+            ("profile_lon", -70.0),
+        ):
+            dataset.createVariable(name, "f8", ()).assignValue(value)
+        self.check.setup(dataset)
+        result = self.check.check_profile_consistency(dataset)
+        self.assertEqual(result.value, (2, 2))
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("dask")
+        and importlib.util.find_spec("xarray"),
+        "needs the optional dask and xarray packages",
+    )
+    def test_dask_backend(self):
+        """
+        Checks that the data checks give the same results as chunked Dask
+        reductions, for files and for lazily opened xarray datasets
+        """
+        import xarray as xr
+
+        data_checks = [
+            "check_monotonically_increasing_time",
+            "check_dim_no_data",
+            "check_depth_array",
+            "check_qc_flag_data",
+            "check_valid_range_data",
+        ]
+
+        def run(source, options):
+            self.check.options = options
+            results, errors = api.validate(
+                source,
+                checker=self.check,
+                include_checks=data_checks,
+            )
+            self.assertEqual(errors, {})
+            return [(r.name, r.value, r.msgs) for r in results]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "classic.nc")
+            write_classic(path, "NETCDF3_CLASSIC", size=1000)
+            with Dataset(path, "a") as dataset:
+                dataset.variables["depth_qc"].flag_values = np.int8(
+                    [0, 1, 2, 3, 4],
+                )
+            expected = run(path, None)
+            self.assertIsNone(self.check.data_backend)
+            self.assertEqual(len(expected), 5)
+
+            # the backends opened for files are closed when the run ends
+            with mock.patch.object(
+                lazy.DaskBackend,
+                "close",
+                autospec=True,
+                side_effect=lazy.DaskBackend.close,
+            ) as close:
+                self.assertEqual(run(path, {"backend:dask"}), expected)
+                self.assertEqual(close.call_count, 1)
+                self.assertEqual(
+                    run(
+                        path,
+                        {
+                            "backend:dask",
+                            "scheduler:synchronous",
+                            "memory_budget:1K",
+                        },
+                    ),
+                    expected,
+                )
+                self.assertEqual(close.call_count, 2)
+            self.assertIsNone(self.check.data_backend)
+
+            # sources which aren't files on disk are read through netCDF4
+            cdl_path = STATIC_FILES["glider_std3"]
+            self.assertEqual(
+                run(cdl_path, {"backend:dask"}),
+                run(cdl_path, None),
+            )
+            with open(path, "rb") as f:
+                self.assertEqual(run(f.read(), {"backend:dask"}), expected)
+
+            with xr.open_dataset(path, chunks={"time": 77}) as xr_dataset:
+                self.assertEqual(run(xr_dataset, None), expected)
+                # the backend of an xarray source is left open
+                self.assertEqual(xr_dataset["depth"].size, 1000)
+                with api.dataset_context(xr_dataset) as dataset:
+                    self.check.setup(dataset)
+                    self.assertEqual(
+                        self.check.data_backend.array("depth").chunks[0][0],
+                        77,
+                    )
+                    self.check.teardown()
+                self.assertEqual(xr_dataset["depth"].size, 1000)
+                np.testing.assert_array_equal(
+                    xr_dataset["time"].values,
+                    np.arange(1000),
+                )
+
+    def test_ndjson_stream(self):
+        """
+        Checks that batch results are streamed as one JSON line per file or
+        per check, and that unreadable files don't stop the stream
+        """
+        paths = [
+            STATIC_FILES["glider_std3"],
+            STATIC_FILES["bad_qc"],
+            "nonexistent.nc",
+        ]
+        stream = io.StringIO()
+        count = ndjson.write_ndjson(paths, stream, self.check)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(count, 3)
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([r["source"] for r in records], paths)
+        self.assertEqual(records[0]["errors"], {})
+        self.assertGreater(records[0]["possible_points"], 0)
+        self.assertIn("error", records[2])
+        global_attrs = [
+            result
+            for result in records[1]["results"]
+            if result["check"] == "check_global_attributes"
+        ]
+        self.assertEqual(
+            (global_attrs[0]["score"], global_attrs[0]["out_of"]),
+            (42, 64),
+        )
+
+        stream = io.StringIO()
+        ndjson.write_ndjson(
+            paths[:2],
+            stream,
+            self.check,
+            per_check=True,
+            include_checks=["check_dimensions", "check_qartod"],
+        )
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            [(r["source"], r["check"]) for r in records],
+            [
+                (paths[0], "check_dimensions"),
+                (paths[0], "check_qartod"),
+                (paths[1], "check_dimensions"),
+                (paths[1], "check_qartod"),
+            ],
+        )
+        self.assertEqual(records[2]["possible_points"], 2)
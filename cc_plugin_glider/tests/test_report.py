@@ -0,0 +1,95 @@
+"""
+cc_plugin_glider/tests/test_report.py
+"""
+
+import csv
+import os
+import tempfile
+import unittest
+
+from cc_plugin_glider import api, ndjson, report
+from cc_plugin_glider.tests.resources import STATIC_FILES, make_checker
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.check = make_checker()
+
+    def test_report(self):
+        """
+        Checks that batch reports have one row per check result, with the
+        template IDs of its failures
+        """
+        sources = [
+            STATIC_FILES["glider_std3"],
+            STATIC_FILES["bad_metadata"],
+            "missing.nc",
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "report.csv")
+            self.assertEqual(
+                report.write_report(
+                    sources,
+                    path,
+                    self.check,
+                    row_group_size=7,
+                ),
+                3,
+            )
+            with open(path, newline="", encoding="utf8") as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(tuple(rows[0]), report.COLUMNS)
+        for source in sources[:2]:
+            results, _ = api.validate(source, checker=self.check)
+            file_rows = [row for row in rows if row["source"] == source]
+            self.assertEqual(len(file_rows), len(results))
+            self.assertEqual(
+                [float(row["score"]) for row in file_rows],
+                [ndjson.result_value(r)[0] for r in results],
+            )
+        self.assertEqual(rows[0]["institution"], "RPS")
+        failures = {
+            (row["check"], template_id)
+            for row in rows
+            if row["source"] == sources[1]
+            for template_id in row["failures"].split()
+        }
+        self.assertIn(
+            ("check_global_attributes", "global_attribute_empty"),
+            failures,
+        )
+        self.assertEqual(rows[-1]["source"], "missing.nc")
+        self.assertIn("FileNotFoundError", rows[-1]["error"])
+
+        with self.assertRaises(ValueError):
+            report.report_format("report.xlsx", "xlsx")
+        self.assertEqual(report.report_format("report.arrow"), "arrow")
+
+    def test_parquet_report(self):
+        """
+        Checks that Parquet reports hold the same rows as CSV reports
+        """
+        import pyarrow.parquet as pq
+
+        source = STATIC_FILES["bad_metadata"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, "report.csv")
+            parquet_path = os.path.join(tmpdir, "report.parquet")
+            report.write_report([source], csv_path, self.check)
+            report.write_report(
+                [source],
+                parquet_path,
+                self.check,
+                row_group_size=10,
+            )
+            with open(csv_path, newline="", encoding="utf8") as f:
+                rows = list(csv.DictReader(f))
+            table = pq.read_table(parquet_path)
+            self.assertGreater(pq.ParquetFile(parquet_path).num_row_groups, 1)
+
+        self.assertEqual(table.num_rows, len(rows))
+        self.assertEqual(
+            table.column("failures").to_pylist(),
+            [row["failures"] for row in rows],
+        )
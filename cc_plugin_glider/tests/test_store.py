@@ -0,0 +1,106 @@
+"""
+cc_plugin_glider/tests/test_store.py
+"""
+
+import unittest
+
+from compliance_checker.base import BaseCheck, Result
+
+from cc_plugin_glider import api, ndjson, store, templates
+from cc_plugin_glider.tests.resources import STATIC_FILES, make_checker
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        self.check = make_checker()
+
+    def test_result_store(self):
+        """
+        Checks that the compact result store gives back the results and
+        records it was given
+        """
+        result_store = store.ResultStore()
+        expected = []
+        for name in ("glider_std", "bad_metadata", "bad_qc"):
+            results, errors = api.validate(
+                STATIC_FILES[name],
+                checker=self.check,
+            )
+            errors["check_broken"] = (ValueError("broken"), None)
+            self.assertEqual(
+                result_store.add(name, results, errors),
+                len(expected),
+            )
+            expected.append(
+                (results, ndjson.file_record(name, results, errors))
+            )
+
+        self.assertEqual(len(result_store), 3)
+        for index, (results, record) in enumerate(expected):
+            self.assertEqual(result_store.record(index), record)
+            self.assertEqual(
+                result_store.scores(index),
+                (record["scored_points"], record["possible_points"]),
+            )
+            self.assertEqual(
+                [
+                    (
+                        r.weight,
+                        r.value,
+                        r.name,
+                        r.msgs,
+                        list(map(templates.get_template_id, r.msgs)),
+                    )
+                    for r in result_store.results(index)
+                ],
+                [
+                    (
+                        r.weight,
+                        r.value,
+                        r.name,
+                        list(r.msgs),
+                        list(map(templates.get_template_id, r.msgs)),
+                    )
+                    for r in results
+                ],
+            )
+        self.assertEqual(
+            [record["source"] for record in result_store.iter_records()],
+            ["glider_std", "bad_metadata", "bad_qc"],
+        )
+        # repeated messages which differ only in their arguments share a
+        # template
+        self.assertLess(
+            len(result_store.templates),
+            sum(len(r.msgs) for results, _ in expected for r in results),
+        )
+        # messages are formatted again from their template and arguments,
+        # which keep their types
+        speed_store = store.ResultStore()
+        messages = [
+            templates.format_message(
+                "positions_too_fast",
+                lat_name="lat",
+                lon_name="lon",
+                count=3,
+                max_speed=max_speed,
+                fastest=12.25,
+                index=4,
+            )
+            for max_speed in (10, 10.0, 10.5)
+        ]
+        speed_store.add(
+            "speeds", [Result(BaseCheck.HIGH, False, msgs=messages)]
+        )
+        (rebuilt,) = speed_store.results(0)
+        self.assertEqual(rebuilt.msgs, messages)
+        self.assertEqual(
+            list(map(templates.get_template_id, rebuilt.msgs)),
+            ["positions_too_fast"] * 3,
+        )
+        self.assertEqual(len(speed_store.templates), 1)
+        message = "Variable depth has 12 values below -5.5e+03, e.g. at 4"
+        self.assertEqual(
+            store.join_message(*store.split_message(message)),
+            message,
+        )
@@ -0,0 +1,210 @@
+"""
+cc_plugin_glider/tests/test_tables.py
+"""
+
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests_mock
+from compliance_checker.tests.helpers import MockTimeSeries
+
+from cc_plugin_glider import tables
+from cc_plugin_glider.glider_dac import GliderCheck
+from cc_plugin_glider.tests.resources import (
+    DATA_DIR,
+    TABLE_FILES,
+    make_checker,
+    table_resources,
+)
+
+
+class TestTables(unittest.TestCase):
+    def setUp(self):
+        self.check = make_checker()
+
+    def test_table_providers(self):
+        """
+        Checks that the authority tables load the same through each provider
+        """
+        resources = table_resources()
+        memory = tables.MemoryProvider(resources)
+        checker = GliderCheck(table_provider=tables.FileProvider(TABLE_FILES))
+        self.assertEqual(checker.auth_tables, self.check.auth_tables)
+        self.assertEqual(checker.table_version, self.check.table_version)
+
+        # files fall back to the next provider
+        provider = tables.FileProvider(
+            {"ncei_iso": os.path.join(DATA_DIR, "missing.xml")},
+            memory,
+        )
+        with self.assertWarns(UserWarning):
+            self.assertEqual(
+                provider.fetch("ncei_iso"),
+                resources["ncei_iso"],
+            )
+        self.assertEqual(provider.fetch("sea_name"), resources["sea_name"])
+        with self.assertRaises(LookupError):
+            tables.FileProvider(TABLE_FILES).fetch("platform")
+        with self.assertWarns(UserWarning):
+            tables_without_sea_names = tables.load_tables(
+                tables.MemoryProvider({"ncei_iso": resources["ncei_iso"]}),
+            )
+        self.assertIsNone(tables_without_sea_names["sea_name"])
+
+        # snapshots are served when the provider fails, or while fresh
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = tables.SnapshotProvider(memory, directory)
+            self.assertEqual(
+                snapshot.fetch("sea_name"),
+                resources["sea_name"],
+            )
+            snapshot.provider = tables.MemoryProvider({})
+            with self.assertWarns(UserWarning):
+                self.assertEqual(
+                    snapshot.fetch("sea_name"),
+                    resources["sea_name"],
+                )
+            with self.assertRaises(LookupError):
+                snapshot.fetch("ncei_iso")
+            snapshot.max_age = 3600
+            with mock.patch.object(snapshot.provider, "fetch") as fetch:
+                snapshot.fetch("sea_name")
+            fetch.assert_not_called()
+
+            provider = tables.make_provider(
+                [f"table_cache:{directory}"],
+                {"SEA_NAME_TABLE": TABLE_FILES["sea_name"]},
+            )
+            self.assertEqual(
+                provider.paths,
+                {"sea_name": TABLE_FILES["sea_name"]},
+            )
+            self.assertIsInstance(provider.fallback, tables.SnapshotProvider)
+            self.assertEqual(provider.fallback.directory, directory)
+            http = provider.fallback.provider
+            self.assertIsInstance(http, tables.HTTPProvider)
+            self.assertEqual(
+                http.session.get_adapter(
+                    tables.URLS["sea_name"]
+                ).max_retries.total,
+                3,
+            )
+            provider.close()
+
+    def test_http_table_provider(self):
+        """
+        Checks that tables can be fetched from a local stand-in server, over
+        one session
+        """
+        handler = functools.partial(
+            http.server.SimpleHTTPRequestHandler,
+            directory=DATA_DIR,
+        )
+        handler.log_message = lambda *args: None
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        provider = tables.HTTPProvider(
+            urls={
+                "ncei_iso": f"{url}/ncei_metadata.xml",
+                "sea_name": f"{url}/seanames.xml",
+            },
+        )
+        self.addCleanup(provider.close)
+        checker = GliderCheck(table_provider=provider)
+        self.assertEqual(checker.auth_tables, self.check.auth_tables)
+        session = provider.session
+        self.assertEqual(
+            tables.load_tables(provider),
+            self.check.auth_tables,
+        )
+        self.assertIs(provider.session, session)
+
+        provider.urls["sea_name"] = f"{url}/missing.xml"
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(tables.load_tables(provider)["sea_name"])
+
+    def test_table_refresher(self):
+        """
+        Checks that authority tables are reloaded in the background and
+        swapped in whole, keeping the current tables when a reload fails
+        """
+        provider = tables.MemoryProvider(table_resources())
+        checker = GliderCheck(table_provider=provider)
+        self.assertIsInstance(checker.auth_tables["sea_name"], frozenset)
+        self.assertIsInstance(checker.auth_tables["institution"], tuple)
+        auth_tables = checker.auth_tables
+        version = checker.table_version
+        checker.close_matches("sea_name", "Gulf of Mexco")
+        index = checker._suggestion_indexes["sea_name"][1]
+
+        refresher = tables.TableRefresher(checker, interval=3600)
+        self.assertFalse(refresher.refresh())
+        self.assertIs(checker.auth_tables, auth_tables)
+        self.assertEqual(refresher.status()["table_version"], version)
+        self.assertLess(refresher.status()["age"], 60)
+
+        # new tables are swapped in whole, and indexes of them rebuilt
+        provider.resources["sea_name"] = (
+            b"<seanames><seaname><seaname>Gulf of Mexico</seaname>"
+            b"</seaname></seanames>"
+        )
+        self.assertTrue(refresher.refresh())
+        self.assertEqual(checker.auth_tables["sea_name"], {"Gulf of Mexico"})
+        self.assertNotEqual(checker.table_version, version)
+        checker.close_matches("sea_name", "Gulf of Mexco")
+        self.assertIsNot(checker._suggestion_indexes["sea_name"][1], index)
+        self.assertEqual(
+            checker.rule_set(MockTimeSeries()).global_attributes.vocabulary(
+                checker, "sea_name"
+            ),
+            {"gulf of mexico"},
+        )
+
+        # tables which fail to load are kept
+        sea_names = checker.auth_tables["sea_name"]
+        del provider.resources["sea_name"]
+        with self.assertWarns(UserWarning):
+            self.assertFalse(refresher.refresh())
+        self.assertIs(checker.auth_tables["sea_name"], sea_names)
+        checker.table_provider = tables.MemoryProvider({})
+        with self.assertWarns(UserWarning):
+            self.assertFalse(refresher.refresh())
+        self.assertIn("LookupError", refresher.status()["last_error"])
+        self.assertIs(checker.auth_tables["sea_name"], sea_names)
+
+        checker.table_provider = provider
+        refresher.interval = 0.01
+        with refresher:
+            for _ in range(500):
+                if refresher.last_error is None:
+                    break
+                threading.Event().wait(0.01)
+        self.assertIsNone(refresher.last_error)
+
+    def test_http_revalidation(self):
+        """
+        Checks that unchanged resources are revalidated with conditional
+        requests rather than fetched again
+        """
+        url = "http://tables.test/seanames.xml"
+        provider = tables.HTTPProvider(urls={"sea_name": url})
+        self.addCleanup(provider.close)
+        with requests_mock.Mocker() as mocker:
+            mocker.get(url, content=b"<seanames/>", headers={"ETag": '"1"'})
+            self.assertEqual(provider.fetch("sea_name"), b"<seanames/>")
+            mocker.get(url, status_code=304)
+            self.assertEqual(provider.fetch("sea_name"), b"<seanames/>")
+            self.assertEqual(
+                mocker.last_request.headers["If-None-Match"],
+                '"1"',
+            )
@@ -0,0 +1,116 @@
+"""
+cc_plugin_glider/tests/test_watch.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from cc_plugin_glider import api, ndjson, watch
+from cc_plugin_glider.tests.resources import make_checker
+from cc_plugin_glider.tests.test_classic import write_classic
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.check = make_checker()
+
+    def test_inotify_scanner(self):
+        """
+        Checks that the inotify scanner reports files closed after writing,
+        and files found by its polling scans once they are stable
+        """
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "glider.nc")
+        write_classic(path, "NETCDF3_CLASSIC", size=10)
+
+        def scanner(**kwargs):
+            try:
+                scanner = watch.InotifyScanner(tmpdir.name, **kwargs)
+            except OSError as e:
+                self.skipTest(str(e))
+            self.addCleanup(scanner.close)
+            return scanner
+
+        def ready(scanner, scans=1):
+            return [
+                ready_path
+                for _ in range(scans)
+                for ready_path, _ in scanner.scan(timeout=0.01)
+            ]
+
+        # files already there at start up need two stable polling scans,
+        # also when every scan is a full one
+        for full_scan_interval in (0, 600):
+            startup = scanner(full_scan_interval=full_scan_interval)
+            self.assertEqual(ready(startup), [])
+            self.assertEqual(ready(startup), [path])
+            self.assertEqual(ready(startup, scans=2), [])
+
+        # new files are ready as soon as they are closed, also in new
+        # directories
+        subdir = os.path.join(tmpdir.name, "deployment")
+        os.mkdir(subdir)
+        self.assertEqual(ready(startup), [])
+        new_path = os.path.join(subdir, "new.nc")
+        write_classic(new_path, "NETCDF3_CLASSIC", size=10)
+        self.assertEqual(ready(startup), [new_path])
+        self.assertEqual(ready(startup, scans=2), [])
+
+        # after an event queue overflow, files are reported once
+        write_classic(path, "NETCDF3_CLASSIC", size=20)
+        startup._needs_poll = True
+        self.assertEqual(ready(startup, scans=3), [path])
+
+    def test_watch_folder(self):
+        """
+        Checks that watched files are validated once their size and
+        modification time are stable, and only revalidated after changing
+        """
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        subdir = os.path.join(tmpdir.name, "deployment")
+        os.mkdir(subdir)
+        path = os.path.join(subdir, "glider.nc")
+        write_classic(path, "NETCDF3_CLASSIC", size=10)
+
+        def validate(source):
+            results, errors = api.validate(
+                source,
+                checker=self.check,
+                include_checks=["check_dimensions"],
+            )
+            return ndjson.file_record(source, results, errors)
+
+        scanner = watch.PollingScanner(tmpdir.name)
+        watcher = watch.Watcher(scanner, validate, watch.SidecarWriter())
+        self.addCleanup(watcher.stop)
+        # the first scan only records the file's size and modification time
+        self.assertEqual(watcher.poll(), 0)
+        self.assertEqual(watcher.poll(), 1)
+        watcher.join()
+        record = watch.read_sidecar(path)
+        self.assertEqual(record["source"], path)
+        self.assertEqual(record["possible_points"], 2)
+        # result files don't match the watched pattern
+        self.assertEqual(watcher.poll(), 0)
+        self.assertEqual(watcher.poll(), 0)
+
+        # a rewritten file is picked up again by the next full scan
+        write_classic(path, "NETCDF3_CLASSIC", size=20)
+        scanner.full_scan_interval = 0
+        self.assertEqual(watcher.poll(), 0)
+        self.assertEqual(watcher.poll(), 1)
+        watcher.join()
+        self.assertEqual(watcher.processed, 2)
+
+        # a restarted watcher skips files with current results
+        restarted = watch.Watcher(
+            watch.PollingScanner(tmpdir.name),
+            validate,
+            watch.SidecarWriter(),
+        )
+        self.addCleanup(restarted.stop)
+        restarted.poll()
+        self.assertEqual(restarted.poll(), 0)
@@ -2,13 +2,46 @@
 cc_plugin_glider/util.py
 """
 
+import contextlib
+import math
+import queue
+import threading
 from operator import eq
 
 import numpy as np
 from compliance_checker.cfunits import Unit
+from netCDF4 import date2num, default_fillvals, num2date
 
+from cc_plugin_glider import templates
 from cc_plugin_glider.required_var_attrs import required_var_attrs
 
+# number of values read at once by the streaming data checks
+DEFAULT_BLOCK_ELEMENTS = 2**22
+# bytes the streaming data checks may use for a block and its masks
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+_SIZE_SUFFIXES = {"k": 2**10, "m": 2**20, "g": 2**30}
+# mean Earth radius in metres
+EARTH_RADIUS = 6371008.8
+_TIME_UNIT_SECONDS = {
+    "s": 1,
+    "sec": 1,
+    "secs": 1,
+    "second": 1,
+    "seconds": 1,
+    "min": 60,
+    "mins": 60,
+    "minute": 60,
+    "minutes": 60,
+    "h": 3600,
+    "hr": 3600,
+    "hrs": 3600,
+    "hour": 3600,
+    "hours": 3600,
+    "d": 86400,
+    "day": 86400,
+    "days": 86400,
+}
+
 
 def compare_dtype(dt1, dt2):
     """
@@ -26,9 +59,12 @@ def compare_dtype(dt1, dt2):
     )
 
 
-def _check_dtype(dataset, var_name):
+def _check_dtype(dataset, var_name, var_attrs=None):
     """
     Convenience method to check a variable datatype validity
+
+    :param dict var_attrs: Variable names to their required attributes,
+                           defaults to required_var_attrs
     """
     score = 0
     out_of = 0
@@ -38,25 +74,30 @@ def _check_dtype(dataset, var_name):
         return (score, out_of, messages)
 
     var = dataset.variables[var_name]
-    var_dict = required_var_attrs.get(var_name, {})
+    if var_attrs is None:
+        var_attrs = required_var_attrs
+    var_dict = var_attrs.get(var_name, {})
     expected_dtype = var_dict.get("dtype", None)
     if expected_dtype is not None:
         out_of += 1
         score += 1
         if not compare_dtype(var.dtype, np.dtype(expected_dtype)):
             messages.append(
-                f"Variable {var_name} is expected to have a dtype of "
-                f"{expected_dtype}, instead has a dtype of {var.dtype}"
-                "",
+                templates.format_message(
+                    "dtype",
+                    var_name=var_name,
+                    expected=expected_dtype,
+                    dtype=var.dtype,
+                ),
             )
             score -= 1
     # check that the fill value is of the expected dtype as well
     if hasattr(var, "_FillValue") and hasattr(var._FillValue, "dtype"):
         if not compare_dtype(var.dtype, var._FillValue.dtype):
             messages.append(
-                f"Variable {var_name} _FillValue dtype does not "
-                "match variable dtype"
-                "",
+                templates.format_message(
+                    "fill_value_dtype", var_name=var_name
+                ),
             )
             out_of += 1
 
@@ -68,10 +109,14 @@ def _check_variable_attrs(
     var_name,
     required_attributes=None,
     options=None,
+    var_attrs=None,
 ):
     """
     Convenience method to check a variable attributes based on the
     expected_vars dict
+
+    :param dict var_attrs: Variable names to their required attributes,
+                           defaults to required_var_attrs
     """
     score = 0
     out_of = 0
@@ -83,15 +128,20 @@ def _check_variable_attrs(
     var = dataset.variables[var_name]
 
     # Get the expected attrs to check
-    check_attrs = required_attributes or required_var_attrs.get(var_name, {})
+    if var_attrs is None:
+        var_attrs = required_var_attrs
+    check_attrs = required_attributes or var_attrs.get(var_name, {})
     ignore_attributes = _get_option("ignore_attributes", options)
 
     if ignore_attributes is not None:
-        for attr in ignore_attributes:
-            if attr in check_attrs:
-                del check_attrs[attr]
+        # filter a copy, the rules are shared between checkers
+        check_attrs = {
+            attr: value
+            for attr, value in check_attrs.items()
+            if attr not in ignore_attributes
+        }
 
-    var_attrs = set(var.ncattrs())
+    present_attrs = set(var.ncattrs())
     for attr in check_attrs:
         if attr == "dtype":
             # dtype check is special, see above
@@ -99,9 +149,13 @@ def _check_variable_attrs(
         out_of += 1
         score += 1
         # Check if the attribute is present
-        if attr not in var_attrs:
+        if attr not in present_attrs:
             messages.append(
-                f"Variable {var_name} must contain attribute: {attr}",
+                templates.format_message(
+                    "attribute_missing",
+                    var_name=var_name,
+                    attr=attr,
+                ),
             )
             score -= 1
             continue
@@ -111,22 +165,29 @@ def _check_variable_attrs(
             if getattr(var, attr) != check_attrs[attr]:
                 # No match, this may be an error, but first an exception for units
                 if attr == "units":
-                    msg = (
-                        f"Variable {var_name} units attribute must be "
-                        f"convertible to {check_attrs[attr]}"
-                    )
                     try:
                         cur_unit = Unit(var.units)
                         comp_unit = Unit(check_attrs[attr])
-                        if not cur_unit.is_convertible(comp_unit):
-                            messages.append(msg)
-                            score -= 1
+                        convertible = cur_unit.is_convertible(comp_unit)
                     except ValueError:
-                        messages.append(msg)
+                        convertible = False
+                    if not convertible:
+                        messages.append(
+                            templates.format_message(
+                                "units_not_convertible",
+                                var_name=var_name,
+                                units=check_attrs[attr],
+                            ),
+                        )
                         score -= 1
                 else:
                     messages.append(
-                        f"Variable {var_name} attribute {attr} must be {check_attrs[attr]}",
+                        templates.format_message(
+                            "attribute_value",
+                            var_name=var_name,
+                            attr=attr,
+                            value=check_attrs[attr],
+                        ),
                     )
                     score -= 1
         else:
@@ -136,7 +197,11 @@ def _check_variable_attrs(
                 att_strip = getattr(var, attr).strip()
                 if not att_strip:
                     messages.append(
-                        f"Variable {var_name} attribute {attr} is empty",
+                        templates.format_message(
+                            "attribute_empty",
+                            var_name=var_name,
+                            attr=attr,
+                        ),
                     )
                     score -= 1
             except AttributeError:
@@ -145,6 +210,41 @@ def _check_variable_attrs(
     return (score, out_of, messages)
 
 
+class AttributeIndex:
+    """
+    A reverse index from variable attribute names to the variables which have
+    them, built with one pass over a dataset's variables.  Checks resolving
+    references between variables, e.g. ``instrument`` or
+    ``ancillary_variables``, look them up here instead of each scanning every
+    variable's attributes.  Only attribute names are read up front, values
+    are read the first time an attribute is looked up.
+    """
+
+    def __init__(self, dataset):
+        self._variables = dataset.variables
+        self._names = {}
+        self._values = {}
+        for var_name, ncvar in dataset.variables.items():
+            for attr in ncvar.ncattrs():
+                self._names.setdefault(attr, []).append(var_name)
+
+    def __contains__(self, attr):
+        return attr in self._names
+
+    def variables(self, attr):
+        """
+        Returns a dict of the names of the variables with an attribute to
+        their values of it, in the dataset's variable order
+        """
+        values = self._values.get(attr)
+        if values is None:
+            values = self._values[attr] = {
+                var_name: self._variables[var_name].getncattr(attr)
+                for var_name in self._names.get(attr, ())
+            }
+        return values
+
+
 def _have_option(needle, option_haystack):
     """
     Helper function to determine if a user requested a specific
@@ -191,3 +291,578 @@ def _get_option(needle, option_haystack):
             return straw.split(":")[1].split(",")
 
     return None
+
+
+@contextlib.contextmanager
+def raw_values(variable):
+    """
+    Temporarily turns off netCDF4's automatic masking and scaling so that
+    slices of the variable return the values stored in the file.  Objects
+    other than netCDF4 Variables, e.g. numpy arrays, are passed through.
+    """
+    if not hasattr(variable, "set_auto_maskandscale"):
+        yield variable
+        return
+    mask, scale = variable.mask, variable.scale
+    variable.set_auto_maskandscale(False)
+    try:
+        yield variable
+    finally:
+        variable.set_auto_mask(mask)
+        variable.set_auto_scale(scale)
+
+
+def parse_size(size):
+    """
+    Parses a number of bytes such as ``65536``, ``64M`` or ``1G``
+    """
+    size = str(size).strip().lower().removesuffix("b")
+    multiplier = _SIZE_SUFFIXES.get(size[-1:], 1)
+    if size[-1:] in _SIZE_SUFFIXES:
+        size = size[:-1]
+    return int(float(size) * multiplier)
+
+
+def block_elements(dtype, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Returns how many values of a dtype can be read at once within a memory
+    budget, allowing for the boolean masks built alongside each block
+    """
+    return max(1, int(memory_budget) // (np.dtype(dtype).itemsize + 4))
+
+
+def fill_value(variable):
+    """
+    Returns a variable's _FillValue, or the netCDF default fill value which
+    unwritten values read as when it has none
+    """
+    dtype = np.dtype(variable.dtype)
+    return getattr(
+        variable,
+        "_FillValue",
+        default_fillvals.get(f"{dtype.kind}{dtype.itemsize}"),
+    )
+
+
+def missing_values(variable):
+    """
+    Returns an array of a variable's fill value and missing values
+    """
+    values = [
+        np.atleast_1d(value).ravel()
+        for value in (
+            fill_value(variable),
+            getattr(variable, "missing_value", None),
+        )
+        if value is not None and not isinstance(value, str)
+    ]
+    return np.concatenate(values) if values else np.array([])
+
+
+def _numeric_attribute(value):
+    if value is None or isinstance(value, str):
+        return None
+    value = np.atleast_1d(value)
+    if value.dtype.kind not in "iuf" or value.size == 0:
+        return None
+    return value
+
+
+def valid_bounds(variable):
+    """
+    Returns a variable's (valid_min, valid_max), taken from valid_range when
+    it is present.  Either is None when not defined or not numeric.
+    """
+    valid_range = _numeric_attribute(getattr(variable, "valid_range", None))
+    if valid_range is not None and valid_range.size == 2:
+        return valid_range[0], valid_range[1]
+    bounds = []
+    for attr in ("valid_min", "valid_max"):
+        value = _numeric_attribute(getattr(variable, attr, None))
+        bounds.append(None if value is None else value[0])
+    return tuple(bounds)
+
+
+def chunk_rows(variable):
+    """
+    Returns the length along the first dimension of a variable's HDF5
+    chunks, or None if it is contiguous or not a netCDF4 Variable
+    """
+    chunking = getattr(variable, "chunking", None)
+    if not callable(chunking):
+        return None
+    chunks = chunking()
+    if isinstance(chunks, str) or not chunks:
+        return None
+    return int(chunks[0])
+
+
+def block_rows(variables, block_elements=DEFAULT_BLOCK_ELEMENTS):
+    """
+    Returns how many rows along the first dimension to read at once from
+    variables read in step: about `block_elements` values of the widest
+    variable, rounded down to whole chunks of the chunked ones so that no
+    chunk is read and decompressed for two blocks.  A block is at least one
+    chunk, even if that is over `block_elements`.
+    """
+    step = None
+    chunks = []
+    for variable in variables:
+        shape = variable.shape
+        if not shape:
+            continue
+        row_elements = int(np.prod(shape[1:], dtype=np.int64)) or 1
+        rows = max(1, block_elements // row_elements)
+        step = rows if step is None else min(step, rows)
+        rows = chunk_rows(variable)
+        if rows:
+            chunks.append(rows)
+    if step is None:
+        return max(1, block_elements)
+    if not chunks:
+        return step
+    aligned = math.lcm(*chunks)
+    if aligned > step:
+        # chunks of different lengths only line up far apart, so align to
+        # the longest instead
+        aligned = max(chunks)
+    return max(aligned, step - step % aligned)
+
+
+def iter_blocks(variable, block_elements=DEFAULT_BLOCK_ELEMENTS, rows=None):
+    """
+    Yields a variable's data in contiguous blocks along its first dimension,
+    each holding about `block_elements` values, so that large variables can
+    be checked without reading them into memory at once.  Blocks are
+    aligned to the variable's chunks, see `block_rows`, unless `rows` sets
+    the rows per block, e.g. to read several variables in step.
+    """
+    shape = variable.shape
+    if not shape:
+        yield np.asarray(variable[...])
+        return
+    if rows is None:
+        rows = block_rows([variable], block_elements)
+    for start in range(0, shape[0], rows):
+        yield variable[start : start + rows]
+
+
+_END = object()
+
+
+def read_ahead(blocks, depth=1):
+    """
+    Yields the items of an iterator of blocks, reading up to `depth` blocks
+    ahead on a background thread while the caller works on the current one.
+    The netCDF library isn't thread-safe, so nothing else may read the
+    dataset until the blocks are exhausted or the generator is closed.  With
+    a depth of 0 the blocks are read in the calling thread.
+    """
+    if depth <= 0:
+        yield from blocks
+        return
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.05)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def produce():
+        try:
+            for block in blocks:
+                if not put((block, None)):
+                    return
+            put((_END, None))
+        except BaseException as e:
+            put((_END, e))
+        finally:
+            close = getattr(blocks, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(
+        target=produce,
+        name="glider-read-ahead",
+        daemon=True,
+    )
+    thread.start()
+    try:
+        while True:
+            block, error = ready.get()
+            if block is _END:
+                if error is not None:
+                    raise error
+                return
+            yield block
+    finally:
+        stop.set()
+        # the producer may still be reading, wait for it before the caller
+        # touches the dataset again
+        thread.join()
+
+
+def count_invalid_values(blocks, allowed):
+    """
+    Counts the values in a sequence of arrays which aren't in `allowed`.
+    Single byte data, such as QC flags, is counted with one bincount over
+    the whole 256 value domain per block, wider types with a vectorized
+    membership test.
+
+    :return: A dict of each invalid value and the number of times it occurs,
+             sorted by value
+    """
+    allowed = np.asarray(allowed)
+    allow_nan = allowed.dtype.kind == "f" and bool(np.isnan(allowed).any())
+    counts = None
+    byte_dtype = None
+    invalid = {}
+    for block in blocks:
+        block = np.ma.getdata(block).ravel()
+        if block.dtype.itemsize == 1 and block.dtype.kind in "iu":
+            byte_dtype = block.dtype
+            block_counts = np.bincount(block.view(np.uint8), minlength=256)
+            counts = block_counts if counts is None else counts + block_counts
+            continue
+        valid = np.isin(block, allowed)
+        if allow_nan and block.dtype.kind == "f":
+            valid |= np.isnan(block)
+        bad = block[~valid]
+        if bad.size:
+            values, value_counts = np.unique(bad, return_counts=True)
+            for value, count in zip(values.tolist(), value_counts.tolist()):
+                invalid[value] = invalid.get(value, 0) + count
+    if counts is not None:
+        # bincount indexes are the unsigned bytes, map them back to values
+        domain = np.arange(256, dtype=np.uint8).view(byte_dtype)
+        counts[np.isin(domain, allowed)] = 0
+        for index in np.flatnonzero(counts):
+            value = domain[index].item()
+            invalid[value] = invalid.get(value, 0) + int(counts[index])
+    return dict(sorted(invalid.items()))
+
+
+def count_out_of_range(
+    blocks,
+    valid_min=None,
+    valid_max=None,
+    missing=(),
+    max_indices=5,
+):
+    """
+    Counts the values in a sequence of blocks, read consecutively along the
+    first dimension, which are below `valid_min` or above `valid_max`.
+    Values in `missing` and NaNs are skipped.
+
+    :return: A tuple of the number of values below the minimum, the number
+             above the maximum, and the indices of the first `max_indices`
+             offending values (integers for 1-D data, tuples otherwise)
+    """
+    missing = np.asarray(missing)
+    below = 0
+    above = 0
+    indices = []
+    offset = 0
+    for block in blocks:
+        block = np.atleast_1d(np.ma.getdata(block))
+        skip = np.zeros(block.shape, dtype=bool)
+        if missing.size:
+            skip |= np.isin(block, missing)
+        if block.dtype.kind == "f":
+            skip |= np.isnan(block)
+        bad = np.zeros(block.shape, dtype=bool)
+        if valid_min is not None:
+            low = (block < valid_min) & ~skip
+            below += int(np.count_nonzero(low))
+            bad |= low
+        if valid_max is not None:
+            high = (block > valid_max) & ~skip
+            above += int(np.count_nonzero(high))
+            bad |= high
+        if len(indices) < max_indices:
+            first = np.flatnonzero(bad)[: max_indices - len(indices)]
+            coords = np.unravel_index(first, block.shape)
+            coords = (coords[0] + offset, *coords[1:])
+            if block.ndim == 1:
+                indices.extend(coords[0].tolist())
+            else:
+                indices.extend(zip(*(c.tolist() for c in coords)))
+        offset += block.shape[0]
+    return below, above, indices
+
+
+def time_unit_seconds(units):
+    """
+    Returns the length in seconds of the unit of a CF time units string,
+    e.g. 60 for ``minutes since 1970-01-01``, or None if it isn't known
+    """
+    if not isinstance(units, str) or " since " not in units:
+        return None
+    return _TIME_UNIT_SECONDS.get(units.split(" since ")[0].strip().lower())
+
+
+def time_conversion(from_units, to_units, calendar="standard"):
+    """
+    Returns the (scale, offset) converting times in `from_units` to
+    `to_units`, e.g. ``("days since 2000-01-01", "seconds since
+    1970-01-01")``.  Returns None if either isn't a CF time unit.
+    """
+    if from_units == to_units:
+        return (1.0, 0.0)
+    if not (isinstance(from_units, str) and isinstance(to_units, str)):
+        return None
+    try:
+        offset = date2num(
+            num2date(0, from_units, calendar), to_units, calendar
+        )
+        scale = (
+            date2num(num2date(1, from_units, calendar), to_units, calendar)
+            - offset
+        )
+    except (ValueError, TypeError):
+        return None
+    return (float(scale), float(offset))
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Returns the great circle distances in metres between arrays of points
+    given in degrees
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(value) for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _valid_mask(block, missing):
+    valid = np.ones(block.shape, dtype=bool)
+    if missing.size:
+        valid &= ~np.isin(block, missing)
+    if block.dtype.kind == "f":
+        valid &= np.isfinite(block)
+    return valid
+
+
+def scan_positions(
+    blocks,
+    lat_missing=(),
+    lon_missing=(),
+    time_missing=(),
+    time_scale=1,
+    max_speed=None,
+    null_island_tolerance=1e-4,
+):
+    """
+    Streams (lat, lon, time) blocks of consecutive positions, where time may
+    be None, and gathers location sanity statistics: positions outside
+    [-90, 90] latitude or [-180, 180] longitude, positions at (0, 0), and
+    speeds above `max_speed` m/s implied by consecutive valid fixes.  The
+    last fix of each block is carried over so no pair is missed at block
+    boundaries.
+
+    :param float time_scale: Seconds per time unit
+    :return: A dict with ``out_of_range``, ``null_island``, ``fast``,
+             ``max_speed`` and ``first_fast`` (the index of the first fix
+             reached too fast, or None)
+    """
+    lat_missing, lon_missing, time_missing = (
+        np.asarray(values)
+        for values in (lat_missing, lon_missing, time_missing)
+    )
+    stats = {
+        "out_of_range": 0,
+        "null_island": 0,
+        "fast": 0,
+        "max_speed": 0.0,
+        "first_fast": None,
+    }
+    last = None
+    offset = 0
+    for lat, lon, time in blocks:
+        lat = np.atleast_1d(np.ma.getdata(lat)).ravel()
+        lon = np.atleast_1d(np.ma.getdata(lon)).ravel()
+        valid = _valid_mask(lat, lat_missing) & _valid_mask(lon, lon_missing)
+        lat = lat.astype(np.float64)
+        lon = lon.astype(np.float64)
+        in_range = valid & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        stats["out_of_range"] += int(np.count_nonzero(valid & ~in_range))
+        null_island = (
+            in_range
+            & (np.abs(lat) <= null_island_tolerance)
+            & (np.abs(lon) <= null_island_tolerance)
+        )
+        stats["null_island"] += int(np.count_nonzero(null_island))
+
+        if time is not None and max_speed is not None:
+            time = np.atleast_1d(np.ma.getdata(time)).ravel()
+            fixes = np.flatnonzero(
+                in_range & ~null_island & _valid_mask(time, time_missing),
+            )
+            fix_lat = lat[fixes]
+            fix_lon = lon[fixes]
+            fix_time = time[fixes].astype(np.float64) * time_scale
+            fix_index = fixes + offset
+            if last is not None:
+                fix_lat, fix_lon, fix_time, fix_index = (
+                    np.concatenate(([previous], current))
+                    for previous, current in zip(
+                        last,
+                        (fix_lat, fix_lon, fix_time, fix_index),
+                    )
+                )
+            if fix_lat.size:
+                last = (fix_lat[-1], fix_lon[-1], fix_time[-1], fix_index[-1])
+            if fix_lat.size > 1:
+                distance = haversine(
+                    fix_lat[:-1],
+                    fix_lon[:-1],
+                    fix_lat[1:],
+                    fix_lon[1:],
+                )
+                elapsed = np.diff(fix_time)
+                # repeated or decreasing times are left to the time checks
+                moving = elapsed > 0
+                speed = distance[moving] / elapsed[moving]
+                fast = speed > max_speed
+                stats["fast"] += int(np.count_nonzero(fast))
+                if speed.size:
+                    stats["max_speed"] = max(
+                        stats["max_speed"],
+                        float(speed.max()),
+                    )
+                if stats["first_fast"] is None and fast.any():
+                    stats["first_fast"] = int(
+                        fix_index[1:][moving][np.argmax(fast)],
+                    )
+        offset += lat.size
+    return stats
+
+
+def to_float(block, missing=()):
+    """
+    Returns a block as float64 values with missing values replaced by NaN
+    """
+    block = np.atleast_1d(np.ma.getdata(block)).ravel()
+    values = block.astype(np.float64)
+    missing = np.asarray(missing)
+    if missing.size:
+        values[np.isin(block, missing)] = np.nan
+    return values
+
+
+# per profile statistics gathered by scan_profiles
+_PROFILE_FIELDS = (
+    "profile",
+    "time_min",
+    "time_max",
+    "lat_sum",
+    "lon_sum",
+    "fixes",
+    "nearest",
+    "profile_time",
+    "profile_lat",
+    "profile_lon",
+)
+
+
+def scan_profiles(blocks):
+    """
+    Streams blocks of consecutive records and summarizes each profile,
+    found as a run of records with the same profile key.  Each block is a
+    tuple of equal length float arrays, with missing values as NaN:
+    ``(key, time, lat, lon, profile_time, profile_lat, profile_lon)``.
+    Records without a key are ignored.  Runs are reduced with one
+    ``reduceat`` per statistic, and a run continuing past the end of a block
+    is merged with its continuation, so the scan is linear in the number of
+    records.
+
+    :return: A dict of arrays, one value per profile: the ``profile`` key,
+             ``time_min`` and ``time_max`` of its records, ``mean_lat`` and
+             ``mean_lon`` of its fixes, the distance in metres from the
+             profile position to the ``nearest`` fix and to the ``mean``
+             position, and its ``profile_time``, ``profile_lat`` and
+             ``profile_lon``
+    """
+    profiles = []
+    for block in blocks:
+        key, time, lat, lon, profile_time, profile_lat, profile_lon = (
+            np.broadcast_arrays(*block)
+        )
+        keep = ~np.isnan(key)
+        if not keep.all():
+            key, time, lat, lon, profile_time, profile_lat, profile_lon = (
+                values[keep]
+                for values in (
+                    key,
+                    time,
+                    lat,
+                    lon,
+                    profile_time,
+                    profile_lat,
+                    profile_lon,
+                )
+            )
+        if not key.size:
+            continue
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+        fix = ~(np.isnan(lat) | np.isnan(lon))
+        with np.errstate(invalid="ignore"):
+            distance = haversine(lat, lon, profile_lat, profile_lon)
+        runs = zip(
+            key[starts],
+            np.fmin.reduceat(time, starts),
+            np.fmax.reduceat(time, starts),
+            np.add.reduceat(np.where(fix, lat, 0), starts),
+            np.add.reduceat(np.where(fix, lon, 0), starts),
+            np.add.reduceat(fix.astype(np.int64), starts),
+            np.fmin.reduceat(distance, starts),
+            np.fmax.reduceat(profile_time, starts),
+            np.fmax.reduceat(profile_lat, starts),
+            np.fmax.reduceat(profile_lon, starts),
+        )
+        for run in runs:
+            if profiles and profiles[-1][0] == run[0]:
+                previous = profiles[-1]
+                profiles[-1] = (
+                    run[0],
+                    np.fmin(previous[1], run[1]),
+                    np.fmax(previous[2], run[2]),
+                    previous[3] + run[3],
+                    previous[4] + run[4],
+                    previous[5] + run[5],
+                    np.fmin(previous[6], run[6]),
+                    np.fmax(previous[7], run[7]),
+                    np.fmax(previous[8], run[8]),
+                    np.fmax(previous[9], run[9]),
+                )
+            else:
+                profiles.append(run)
+
+    stats = {
+        field: np.array(values, dtype=np.float64)
+        for field, values in zip(
+            _PROFILE_FIELDS,
+            zip(*profiles) if profiles else [()] * len(_PROFILE_FIELDS),
+        )
+    }
+    fixes = stats.pop("fixes")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats["mean_lat"] = stats.pop("lat_sum") / fixes
+        stats["mean_lon"] = stats.pop("lon_sum") / fixes
+        stats["mean"] = haversine(
+            stats["profile_lat"],
+            stats["profile_lon"],
+            stats["mean_lat"],
+            stats["mean_lon"],
+        )
+    return stats
@@ -0,0 +1,483 @@
+"""
+cc_plugin_glider/watch.py
+
+Watch-folder ingestion.
+
+Watches deployment directories for new or changed files, queues them once
+their size and modification time have stopped changing, validates them with
+a pool of workers and writes the results next to each file or to a single
+result store.
+
+Directories are only re-listed when their modification time changes, so a
+directory holding tens of thousands of already validated files costs one
+stat per scan.  Files rewritten in place don't change their directory's
+modification time, so a full rescan is also made every `full_scan_interval`
+seconds.  On Linux, inotify is used when available so finished uploads are
+picked up as soon as they are closed.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import json
+import os
+import queue
+import select
+import struct
+import threading
+import time
+
+from cc_plugin_glider import ndjson
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+
+
+def _signature(stat_result):
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class PollingScanner:
+    """
+    Finds files matching `patterns` under `root` whose size and modification
+    time were unchanged between two consecutive scans.
+
+    :param str root: Directory to watch
+    :param patterns: Shell style file name patterns to watch
+    :param bool recursive: Also watch subdirectories
+    :param float full_scan_interval: Seconds between full rescans which
+                                     catch files rewritten in place
+    """
+
+    def __init__(
+        self,
+        root,
+        patterns=("*.nc",),
+        recursive=True,
+        full_scan_interval=600,
+    ):
+        self.root = os.path.abspath(root)
+        self.patterns = tuple(patterns)
+        self.recursive = recursive
+        self.full_scan_interval = full_scan_interval
+        self._last_full_scan = None
+        # directory -> (mtime_ns, subdirectories, matching files)
+        self._dirs = {}
+        # file -> signature seen on the previous scan, while not yet stable
+        self._pending = {}
+        # file -> signature which was last handed out as ready
+        self._done = {}
+
+    def matches(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def _list_dir(self, path, full):
+        """
+        Returns the subdirectories and matching files of a directory, only
+        reading the directory when it changed since the last scan
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._dirs.pop(path, None)
+            return [], []
+        cached = self._dirs.get(path)
+        if cached is not None and cached[0] == mtime and not full:
+            return cached[1], []
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and self.matches(entry.name):
+                        files.append(entry.path)
+        except OSError:
+            return [], []
+        if cached is not None:
+            # forget files which have been removed
+            for removed in set(cached[2]).difference(files):
+                self._pending.pop(removed, None)
+                self._done.pop(removed, None)
+        self._dirs[path] = (mtime, subdirs, files)
+        return subdirs, files
+
+    def scan(self):
+        """
+        Scans for changes and returns the list of files which are ready to
+        be validated
+        """
+        now = time.monotonic()
+        full = (
+            self._last_full_scan is None
+            or now - self._last_full_scan >= self.full_scan_interval
+        )
+        if full:
+            self._last_full_scan = now
+
+        # new and changed files become candidates, awaiting stability
+        stack = [self.root]
+        while stack:
+            subdirs, files = self._list_dir(stack.pop(), full)
+            stack.extend(subdirs)
+            for path in files:
+                if path not in self._pending:
+                    self._pending[path] = None
+
+        ready = []
+        for path, previous in list(self._pending.items()):
+            try:
+                signature = _signature(os.stat(path))
+            except OSError:
+                del self._pending[path]
+                continue
+            if signature == self._done.get(path):
+                del self._pending[path]
+            elif signature == previous:
+                del self._pending[path]
+                self._done[path] = signature
+                ready.append((path, signature))
+            else:
+                self._pending[path] = signature
+        return ready
+
+    def close(self):
+        pass
+
+
+class InotifyScanner(PollingScanner):
+    """
+    A scanner which reacts to inotify events, reporting files as ready as
+    soon as they are closed after writing or moved into place.  Polling
+    scans are still used at start up, after an event queue overflow, and for
+    the periodic full rescan.
+
+    :raises OSError: if inotify isn't available
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_Q_OVERFLOW
+
+    def __init__(self, root, *args, **kwargs):
+        super().__init__(root, *args, **kwargs)
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+        self._needs_poll = True
+        self._last_poll = None
+        try:
+            self._add_watches(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watches(self, top):
+        for path, dirnames, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(path),
+                self.MASK,
+            )
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch {path}")
+            self._watches[wd] = path
+            if not self.recursive:
+                dirnames.clear()
+
+    def scan(self, timeout=1.0):
+        """
+        Waits up to `timeout` seconds for events and returns the files which
+        are ready to be validated.  Files found by a polling scan which
+        aren't closed in the meantime are ready once they are unchanged on
+        the next polling scan, at least `timeout` seconds later.
+        """
+        poll = self._needs_poll or (
+            time.monotonic() - self._last_full_scan >= self.full_scan_interval
+        )
+        ready = []
+        if not poll:
+            ready = self._read_events(timeout)
+            poll = self._needs_poll or bool(
+                self._pending
+                and time.monotonic() - self._last_poll >= timeout,
+            )
+        if poll:
+            self._needs_poll = False
+            self._last_poll = time.monotonic()
+            ready.extend(super().scan())
+        return ready
+
+    def _read_events(self, timeout):
+        """
+        Waits up to `timeout` seconds for events and returns the files
+        which were closed after writing or moved into place
+        """
+        ready = []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return ready
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return ready
+        pos = 0
+        while pos + _EVENT.size <= len(buf):
+            wd, mask, _, length = _EVENT.unpack_from(buf, pos)
+            name = buf[pos + _EVENT.size : pos + _EVENT.size + length]
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                self._needs_poll = True
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name.rstrip(b"\0")))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+                    try:
+                        self._add_watches(path)
+                    except OSError:
+                        self._needs_poll = True
+                continue
+            if not mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                continue
+            if not self.matches(os.path.basename(path)):
+                continue
+            try:
+                signature = _signature(os.stat(path))
+            except OSError:
+                continue
+            if self._done.get(path) != signature:
+                self._done[path] = signature
+                ready.append((path, signature))
+        return ready
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_scanner(root, use_inotify=True, **kwargs):
+    """
+    Returns an InotifyScanner when possible, otherwise a PollingScanner
+    """
+    if use_inotify:
+        try:
+            return InotifyScanner(root, **kwargs)
+        except (OSError, AttributeError):
+            pass
+    return PollingScanner(root, **kwargs)
+
+
+class SidecarWriter:
+    """
+    Writes each file's results as JSON next to it, e.g.
+    ``ru29-20150318T0312.nc.gliderdac.json``
+    """
+
+    def __init__(self, suffix=".gliderdac.json"):
+        self.suffix = suffix
+
+    def write(self, path, record):
+        result_path = f"{path}{self.suffix}"
+        tmp_path = f"{result_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as result_file:
+            result_file.write(ndjson.dumps(record))
+        os.replace(tmp_path, result_path)
+
+    def is_current(self, path):
+        """
+        Returns True if the file already has results newer than itself, so
+        restarting a watcher doesn't revalidate everything
+        """
+        try:
+            return (
+                os.stat(f"{path}{self.suffix}").st_mtime_ns
+                >= os.stat(path).st_mtime_ns
+            )
+        except OSError:
+            return False
+
+
+class NDJSONWriter:
+    """
+    Appends each file's results as a line to a single NDJSON result store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, path, record):
+        line = ndjson.dumps(record) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as store:
+            store.write(line)
+
+    def is_current(self, path):
+        return False
+
+
+class Watcher:
+    """
+    Connects a scanner to a bounded queue of files and a pool of threads
+    which validate them and write the results.
+
+    :param scanner: A PollingScanner or InotifyScanner
+    :param validate: Callable taking a path and returning a result record,
+                     e.g. ``ValidationService.validate``
+    :param writer: A SidecarWriter or NDJSONWriter
+    :param int workers: Number of validation threads
+    :param int queue_size: Maximum number of files waiting to be validated,
+                           scanning pauses while the queue is full
+    :param float interval: Seconds between polling scans
+    """
+
+    def __init__(
+        self,
+        scanner,
+        validate,
+        writer,
+        workers=2,
+        queue_size=1000,
+        interval=10.0,
+    ):
+        self.scanner = scanner
+        self.validate = validate
+        self.writer = writer
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            path = self.queue.get()
+            try:
+                if path is None:
+                    return
+                try:
+                    record = self.validate(path)
+                except Exception as e:
+                    record = {
+                        "source": path,
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                    with self._stats_lock:
+                        self.failed += 1
+                try:
+                    self.writer.write(path, record)
+                except OSError:
+                    with self._stats_lock:
+                        self.failed += 1
+                with self._stats_lock:
+                    self.processed += 1
+            finally:
+                self.queue.task_done()
+
+    def poll(self):
+        """
+        Runs one scan and queues the ready files, blocking while the queue
+        is full.
+
+        :return: The number of files queued
+        """
+        if isinstance(self.scanner, InotifyScanner):
+            ready = self.scanner.scan(timeout=self.interval)
+        else:
+            ready = self.scanner.scan()
+        queued = 0
+        for path, _ in ready:
+            if self.writer.is_current(path):
+                continue
+            self.queue.put(path)
+            queued += 1
+        return queued
+
+    def run(self):
+        """
+        Watches until `stop` is called
+        """
+        while not self._stop.is_set():
+            self.poll()
+            if not isinstance(self.scanner, InotifyScanner):
+                self._stop.wait(self.interval)
+
+    def join(self):
+        """
+        Waits until every queued file has been validated
+        """
+        self.queue.join()
+
+    def stop(self):
+        """
+        Stops watching and shuts down the worker threads once the queue has
+        drained
+        """
+        self._stop.set()
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.scanner.close()
+
+
+def watch(
+    root,
+    service,
+    results=None,
+    patterns=("*.nc",),
+    interval=10.0,
+    queue_size=1000,
+    use_inotify=True,
+):
+    """
+    Watches a directory until interrupted, validating files with a
+    `daemon.ValidationService`.  Results are written next to each file, or
+    appended to the NDJSON file `results` when given.
+    """
+    writer = NDJSONWriter(results) if results else SidecarWriter()
+    scanner = make_scanner(root, use_inotify, patterns=patterns)
+    watcher = Watcher(
+        scanner,
+        service.validate,
+        writer,
+        workers=service.workers,
+        queue_size=queue_size,
+        interval=interval,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+
+
+def read_sidecar(path, suffix=".gliderdac.json"):
+    """
+    Reads the results written next to a file by SidecarWriter
+    """
+    with open(f"{path}{suffix}", encoding="utf-8") as result_file:
+        return json.load(result_file)